@@ -5,21 +5,41 @@ import os
 import uuid
 import json
 import asyncio
-from typing import Dict, Any
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+import hmac
+import logging
+from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 
 from services.session_manager import load_session_from_json
 from services.tweet_collector import collect_tweets_from_session
+from services.output_writer import (
+    check_output_format,
+    iter_file_snapshot,
+    journal_path,
+    output_extension,
+    output_media_type,
+)
+from services.job_store import job_store
+from services.scheduler import scheduler, QueueFullError
+from services.checkpoint import CollectionCheckpoint
+from services.result_cache import result_cache
+from services.incremental import incremental_store
+from services.session_pool import SessionAccount, session_pool
+from services.worker_registry import worker_registry
+from services import log
+from services.log import log_context
 
 router = APIRouter()
-
-# ジョブの状態を保存する辞書（本番環境ではRedisなどを使用）
-jobs: Dict[str, Dict[str, Any]] = {}
+logger = logging.getLogger(__name__)
 
 # 出力ファイルを保存するディレクトリ
 OUTPUT_DIR = "./output"
+# セッションをアップロードしないジョブが使うプールのアカウント数の上限
+SESSION_POOL_ACCOUNTS_PER_JOB = int(os.environ.get("SESSION_POOL_ACCOUNTS_PER_JOB", "4"))
+# 管理API（セッションプール・ログレベル）のトークン（未設定の場合は管理APIを無効にする）
+SESSION_POOL_ADMIN_TOKEN = os.environ.get("SESSION_POOL_ADMIN_TOKEN")
 
 
 class CollectRequest(BaseModel):
@@ -28,53 +48,197 @@ class CollectRequest(BaseModel):
     start_date: str
     end_date: str
     limit: int = 100
+    skip_seen: bool = False
+    output_format: str = "csv"
+    incremental: bool = False
+    cpu_profile: bool = False
 
 
-async def run_collection_job(job_id: str, session_data: Dict[str, Any], params: CollectRequest):
-    """バックグラウンドでツイート収集を実行"""
-    jobs[job_id]["status"] = "running"
-    jobs[job_id]["progress"] = 0
-    jobs[job_id]["message"] = "開始しています..."
-    
-    output_file = os.path.join(OUTPUT_DIR, f"{job_id}.csv")
-    
-    async def progress_callback(current: int, total: int, message: str):
-        """進捗を更新"""
-        jobs[job_id]["progress"] = current
-        jobs[job_id]["total"] = total
-        jobs[job_id]["message"] = message
-    
+def _output_path(job_id: str, output_format: str = "csv") -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}{output_extension(output_format)}")
+
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def _read_session_file(file: UploadFile) -> Dict[str, Any]:
+    """アップロードされたファイルからセッションJSONを読み込む"""
     try:
-        result = await collect_tweets_from_session(
-            session_json=session_data,
-            keyword=params.keyword,
-            start_date=params.start_date,
-            end_date=params.end_date,
+        content = await file.read()
+        logger.debug("File content length: %d bytes", len(content))
+        session_data = load_session_from_json(json.loads(content))
+        logger.debug("Session data loaded successfully")
+        return session_data
+    except json.JSONDecodeError as e:
+        logger.warning("JSON decode error: %s", e)
+        raise HTTPException(status_code=400, detail=f"無効なJSONファイルです: {str(e)}")
+    except ValueError as e:
+        logger.warning("Value error: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.warning("Unexpected error reading file: %s", e)
+        raise HTTPException(status_code=400, detail=f"ファイル読み込みエラー: {str(e)}")
+
+
+def _pool_accounts() -> List[SessionAccount]:
+    """セッションをアップロードしないジョブが使うアカウント"""
+    accounts = session_pool.select(SESSION_POOL_ACCOUNTS_PER_JOB)
+    if not accounts:
+        raise HTTPException(
+            status_code=400,
+            detail="セッションJSONをアップロードするか、セッションプールにアカウントを登録してください",
+        )
+    return accounts
+
+
+def _check_admin_token(token: Optional[str]):
+    if not SESSION_POOL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理APIは無効です")
+    if not hmac.compare_digest(token or "", SESSION_POOL_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="管理トークンが正しくありません")
+
+
+def _check_single_worker():
+    # 登録とクールダウンはプロセス内にだけ持つため、他のワーカーには反映されない
+    if worker_registry.count() > 1:
+        raise HTTPException(
+            status_code=409,
+            detail="セッションプールはワーカーごとに保持されるため、複数ワーカーで起動している場合は管理APIを使用できません",
+        )
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+async def mark_interrupted_jobs():
+    """
+    プロセスの終了で中断されたジョブを「interrupted」にする
+
+    起動時に呼び出す。実行していたプロセスが存在しないジョブ（自プロセスと同じPIDを含む）が対象。
+    """
+    for job in await job_store.list_jobs(("pending", "running")):
+        pid = job.get("worker_pid")
+        if pid != os.getpid() and _pid_alive(pid):
+            continue
+        output_file = _output_path(job["job_id"], job.get("output_format", "csv"))
+        resumable = CollectionCheckpoint.for_output(output_file).exists()
+        await job_store.update(
+            job["job_id"],
+            status="interrupted",
+            queue_position=None,
+            resumable=resumable,
+            message="サーバーの再起動により中断されました" + ("（再開できます）" if resumable else ""),
+        )
+
+
+async def run_collection_job(job_id: str, session_data: Optional[Dict[str, Any]], params: CollectRequest, resume: bool = False):
+    """バックグラウンドでツイート収集を実行（session_data が None の場合はセッションプールを使う）"""
+    # このジョブ（と収集のタスク）のログにジョブIDと検索ワードを付ける
+    with log_context(job_id=job_id, keyword=params.keyword):
+        output_file = _output_path(job_id, params.output_format)
+        # 実行中でも途中までの結果をダウンロードできるように出力先を記録しておく
+        await job_store.update(
+            job_id,
+            status="running",
+            progress=0,
+            message="再開しています..." if resume else "開始しています...",
             output_file=output_file,
-            limit=params.limit,
-            progress_callback=progress_callback
+            queue_position=None,
+            worker_pid=os.getpid(),
+            error=None,
         )
+    
+        async def progress_callback(current: int, total: int, message: str):
+            """進捗を更新（ジョブストアへはまとめて書き込む）"""
+            job_store.update_progress(job_id, progress=current, total=total, message=message)
+    
+        try:
+            # プールのアカウントは実行開始時点のクールダウンで選ぶ
+            accounts = _pool_accounts() if session_data is None else None
+            result = await collect_tweets_from_session(
+                session_json=session_data,
+                keyword=params.keyword,
+                start_date=params.start_date,
+                end_date=params.end_date,
+                output_file=output_file,
+                limit=params.limit,
+                progress_callback=progress_callback,
+                resume=resume,
+                skip_seen=params.skip_seen,
+                output_format=params.output_format,
+                incremental=params.incremental,
+                accounts=accounts,
+                cpu_profile=params.cpu_profile
+            )
         
-        if result["error"]:
-            jobs[job_id]["status"] = "error"
-            jobs[job_id]["error"] = result["error"]
-        else:
-            jobs[job_id]["status"] = "completed"
-            jobs[job_id]["output_file"] = result["output_file"]
-            jobs[job_id]["tweet_count"] = result["tweet_count"]
-    except Exception as e:
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["error"] = str(e)
+            if result["error"]:
+                # 中断前に書き込まれた行は部分結果として残す
+                await job_store.update(
+                    job_id,
+                    status="error",
+                    error=result["error"],
+                    output_file=output_file,
+                    tweet_count=result["tweet_count"],
+                    resumable=result["resumable"],
+                    stage_timings=result["stage_timings"],
+                    accounts=result["accounts"],
+                    trace_file=result["trace_file"],
+                    cpu_profile_file=result["cpu_profile_file"],
+                )
+            else:
+                await job_store.update(
+                    job_id,
+                    status="completed",
+                    output_file=result["output_file"],
+                    tweet_count=result["tweet_count"],
+                    resumable=result["resumable"],
+                    incremental=result.get("incremental"),
+                    stage_timings=result["stage_timings"],
+                    accounts=result["accounts"],
+                    trace_file=result["trace_file"],
+                    cpu_profile_file=result["cpu_profile_file"],
+                )
+                # 過去の期間の結果は、同じ条件の次のジョブで使えるようにキャッシュする
+                cache_key = None if params.skip_seen or params.incremental else result_cache.key(
+                    params.keyword, params.start_date, params.end_date, params.limit, params.output_format
+                )
+                if cache_key and result["complete"]:
+                    try:
+                        await result_cache.store(cache_key, result["output_file"], result["tweet_count"])
+                    except Exception as e:
+                        logger.warning("結果のキャッシュに失敗しました: %s", e)
+        except HTTPException as e:
+            await job_store.update(job_id, status="error", error=e.detail)
+        except Exception as e:
+            await job_store.update(job_id, status="error", error=str(e))
 
 
 @router.post("/api/collect")
 async def collect_tweets(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
     keyword: str = Form(...),
     start_date: str = Form(...),
     end_date: str = Form(...),
-    limit: int = Form(100)
+    limit: int = Form(100),
+    priority: int = Form(0),
+    skip_seen: bool = Form(False),
+    output_format: str = Form("csv"),
+    incremental: bool = Form(False),
+    cpu_profile: bool = Form(False)
 ):
     """
     ツイート収集を開始
@@ -86,26 +250,21 @@ async def collect_tweets(
         "end_date": "2023-12-31",
         "limit": 100
     }
-    """
-    # デバッグ用ログ
-    print(f"[DEBUG] Received request - keyword: {keyword}, start_date: {start_date}, end_date: {end_date}, limit: {limit}")
-    print(f"[DEBUG] File: {file.filename}, content_type: {file.content_type}")
     
-    # ファイルからセッションJSONを読み込む
-    try:
-        content = await file.read()
-        print(f"[DEBUG] File content length: {len(content)} bytes")
-        session_data = load_session_from_json(json.loads(content))
-        print(f"[DEBUG] Session data loaded successfully")
-    except json.JSONDecodeError as e:
-        print(f"[ERROR] JSON decode error: {e}")
-        raise HTTPException(status_code=400, detail=f"無効なJSONファイルです: {str(e)}")
-    except ValueError as e:
-        print(f"[ERROR] Value error: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        print(f"[ERROR] Unexpected error reading file: {e}")
-        raise HTTPException(status_code=400, detail=f"ファイル読み込みエラー: {str(e)}")
+    同時実行数を超えたジョブは待ち行列に入る（priority が大きいほど先に実行）。
+    待ち行列が満杯の場合は 429 と Retry-After ヘッダーを返す。
+    skip_seen を指定すると、同じ検索ワードの過去のジョブで収集済みのツイートを除く。
+    output_format は csv（デフォルト）/ csv.gz / csv.zst / jsonl / parquet のいずれか。
+    過去の期間で同じ条件の結果がキャッシュにあれば、ブラウザを起動せずに完了済みのジョブを返す（skip_seen・incremental を除く）。
+    incremental を指定すると、同じ検索ワードの前回の差分収集より新しいツイートだけを収集し、
+    検索ワードごとのデータセット（GET /api/dataset）に追記する。
+    セッションJSONを省略した場合は、セッションプールの複数のアカウントでリクエストを分散する。
+    cpu_profile を指定すると、サンプリングプロファイラでフレームグラフを採取する（GET /api/status の cpu_profile=true で取得）。
+    """
+    logger.debug(
+        "Received request",
+        extra={"keyword": keyword, "start_date": start_date, "end_date": end_date, "limit": limit},
+    )
     
     # パラメータを取得（クエリパラメータまたはリクエストボディから）
     if not all([keyword, start_date, end_date]):
@@ -114,15 +273,60 @@ async def collect_tweets(
         if not start_date: missing.append("start_date")
         if not end_date: missing.append("end_date")
         error_msg = f"必須パラメータが不足しています: {', '.join(missing)}"
-        print(f"[ERROR] {error_msg}")
+        logger.warning(error_msg)
         raise HTTPException(status_code=400, detail=error_msg)
+    try:
+        check_output_format(output_format)
+        cache_key = None if skip_seen or incremental else result_cache.key(keyword, start_date, end_date, limit, output_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if cache_key:
+        job_id = str(uuid.uuid4())
+        output_file = _output_path(job_id, output_format)
+        tweet_count = await result_cache.fetch(cache_key, output_file)
+        if tweet_count is not None:
+            logger.info("Created job from cache", extra={"job_id": job_id})
+            await job_store.create(job_id, {
+                "status": "completed",
+                "progress": tweet_count,
+                "total": limit,
+                "message": f"完了: キャッシュ済みの{tweet_count}件のツイートを返しました",
+                "hashtag": keyword,
+                "start_date": start_date,
+                "end_date": end_date,
+                "limit": limit,
+                "skip_seen": skip_seen,
+                "output_format": output_format,
+                "output_file": output_file,
+                "tweet_count": tweet_count,
+                "cached": True,
+            })
+            return {
+                "job_id": job_id,
+                "status": "completed",
+                "queue_position": None,
+                "message": "キャッシュ済みの結果を返しました"
+            }
+    
+    # 受け付けられない場合はセッションを読み込む前に断る（待ち行列はワーカープロセスごと）
+    if scheduler.is_full():
+        raise _queue_full(QueueFullError(scheduler.retry_after()))
+    
+    # ファイルからセッションJSONを読み込む（無ければセッションプールを使う）
+    if file is not None:
+        logger.debug("File: %s, content_type: %s", file.filename, file.content_type)
+        session_data = await _read_session_file(file)
+    else:
+        session_data = None
+        _pool_accounts()
     
     # ジョブIDを生成
     job_id = str(uuid.uuid4())
-    print(f"[INFO] Created job: {job_id}")
+    logger.info("Created job", extra={"job_id": job_id})
     
     # ジョブを初期化
-    jobs[job_id] = {
+    await job_store.create(job_id, {
         "status": "pending",
         "progress": 0,
         "total": limit,
@@ -130,61 +334,279 @@ async def collect_tweets(
         "hashtag": keyword,
         "start_date": start_date,
         "end_date": end_date,
-        "limit": limit
-    }
+        "limit": limit,
+        "skip_seen": skip_seen,
+        "output_format": output_format,
+        "incremental": incremental,
+        "cpu_profile": cpu_profile,
+        "session_pool": session_data is None,
+        "worker_pid": os.getpid()
+    })
     
     # バックグラウンドタスクとして実行
     params = CollectRequest(
         keyword=keyword,
         start_date=start_date,
         end_date=end_date,
-        limit=limit
+        limit=limit,
+        skip_seen=skip_seen,
+        output_format=output_format,
+        incremental=incremental,
+        cpu_profile=cpu_profile
     )
-    background_tasks.add_task(run_collection_job, job_id, session_data, params)
+    try:
+        position = scheduler.submit(
+            job_id,
+            lambda: run_collection_job(job_id, session_data, params),
+            priority=priority,
+        )
+    except QueueFullError as e:
+        # ジョブ作成中に待ち行列が埋まった場合
+        await job_store.update(job_id, status="error", error=str(e))
+        raise _queue_full(e)
     
     return {
         "job_id": job_id,
         "status": "pending",
+        "queue_position": position,
         "message": "ツイート収集を開始しました"
     }
 
 
+def _read_trace_file(path: Optional[str], parse_json: bool):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f) if parse_json else f.read()
+
+
 @router.get("/api/status/{job_id}")
-async def get_job_status(job_id: str):
-    """ジョブの状態を取得"""
-    if job_id not in jobs:
+async def get_job_status(job_id: str, trace: bool = False, cpu_profile: bool = False):
+    """
+    ジョブの状態を取得
+
+    終了したジョブは、trace=true でChromeのトレース形式のタイムライン（chrome://tracing・Perfetto で開ける）、
+    cpu_profile=true でフレームグラフ用の折りたたみ形式のプロファイル（収集時に cpu_profile を指定した場合）も返す。
+    """
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="ジョブが見つかりません")
     
-    job = jobs[job_id]
-    return {
+    status = {
         "job_id": job_id,
         "status": job["status"],
         "progress": job.get("progress", 0),
         "total": job.get("total", 0),
         "message": job.get("message", ""),
         "tweet_count": job.get("tweet_count"),
-        "error": job.get("error")
+        "error": job.get("error"),
+        "queue_position": scheduler.position(job_id) or job.get("queue_position"),
+        "resumable": job.get("resumable", False),
+        "cached": job.get("cached", False),
+        "incremental": job.get("incremental"),
+        "stage_timings": job.get("stage_timings"),
+        "accounts": job.get("accounts")
+    }
+    if trace:
+        status["trace"] = await asyncio.to_thread(_read_trace_file, job.get("trace_file"), True)
+    if cpu_profile:
+        status["cpu_profile"] = await asyncio.to_thread(_read_trace_file, job.get("cpu_profile_file"), False)
+    return status
+
+
+@router.post("/api/resume/{job_id}")
+async def resume_job(
+    job_id: str,
+    file: Optional[UploadFile] = File(None),
+    priority: int = Form(0)
+):
+    """
+    中断・失敗したジョブを最後のチェックポイントから再開
+    
+    アップロードされたセッション情報はサーバーに保存しないため、再開時にもセッションJSONのアップロードが必要
+    （省略した場合はセッションプールのアカウントを使う）。
+    収集済みの出力ファイルに続きを追記する。
+    """
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    if job["status"] in ("pending", "running"):
+        raise HTTPException(status_code=409, detail="ジョブはまだ実行中です")
+    checkpoint = CollectionCheckpoint.for_output(_output_path(job_id, job.get("output_format", "csv")))
+    if not checkpoint.exists():
+        raise HTTPException(status_code=400, detail="このジョブは再開できません（チェックポイントがありません）")
+    
+    if scheduler.is_full():
+        raise _queue_full(QueueFullError(scheduler.retry_after()))
+    
+    if file is not None:
+        session_data = await _read_session_file(file)
+    else:
+        session_data = None
+        _pool_accounts()
+    
+    params = CollectRequest(
+        keyword=job["hashtag"],
+        start_date=job["start_date"],
+        end_date=job["end_date"],
+        limit=job["limit"],
+        skip_seen=job.get("skip_seen", False),
+        output_format=job.get("output_format", "csv"),
+        incremental=job.get("incremental", False),
+        cpu_profile=job.get("cpu_profile", False)
+    )
+    position = scheduler.submit(
+        job_id,
+        lambda: run_collection_job(job_id, session_data, params, resume=True),
+        priority=priority,
+    )
+    await job_store.update(job_id, status="pending", message="再開待ち...", queue_position=position)
+    logger.info("Resuming job", extra={"job_id": job_id})
+    
+    return {
+        "job_id": job_id,
+        "status": "pending",
+        "queue_position": position,
+        "message": "ツイート収集を再開しました"
     }
 
 
 @router.get("/api/download/{job_id}")
 async def download_csv(job_id: str):
-    """完了したCSVファイルをダウンロード"""
-    if job_id not in jobs:
+    """
+    出力ファイルをダウンロード（Content-Type は出力形式に応じる）
+
+    完了したジョブはファイル全体を返す。実行中・エラー終了したジョブは、
+    その時点までに書き込まれた行を部分結果として返す。
+    Parquet は実行中のファイルを読めないため、実行中の部分結果は JSONL で返す。
+    """
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="ジョブが見つかりません")
     
-    job = jobs[job_id]
+    status = job["status"]
+    output_file = job.get("output_file")
+    output_format = job.get("output_format", "csv")
     
-    if job["status"] != "completed":
-        raise HTTPException(status_code=400, detail="ジョブがまだ完了していません")
+    if status == "completed":
+        if not output_file or not os.path.exists(output_file):
+            raise HTTPException(status_code=404, detail="出力ファイルが見つかりません")
+        
+        return FileResponse(
+            output_file,
+            media_type=output_media_type(output_format),
+            filename=f"tweets_{job_id}{output_extension(output_format)}"
+        )
     
-    output_file = job.get("output_file")
+    if status not in ("running", "error"):
+        raise HTTPException(status_code=400, detail="ジョブがまだ開始されていません")
+    if output_file and status == "running" and journal_path(output_file, output_format):
+        output_file = journal_path(output_file, output_format)
+        output_format = "jsonl"
     if not output_file or not os.path.exists(output_file):
-        raise HTTPException(status_code=404, detail="出力ファイルが見つかりません")
+        raise HTTPException(status_code=404, detail="まだ収集済みのツイートがありません")
     
-    return FileResponse(
-        output_file,
+    # 書き込みはページ単位でイベントループ上で行われるため、この時点のサイズはページの境界になる
+    size = os.path.getsize(output_file)
+    return StreamingResponse(
+        iter_file_snapshot(output_file, size),
+        media_type=output_media_type(output_format),
+        headers={
+            "Content-Disposition": f'attachment; filename="tweets_{job_id}_partial{output_extension(output_format)}"',
+            "Content-Length": str(size),
+        },
+    )
+
+
+@router.get("/api/dataset")
+async def download_dataset(keyword: str):
+    """
+    差分収集で検索ワードごとにまとめたデータセット（CSV）をダウンロード
+
+    最新のツイートIDと投稿時刻、行数はレスポンスヘッダー（X-Dataset-*）で返す。
+    """
+    state = incremental_store.load(keyword)
+    dataset_path = incremental_store.dataset_path(keyword)
+    if state is None or not state["row_count"] or not os.path.exists(dataset_path):
+        raise HTTPException(status_code=404, detail="この検索ワードのデータセットはありません")
+    
+    # 追記中のジョブがあっても、状態に記録した位置までを返す
+    size = state["dataset_size"]
+    return StreamingResponse(
+        iter_file_snapshot(dataset_path, size),
         media_type="text/csv",
-        filename=f"tweets_{job_id}.csv"
+        headers={
+            "Content-Disposition": 'attachment; filename="tweets_dataset.csv"',
+            "Content-Length": str(size),
+            "X-Dataset-Rows": str(state["row_count"]),
+            "X-Dataset-Max-Id": str(state["max_id"]),
+            "X-Dataset-Max-Time": str(state["max_time"]),
+        },
     )
 
+
+@router.get("/api/sessions")
+async def list_sessions(x_admin_token: Optional[str] = Header(None)):
+    """セッションプールのアカウント一覧（クッキーの値は返さない）"""
+    _check_admin_token(x_admin_token)
+    _check_single_worker()
+    return {"accounts": session_pool.list_accounts()}
+
+
+@router.post("/api/sessions")
+async def add_session(file: UploadFile = File(...), x_admin_token: Optional[str] = Header(None)):
+    """
+    セッションJSONをセッションプールに登録
+
+    X-Admin-Token ヘッダーに SESSION_POOL_ADMIN_TOKEN が必要。登録したセッションはメモリにのみ保持する。
+    プロセスごとの状態のため、複数ワーカーで起動している場合は 409 を返す。
+    """
+    _check_admin_token(x_admin_token)
+    _check_single_worker()
+    session_data = await _read_session_file(file)
+    try:
+        account = session_pool.add(session_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info("Added account to session pool", extra={"account": account.label})
+    return account.to_dict()
+
+
+@router.delete("/api/sessions/{account_id}")
+async def remove_session(account_id: str, x_admin_token: Optional[str] = Header(None)):
+    """セッションプールからアカウントを削除（実行中のジョブは終わるまで使い続ける）"""
+    _check_admin_token(x_admin_token)
+    _check_single_worker()
+    if not session_pool.remove(account_id):
+        raise HTTPException(status_code=404, detail="アカウントが見つかりません")
+    return {"account_id": account_id, "removed": True}
+
+
+class LogLevelRequest(BaseModel):
+    """ログレベルの変更リクエスト"""
+    level: str
+    logger: Optional[str] = None
+
+
+@router.get("/api/log-level")
+async def get_log_level(x_admin_token: Optional[str] = Header(None)):
+    """ルートと、個別にレベルを設定したロガーのログレベル"""
+    _check_admin_token(x_admin_token)
+    return {"levels": log.levels()}
+
+
+@router.put("/api/log-level")
+async def set_log_level(request: LogLevelRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    実行中にログレベルを変更（再起動すると LOG_LEVEL に戻る）
+
+    logger を省略した場合はルートのレベルを変更する。
+    例: {"level": "DEBUG", "logger": "services.tweet_collector"} でカーソルの取得状況を出力する。
+    """
+    _check_admin_token(x_admin_token)
+    try:
+        log.set_level(request.level, request.logger)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info("Log level changed", extra={"target": request.logger or "root", "level": request.level.upper()})
+    return {"levels": log.levels()}
@@ -1,11 +1,26 @@
 """
 FastAPIアプリケーションのメインエントリーポイント
 """
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import os
 
-from api.routes import router
+from services import log
+
+# 他のモジュールの読み込み時に出るログも出力できるように、最初にログを設定する
+log.configure()
+
+from api.routes import router, mark_interrupted_jobs
+from services.browser_pool import browser_pool
+from services.job_store import job_store
+from services import metrics
+from services.result_cache import result_cache
+from services.pacing import account_pacers
+from services.scheduler import scheduler
+from services.session_pool import session_pool
+from services.worker_registry import worker_registry
 
 # 出力ディレクトリを作成
 os.makedirs("./output", exist_ok=True)
@@ -29,6 +44,27 @@ app.add_middleware(
 app.include_router(router)
 
 
+@app.on_event("startup")
+async def startup():
+    """ジョブストアとブラウザプールを起動し、最小数のChromiumを事前に立ち上げる"""
+    worker_registry.register()
+    await job_store.start()
+    await mark_interrupted_jobs()
+    await result_cache.evict()
+    await browser_pool.start()
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """ブラウザプールを終了し、保留中のジョブ状態とログを書き込む"""
+    await scheduler.close()
+    await browser_pool.close()
+    await job_store.close()
+    worker_registry.unregister()
+    log.shutdown()
+
+
 @app.get("/")
 async def root():
     """ルートエンドポイント"""
@@ -41,5 +77,22 @@ async def root():
 @app.get("/health")
 async def health():
     """ヘルスチェックエンドポイント"""
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "browser_pool": browser_pool.stats(),
+        "scheduler": scheduler.stats(),
+        "result_cache": result_cache.stats(),
+        "session_pool": session_pool.stats(),
+        "account_pacers": account_pacers.stats(),
+    }
+
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus形式のメトリクス（prometheus_client が必要）"""
+    if metrics.prometheus_client is None:
+        raise HTTPException(status_code=503, detail="prometheus_client がインストールされていません")
+    # 子プロセスの走査は時間がかかる場合があるため、イベントループの外で行う
+    rss = await asyncio.to_thread(metrics.chromium_rss)
+    metrics.refresh(browser_pool.stats(), scheduler.stats(), rss)
+    return Response(content=metrics.render(), media_type=metrics.content_type())
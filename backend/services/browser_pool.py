@@ -0,0 +1,320 @@
+"""
+ブラウザプール管理モジュール
+起動済みのChromiumをジョブ間で共有し、ジョブごとの起動コストを削減する
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from playwright.async_api import Browser, Playwright, async_playwright
+
+# 親ディレクトリをパスに追加して、twitter_api_browser_pythonモジュールをインポート可能にする
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from twitter_api_browser_python.main import BROWSER_PROFILE, DEFAULT_LAUNCH_ARGS, launch_args as profile_launch_args
+from twitter_api_browser_python.tracing import span
+from services.metrics import BROWSER_LAUNCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledBrowser:
+    """プール内のブラウザと利用状況"""
+
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.lease_count = 0
+
+    def is_healthy(self) -> bool:
+        return self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    起動済みChromiumのプール
+
+    ジョブは lease() でブラウザを借り受け、ジョブ専用の BrowserContext を作成して使用する。
+    ブラウザは返却後も起動したまま保持され、次のジョブで再利用される。
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 4,
+        idle_timeout: float = 300.0,
+        health_check_interval: float = 30.0,
+        headless: bool = True,
+        launch_args: Optional[List[str]] = None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"不正なプールサイズです: min={min_size}, max={max_size}")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.headless = headless
+        self.launch_args = launch_args or list(DEFAULT_LAUNCH_ARGS)
+
+        self._playwright_manager = None
+        self._playwright: Optional[Playwright] = None
+        # 直近に返却されたブラウザから再利用する（LIFO）
+        self._idle: Deque[_PooledBrowser] = deque()
+        self._leased: Set[_PooledBrowser] = set()
+        self._launching = 0
+        self._cond = asyncio.Condition()
+        self._start_lock = asyncio.Lock()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # 統計情報
+        self._launched_total = 0
+        self._evicted_total = 0
+        self._unhealthy_total = 0
+        self._leases_total = 0
+        self._lease_wait_total = 0.0
+        self._launch_time_total = 0.0
+
+    @classmethod
+    def from_env(cls) -> "BrowserPool":
+        """環境変数から設定を読み込んでプールを作成"""
+        return cls(
+            min_size=int(os.environ.get("BROWSER_POOL_MIN_SIZE", "1")),
+            max_size=int(os.environ.get("BROWSER_POOL_MAX_SIZE", "4")),
+            idle_timeout=float(os.environ.get("BROWSER_POOL_IDLE_TIMEOUT", "300")),
+            health_check_interval=float(os.environ.get("BROWSER_POOL_HEALTH_INTERVAL", "30")),
+            launch_args=profile_launch_args(BROWSER_PROFILE),
+        )
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._leased) + self._launching
+
+    async def start(self):
+        """Playwrightを起動し、最小数のブラウザを事前に立ち上げる"""
+        async with self._start_lock:
+            if self.started:
+                return
+            self._closed = False
+            self._playwright_manager = async_playwright()
+            self._playwright = await self._playwright_manager.__aenter__()
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+        await self._fill_to_min()
+
+    async def close(self):
+        """全ブラウザを終了し、Playwrightを停止"""
+        async with self._start_lock:
+            if not self.started:
+                return
+            self._closed = True
+            if self._maintenance_task:
+                self._maintenance_task.cancel()
+                try:
+                    await self._maintenance_task
+                except asyncio.CancelledError:
+                    pass
+                self._maintenance_task = None
+
+            async with self._cond:
+                entries = list(self._idle) + list(self._leased)
+                self._idle.clear()
+                self._leased.clear()
+                self._cond.notify_all()
+            for entry in entries:
+                await self._close_browser(entry)
+
+            await self._playwright_manager.__aexit__(None, None, None)
+            self._playwright_manager = None
+            self._playwright = None
+
+    async def _launch(self) -> _PooledBrowser:
+        started_at = time.monotonic()
+        with span("browser.launch", "browser"):
+            browser = await self._playwright.chromium.launch(
+                headless=self.headless,
+                args=self.launch_args,
+            )
+        elapsed = time.monotonic() - started_at
+        self._launch_time_total += elapsed
+        BROWSER_LAUNCH_SECONDS.observe(elapsed)
+        self._launched_total += 1
+        return _PooledBrowser(browser)
+
+    async def _close_browser(self, entry: _PooledBrowser):
+        try:
+            await entry.browser.close()
+        except Exception as e:
+            logger.warning("ブラウザの終了に失敗しました: %s", e)
+
+    async def _acquire(self) -> _PooledBrowser:
+        if not self.started:
+            await self.start()
+
+        wait_started = time.monotonic()
+        unhealthy: List[_PooledBrowser] = []
+        async with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("ブラウザプールは終了しています")
+                while self._idle:
+                    entry = self._idle.pop()
+                    if entry.is_healthy():
+                        self._checkout(entry, wait_started)
+                        break
+                    self._unhealthy_total += 1
+                    unhealthy.append(entry)
+                else:
+                    entry = None
+                if entry is not None:
+                    break
+                if self._total() < self.max_size:
+                    self._launching += 1
+                    break
+                await self._cond.wait()
+
+        for dead in unhealthy:
+            await self._close_browser(dead)
+        if entry is not None:
+            return entry
+
+        # ロックの外で起動する（起動中も他のジョブの返却を受け付ける）
+        try:
+            entry = await self._launch()
+        except BaseException:
+            async with self._cond:
+                self._launching -= 1
+                self._cond.notify()
+            raise
+        async with self._cond:
+            self._launching -= 1
+            self._checkout(entry, wait_started)
+        return entry
+
+    def _checkout(self, entry: _PooledBrowser, wait_started: float):
+        entry.lease_count += 1
+        self._leased.add(entry)
+        self._leases_total += 1
+        self._lease_wait_total += time.monotonic() - wait_started
+
+    async def _release(self, entry: _PooledBrowser):
+        # ジョブが閉じ忘れたコンテキストを片付ける
+        if entry.is_healthy():
+            for context in list(entry.browser.contexts):
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+
+        async with self._cond:
+            self._leased.discard(entry)
+            keep = not self._closed and entry.is_healthy()
+            if keep:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            elif not self._closed:
+                self._unhealthy_total += 1
+            self._cond.notify()
+
+        if not keep:
+            await self._close_browser(entry)
+
+    @asynccontextmanager
+    async def lease(self):
+        """
+        ブラウザを借り受ける
+
+        Yields:
+            起動済みの Browser。ジョブ側で new_context() して使用する
+        """
+        with span("browser.lease", "browser"):
+            entry = await self._acquire()
+        try:
+            yield entry.browser
+        finally:
+            await self._release(entry)
+
+    async def _fill_to_min(self):
+        """最小数に満たない分のブラウザを起動"""
+        while True:
+            async with self._cond:
+                if self._closed or self._total() >= self.min_size:
+                    return
+                self._launching += 1
+            try:
+                entry = await self._launch()
+            except Exception as e:
+                async with self._cond:
+                    self._launching -= 1
+                logger.warning("ブラウザの事前起動に失敗しました: %s", e)
+                return
+            async with self._cond:
+                self._launching -= 1
+                self._idle.append(entry)
+                self._cond.notify()
+
+    async def _maintenance_loop(self):
+        """アイドルブラウザの退避とヘルスチェックを定期実行"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self._evict_idle()
+                await self._fill_to_min()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("ブラウザプールのメンテナンスに失敗しました: %s", e)
+
+    async def _evict_idle(self):
+        now = time.monotonic()
+        evict: List[_PooledBrowser] = []
+        async with self._cond:
+            healthy: Deque[_PooledBrowser] = deque()
+            for entry in self._idle:
+                if entry.is_healthy():
+                    healthy.append(entry)
+                else:
+                    self._unhealthy_total += 1
+                    evict.append(entry)
+            self._idle = healthy
+
+            # 最小数を超える分だけ、古い順にアイドル期限切れのブラウザを終了する
+            excess = self._total() - self.min_size
+            while excess > 0 and self._idle and now - self._idle[0].last_used > self.idle_timeout:
+                evict.append(self._idle.popleft())
+                self._evicted_total += 1
+                excess -= 1
+        for entry in evict:
+            await self._close_browser(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """ヘルスチェック用の統計情報"""
+        return {
+            "started": self.started,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": self._total(),
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "launching": self._launching,
+            "launched_total": self._launched_total,
+            "evicted_total": self._evicted_total,
+            "unhealthy_total": self._unhealthy_total,
+            "leases_total": self._leases_total,
+            "avg_lease_wait_sec": round(self._lease_wait_total / self._leases_total, 3) if self._leases_total else 0.0,
+            "avg_launch_sec": round(self._launch_time_total / self._launched_total, 3) if self._launched_total else 0.0,
+        }
+
+
+# アプリケーション全体で共有するプール
+browser_pool = BrowserPool.from_env()
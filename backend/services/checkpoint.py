@@ -0,0 +1,45 @@
+"""
+チェックポイント管理モジュール
+収集の途中経過（カーソル・件数・出力ファイルの位置）を保存し、中断したジョブを再開できるようにする
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+class CollectionCheckpoint:
+    """
+    1ジョブ分のチェックポイントファイル
+
+    一時ファイルに書いてから置き換えるため、保存中に落ちても直前のチェックポイントが残る。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def for_output(cls, output_file: str) -> "CollectionCheckpoint":
+        return cls(output_file + ".checkpoint.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def save(self, state: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not self.exists():
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def remove(self):
+        for path in (self.path, self.path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,213 @@
+"""
+ツイートIDの重複排除モジュール
+64bitのスノーフレークIDをソート済み配列で保持し、ページ・シャード・再実行をまたいで重複を除く
+"""
+import hashlib
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+# 追加分がこの件数（またはソート済み配列の1/8）を超えたらソート済み配列へまとめる
+COMPACT_THRESHOLD = 4096
+
+_STATUS_ID = re.compile(r"/status/(\d+)")
+
+
+def _sorted_unique(values: array) -> array:
+    """ソートして重複を除いた配列を返す"""
+    ordered = sorted(values)
+    result = array("Q")
+    last = None
+    for value in ordered:
+        if value != last:
+            result.append(value)
+            last = value
+    return result
+
+
+def row_tweet_id(row: Dict[str, Any]) -> Optional[int]:
+    """行の Post Link からツイートIDを取り出す"""
+    match = _STATUS_ID.search(row.get("Post Link", ""))
+    return int(match.group(1)) if match else None
+
+
+class TweetIdSet:
+    """
+    ツイートIDの集合
+
+    ID 1件あたり8バイトのソート済み配列と、直近に追加した分の小さな set で構成する。
+    ジャーナルを開くと、追加したIDを8バイトずつファイルへ追記する（チェックポイント用）。
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._sorted = array("Q", sorted(set(ids)))
+        self._recent: Set[int] = set()
+        self._journal = None
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, tweet_id: int) -> bool:
+        if tweet_id in self._recent:
+            return True
+        i = bisect_left(self._sorted, tweet_id)
+        return i < len(self._sorted) and self._sorted[i] == tweet_id
+
+    def add(self, tweet_id: int) -> bool:
+        """IDを追加し、新しいIDだったかを返す"""
+        if tweet_id in self:
+            return False
+        self._recent.add(tweet_id)
+        if self._journal is not None:
+            self._journal.write(tweet_id.to_bytes(8, "little"))
+        if len(self._recent) >= max(COMPACT_THRESHOLD, len(self._sorted) >> 3):
+            self._compact()
+        return True
+
+    def _compact(self):
+        if not self._recent:
+            return
+        merged = array("Q", self._sorted)
+        merged.extend(self._recent)
+        # ソート済みの前半と追加分の2つのランになるため、timsortでほぼ線形時間で済む
+        self._sorted = array("Q", sorted(merged))
+        self._recent = set()
+
+    def unseen(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        まだ見ていないツイートの行だけを返す（集合には追加しない）
+
+        IDが取り出せない行はそのまま残す。
+        """
+        result = []
+        in_page: Set[int] = set()
+        for row in rows:
+            tweet_id = row_tweet_id(row)
+            if tweet_id is not None:
+                if tweet_id in in_page or tweet_id in self:
+                    continue
+                in_page.add(tweet_id)
+            result.append(row)
+        return result
+
+    def add_rows(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            tweet_id = row_tweet_id(row)
+            if tweet_id is not None:
+                self.add(tweet_id)
+
+    def update(self, other: "TweetIdSet"):
+        """他の集合のIDをまとめて追加（ジャーナルには書き込まない）"""
+        self._compact()
+        other._compact()
+        merged = array("Q", self._sorted)
+        merged.extend(other._sorted)
+        self._sorted = _sorted_unique(merged)
+
+    def discard(self, ids: Set[int]):
+        """IDをまとめて除く（ジャーナルには反映しない）"""
+        if not ids:
+            return
+        self._compact()
+        self._sorted = array("Q", (value for value in self._sorted if value not in ids))
+
+    def tobytes(self) -> bytes:
+        self._compact()
+        return self._sorted.tobytes()
+
+    @classmethod
+    def frombytes(cls, data: bytes) -> "TweetIdSet":
+        ids = cls()
+        values = array("Q")
+        values.frombytes(data[: len(data) - len(data) % 8])
+        ids._sorted = _sorted_unique(values)
+        return ids
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, size: Optional[int] = None) -> "TweetIdSet":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "rb") as f:
+            data = f.read() if size is None else f.read(size)
+        return cls.frombytes(data)
+
+    # --- ジャーナル（チェックポイント用の追記ログ） ---
+
+    def open_journal(self, path: str, size: int = 0):
+        """
+        追加したIDを追記するファイルを開く
+
+        size を指定すると、その位置より後ろ（チェックポイント後に書かれた分）を切り捨てて再開する。
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if size and os.path.exists(path):
+            os.truncate(path, size)
+            self._journal = open(path, "ab")
+        else:
+            self._journal = open(path, "wb")
+
+    def journal_size(self) -> int:
+        if self._journal is None:
+            return 0
+        self._journal.flush()
+        return os.fstat(self._journal.fileno()).st_size
+
+    def filenos(self) -> List[int]:
+        """永続化が必要なジャーナルのディスクリプタ（バッファはここでフラッシュする）"""
+        if self._journal is None:
+            return []
+        self._journal.flush()
+        return [self._journal.fileno()]
+
+    def close_journal(self, remove: bool = False):
+        if self._journal is None:
+            return
+        path = self._journal.name
+        self._journal.close()
+        self._journal = None
+        if remove and os.path.exists(path):
+            os.remove(path)
+
+
+def normalize_query_key(keyword: str) -> str:
+    """検索ワードを正規化（大文字小文字・連続する空白の違いを無視）"""
+    return " ".join(keyword.lower().split())
+
+
+class SeenIdStore:
+    """検索ワードごとに、過去のジョブで収集したツイートIDを保存する"""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        # merge_save はスレッドから呼び出すため、読み込みから保存までを排他する
+        self._lock = threading.Lock()
+
+    def path_for(self, keyword: str) -> str:
+        digest = hashlib.sha256(normalize_query_key(keyword).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.base_dir, f"{digest}.ids")
+
+    def load(self, keyword: str) -> TweetIdSet:
+        return TweetIdSet.load(self.path_for(keyword))
+
+    def merge_save(self, keyword: str, ids: TweetIdSet):
+        """保存済みのIDと合わせて保存（同じ検索ワードのジョブが並行しても取りこぼさない）"""
+        with self._lock:
+            merged = self.load(keyword)
+            merged.update(ids)
+            merged.save(self.path_for(keyword))
+
+
+seen_id_store = SeenIdStore(os.environ.get("SEEN_IDS_DIR", "./output/seen"))
@@ -0,0 +1,117 @@
+"""
+差分収集モジュール
+検索ワードごとに収集済みの最新ツイート（スノーフレークID・投稿時刻）と、それまでの結果をまとめたデータセットを保持する
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from services.dedup import normalize_query_key, row_tweet_id
+from services.output_writer import IncrementalCSVWriter, iter_rows
+from services.sharding import row_timestamp
+
+
+class IncrementalStore:
+    """
+    検索ワードごとの差分収集の状態とデータセット
+
+    状態（<digest>.json）には最新のツイートIDと投稿時刻、データセット（<digest>.csv）の行数とサイズを保存する。
+    差分収集のジョブは最新の投稿時刻以降だけを検索し、最新のID以下のツイートに到達した時点でページングを終える。
+    ジョブが完了すると新しい行をデータセットの末尾に追記する（データセットは実行ごとのまとまりで、各まとまりは新しい順）。
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        # 同じプロセス内で同じ検索ワードの追記が重ならないようにする
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "IncrementalStore":
+        """環境変数から設定を読み込んで作成"""
+        return cls(os.environ.get("INCREMENTAL_DIR", "./output/incremental"))
+
+    def _base_path(self, keyword: str) -> str:
+        digest = hashlib.sha256(normalize_query_key(keyword).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.base_dir, digest)
+
+    def dataset_path(self, keyword: str) -> str:
+        return self._base_path(keyword) + ".csv"
+
+    def load(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """保存済みの状態（まだ収集していない検索ワードは None）"""
+        path = self._base_path(keyword) + ".json"
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, keyword: str, state: Dict[str, Any]):
+        path = self._base_path(keyword) + ".json"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def merge(self, keyword: str, output_file: Optional[str], output_format: str) -> Dict[str, Any]:
+        """
+        ジョブの出力ファイルの行をデータセットに追記し、最新のIDと投稿時刻を進める
+
+        保存済みの最新ID以下の行（同じ検索ワードのジョブが並行して先に追記した分）は追記しない。
+        データセットは状態に記録したサイズまで切り詰めてから追記するため、途中で落ちても重複しない。
+
+        Returns:
+            更新後の状態
+        """
+        with self._lock:
+            state = self.load(keyword) or {
+                "keyword": normalize_query_key(keyword),
+                "max_id": None,
+                "max_time": None,
+                "row_count": 0,
+                "dataset_size": 0,
+                "runs": 0,
+            }
+            max_id = state["max_id"] or 0
+            max_time = state["max_time"]
+            new_rows = 0
+            if output_file:
+                writer = IncrementalCSVWriter(self.dataset_path(keyword))
+                writer.resume(state["dataset_size"], state["row_count"])
+                batch = []
+                for row in iter_rows(output_file, output_format):
+                    tweet_id = row_tweet_id(row)
+                    if tweet_id is not None and tweet_id <= (state["max_id"] or 0):
+                        continue
+                    if tweet_id is not None and tweet_id > max_id:
+                        max_id = tweet_id
+                        max_time = row_timestamp(row) or max_time
+                    batch.append(row)
+                    if len(batch) >= 1000:
+                        writer.write_rows(batch)
+                        new_rows += len(batch)
+                        batch = []
+                writer.write_rows(batch)
+                new_rows += len(batch)
+                writer.sync()
+                state["row_count"] = writer.row_count
+                state["dataset_size"] = writer.size
+                writer.close()
+            state.update({
+                "max_id": max_id or None,
+                "max_time": max_time,
+                "runs": state["runs"] + 1,
+                "last_new_rows": new_rows,
+                "updated_at": time.time(),
+            })
+            self._save(keyword, state)
+            return state
+
+
+# アプリケーション全体で共有する差分収集の状態
+incremental_store = IncrementalStore.from_env()
@@ -0,0 +1,293 @@
+"""
+ジョブ状態の保存モジュール
+ジョブの状態をプロセス外（SQLite）に保存し、再起動や複数ワーカー間でも参照できるようにする
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 完了・エラー・中断状態（TTLによる削除の対象）
+FINISHED_STATUSES = ("completed", "error", "interrupted")
+
+
+class JobStore:
+    """
+    ジョブストアの共通インターフェース
+
+    update() は即座に反映し、update_progress() はまとめて書き込む（進捗のように頻繁に変わる値向け）。
+    """
+
+    def __init__(self, ttl: float = 86400.0, flush_interval: float = 1.0):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintenance_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _maintenance_loop(self):
+        last_purge = time.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.time() - last_purge >= 60:
+                    last_purge = time.time()
+                    await self.purge_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("ジョブストアの更新に失敗しました: %s", e)
+
+    def update_progress(self, job_id: str, **fields):
+        """進捗を更新（次のフラッシュでまとめて書き込む）"""
+        self._pending.setdefault(job_id, {}).update(fields)
+
+    async def update(self, job_id: str, **fields):
+        """状態を即座に更新"""
+        pending = self._pending.pop(job_id, {})
+        pending.update(fields)
+        await self._write({job_id: pending})
+
+    async def flush(self):
+        """保留中の進捗をまとめて書き込む"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        await self._write(pending)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self._read(job_id)
+        if job is not None and job_id in self._pending:
+            # このワーカーでまだ書き込んでいない進捗を反映する
+            job.update(self._pending[job_id])
+        return job
+
+    async def create(self, job_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def list_jobs(self, statuses: tuple) -> List[Dict[str, Any]]:
+        """指定した状態のジョブ一覧（各要素に job_id を含む）"""
+        raise NotImplementedError
+
+    async def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def _write(self, updates: Dict[str, Dict[str, Any]]):
+        raise NotImplementedError
+
+    async def purge_expired(self) -> int:
+        raise NotImplementedError
+
+
+def _remove_output(job: Dict[str, Any]):
+    # トレースとプロファイル（出力ファイルが無いジョブにもある）
+    for path in (job.get("trace_file"), job.get("cpu_profile_file")):
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("トレースの削除に失敗しました: %s", e)
+    output_file = job.get("output_file")
+    if not output_file:
+        return
+    # 出力ファイルと、再開用のチェックポイント・退避ファイル
+    for path in (output_file, output_file + ".checkpoint.json", output_file + ".ids", output_file + ".rows.jsonl"):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("出力ファイルの削除に失敗しました: %s", e)
+    shutil.rmtree(output_file + ".parts", ignore_errors=True)
+
+
+def _finished_at(job: Dict[str, Any], previous: Optional[float]) -> Optional[float]:
+    if job.get("status") in FINISHED_STATUSES:
+        return previous or time.time()
+    return None
+
+
+class MemoryJobStore(JobStore):
+    """プロセス内の辞書に保存するジョブストア（単一ワーカー・開発用）"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished: Dict[str, float] = {}
+
+    async def create(self, job_id: str, data: Dict[str, Any]):
+        self._jobs[job_id] = dict(data)
+
+    async def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def list_jobs(self, statuses: tuple) -> List[Dict[str, Any]]:
+        return [
+            {**job, "job_id": job_id}
+            for job_id, job in self._jobs.items()
+            if job.get("status") in statuses
+        ]
+
+    async def _write(self, updates: Dict[str, Dict[str, Any]]):
+        for job_id, fields in updates.items():
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            job.update(fields)
+            finished_at = _finished_at(job, self._finished.get(job_id))
+            if finished_at:
+                self._finished[job_id] = finished_at
+
+    async def purge_expired(self) -> int:
+        deadline = time.time() - self.ttl
+        expired = [job_id for job_id, at in self._finished.items() if at < deadline]
+        for job_id in expired:
+            _remove_output(self._jobs.pop(job_id, {}))
+            del self._finished[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLiteに保存するジョブストア
+
+    WALモードで開くため、同じファイルを複数のuvicornワーカーから読み書きできる。
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    async def create(self, job_id: str, data: Dict[str, Any]):
+        await self._run(self._create_sync, job_id, data)
+
+    def _create_sync(self, job_id: str, data: Dict[str, Any]):
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO jobs (job_id, status, data, created_at, updated_at, finished_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, data.get("status", "pending"), json.dumps(data, ensure_ascii=False), now, now, _finished_at(data, None)),
+        )
+
+    async def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._read_sync, job_id)
+
+    def _read_sync(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def list_jobs(self, statuses: tuple) -> List[Dict[str, Any]]:
+        return await self._run(self._list_sync, statuses)
+
+    def _list_sync(self, statuses: tuple) -> List[Dict[str, Any]]:
+        placeholders = ", ".join("?" for _ in statuses)
+        rows = self._conn.execute(
+            f"SELECT job_id, data FROM jobs WHERE status IN ({placeholders})", tuple(statuses)
+        ).fetchall()
+        return [{**json.loads(data), "job_id": job_id} for job_id, data in rows]
+
+    async def _write(self, updates: Dict[str, Dict[str, Any]]):
+        await self._run(self._write_sync, updates)
+
+    def _write_sync(self, updates: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        # 複数ジョブの更新を1トランザクションにまとめる
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for job_id, fields in updates.items():
+                row = self._conn.execute(
+                    "SELECT data, finished_at FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                job = json.loads(row[0])
+                job.update(fields)
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, data = ?, updated_at = ?, finished_at = ? WHERE job_id = ?",
+                    (job.get("status", "pending"), json.dumps(job, ensure_ascii=False), now, _finished_at(job, row[1]), job_id),
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def purge_expired(self) -> int:
+        return await self._run(self._purge_sync)
+
+    def _purge_sync(self) -> int:
+        deadline = time.time() - self.ttl
+        rows: List[tuple] = self._conn.execute(
+            "SELECT job_id, data FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (deadline,)
+        ).fetchall()
+        for job_id, data in rows:
+            _remove_output(json.loads(data))
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return len(rows)
+
+    async def close(self):
+        await super().close()
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_store() -> JobStore:
+    """環境変数の設定に応じたジョブストアを作成"""
+    backend = os.environ.get("JOB_STORE", "sqlite")
+    ttl = float(os.environ.get("JOB_TTL", "86400"))
+    flush_interval = float(os.environ.get("JOB_STORE_FLUSH_INTERVAL", "1.0"))
+    if backend == "memory":
+        return MemoryJobStore(ttl=ttl, flush_interval=flush_interval)
+    if backend == "sqlite":
+        path = os.environ.get("JOB_STORE_PATH", "./output/jobs.sqlite3")
+        return SQLiteJobStore(path, ttl=ttl, flush_interval=flush_interval)
+    raise ValueError(f"未対応のジョブストアです: {backend}")
+
+
+# アプリケーション全体で共有するジョブストア
+job_store = create_job_store()
@@ -0,0 +1,140 @@
+"""
+ログ設定モジュール
+ログをキュー経由で別スレッドから出力し（イベントループで標準出力への書き込みを待たない）、
+ジョブIDなどのコンテキストを付けた構造化JSONとして書き出す
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+# ログのコンテキスト（ジョブID・シャード番号など。タスクを作成すると引き継がれる）
+_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+# LogRecord が標準で持つ属性（これ以外は extra で渡された項目として出力する）
+_STANDARD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "context"}
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """ブロック内（とそこから作成したタスク）のログに fields を付ける"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """ログを出したタスクのコンテキストを記録に付ける（キューに入れる前に呼び出し元で実行する）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """1行1レコードのJSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(getattr(record, "context", {}))
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """開発用の1行テキスト（コンテキストは key=value で末尾に付ける）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} [{record.levelname}] {record.name}: {record.getMessage()}"
+        fields = dict(getattr(record, "context", {}))
+        fields.update((key, value) for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 書式化は出力スレッドで行う（引数を文字列にするのはここで済ませ、後から変わらないようにする）
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    ルートロガーにキュー経由のハンドラを設定し、出力スレッドを開始する
+
+    Args:
+        level: ルートのログレベル（省略時は環境変数 LOG_LEVEL、デフォルト INFO）
+        fmt: json または text（省略時は環境変数 LOG_FORMAT、デフォルト json）
+    """
+    global _listener
+    if _listener is not None:
+        return
+    fmt = fmt or os.environ.get("LOG_FORMAT", "json")
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if fmt == "text" else JSONFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    """キューに残ったログを書き出して出力スレッドを止める"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_level(level: str, logger: Optional[str] = None):
+    """
+    実行中にログレベルを変更する（logger を省略した場合はルート）
+
+    Raises:
+        ValueError: 不明なログレベルの場合
+    """
+    level = level.upper()
+    if level not in LEVELS:
+        raise ValueError(f"不明なログレベルです: {level}（{' / '.join(LEVELS)}）")
+    logging.getLogger(logger).setLevel(level)
+
+
+def levels() -> Dict[str, str]:
+    """ルートと、個別にレベルを設定したロガーのレベル"""
+    result = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            result[name] = logging.getLevelName(logger.level)
+    return result
@@ -0,0 +1,129 @@
+"""
+メトリクスモジュール
+収集エンジンの処理時間・再試行・リソース使用量を Prometheus 形式で公開する（prometheus_client が必要）
+"""
+import os
+from typing import Any, Dict, Optional
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class _NoopMetric:
+    """prometheus_client がインストールされていない場合の代わり（記録を捨てる）"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+
+def _metric(factory_name: str, name: str, documentation: str, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    factory = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[factory_name]
+    return factory(name, documentation, labelnames, **kwargs)
+
+
+# --- 処理時間 ---
+
+BROWSER_LAUNCH_SECONDS = _metric(
+    "histogram", "xscraper_browser_launch_seconds", "Chromiumの起動にかかった時間",
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+INJECT_BOOTSTRAP_SECONDS = _metric(
+    "histogram", "xscraper_inject_bootstrap_seconds", "セッションの復元からインジェクションの準備完了までの時間",
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+GRAPHQL_REQUEST_SECONDS = _metric(
+    "histogram", "xscraper_graphql_request_seconds", "GraphQLリクエスト1回あたりの時間（outcome は ok または失敗の種類）",
+    ("operation", "outcome"),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+PAGE_PARSE_SECONDS = _metric(
+    "histogram", "xscraper_page_parse_seconds", "1ページ分のレスポンスのパースにかかった時間",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+JOB_TWEETS_PER_SECOND = _metric(
+    "histogram", "xscraper_job_tweets_per_second", "ジョブごとの収集速度（ツイート数/実行時間）",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+QUEUE_WAIT_SECONDS = _metric(
+    "histogram", "xscraper_queue_wait_seconds", "ジョブが待ち行列で待った時間",
+    buckets=(0.1, 1, 5, 15, 30, 60, 120, 300, 600, 1800),
+)
+
+# --- 回数 ---
+
+REQUEST_RETRIES_TOTAL = _metric(
+    "counter", "xscraper_request_retries_total", "再試行したリクエストの数（kind は rate_limited / server_error / timeout）", ("kind",)
+)
+REQUEST_TIMEOUTS_TOTAL = _metric(
+    "counter", "xscraper_request_timeouts_total", "タイムアウトしたリクエストの数"
+)
+EMPTY_CURSORS_TOTAL = _metric(
+    "counter", "xscraper_empty_cursors_total", "次のカーソルが無い・更新されなかったページの数（タイムラインの終端）"
+)
+
+# --- 現在値（/metrics の取得時に更新する） ---
+
+RUNNING_JOBS = _metric("gauge", "xscraper_running_jobs", "実行中のジョブ数")
+QUEUED_JOBS = _metric("gauge", "xscraper_queued_jobs", "待ち行列のジョブ数")
+BROWSER_POOL_BROWSERS = _metric(
+    "gauge", "xscraper_browser_pool_browsers", "ブラウザプールのChromium数（state は idle / leased / launching）", ("state",)
+)
+CHROMIUM_RSS_BYTES = _metric(
+    "gauge", "xscraper_chromium_rss_bytes", "このプロセスから起動したChromium（子プロセスを含む）のRSSの合計"
+)
+
+
+def chromium_rss() -> Optional[int]:
+    """
+    このプロセスの子孫のうちChromiumのプロセスのRSSの合計
+
+    psutil が無い場合は None。
+    """
+    if psutil is None:
+        return None
+    total = 0
+    for child in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            name = child.name().lower()
+            if "chrom" in name or "headless_shell" in name:
+                total += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total
+
+
+def refresh(browser_pool_stats: Dict[str, Any], scheduler_stats: Dict[str, Any], rss: Optional[int]):
+    """現在値のメトリクスを更新する"""
+    RUNNING_JOBS.set(scheduler_stats["running"])
+    QUEUED_JOBS.set(scheduler_stats["queued"])
+    for state in ("idle", "leased", "launching"):
+        BROWSER_POOL_BROWSERS.labels(state=state).set(browser_pool_stats[state])
+    if rss is not None:
+        CHROMIUM_RSS_BYTES.set(rss)
+
+
+def render() -> bytes:
+    """Prometheus のテキスト形式で出力する"""
+    return prometheus_client.generate_latest()
+
+
+def content_type() -> str:
+    return prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,365 @@
+"""
+出力ファイル書き込みモジュール
+収集したツイートをページ単位で逐次ファイルへ書き出す
+"""
+import csv
+import gzip
+import io
+import json
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Union
+
+import aiofiles
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# CSVの列（collect_tweets_from_session が生成する行のキー）
+CSV_FIELDNAMES = [
+    "Author Name",
+    "Post Date",
+    "Post Link",
+    "Other Hashtags",
+    "Repost Count",
+    "Impression Count",
+    "Like Count",
+]
+
+# 出力形式ごとの拡張子と Content-Type
+OUTPUT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "csv.zst": (".csv.zst", "application/zstd"),
+    "jsonl": (".jsonl", "application/x-ndjson"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+# Parquet の1つの行グループに入れる行数
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("OUTPUT_PARQUET_ROW_GROUP_SIZE", "10000"))
+
+
+class IncrementalFileWriter:
+    """
+    行をバイト列に変換してページごとに追記し、その都度フラッシュする出力ファイルの共通処理
+
+    最初の行が書き込まれた時点でファイルを作成するため、1件も収集できなかった場合は
+    ファイルが残らない。書き込みの単位ごとにファイルとして完結するため、
+    フラッシュ済みの位置で切り出したものも、切り詰めて追記を再開したものも有効なファイルになる。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.row_count = 0
+        self._file = None
+
+    def _header(self) -> bytes:
+        return b""
+
+    def _encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        raise NotImplementedError
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._file.write(self._header())
+
+    def resume(self, size: int, row_count: int):
+        """
+        チェックポイント時点の内容から追記を再開する
+
+        チェックポイント後に書き込まれた行は切り捨てる。
+        """
+        if size == 0:
+            return
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < size:
+            raise ValueError(f"出力ファイルがチェックポイントより短いため再開できません: {self.path}")
+        os.truncate(self.path, size)
+        self._file = open(self.path, "ab")
+        self.row_count = row_count
+
+    @property
+    def size(self) -> int:
+        """フラッシュ済みのバイト数"""
+        if self._file is None:
+            return os.path.getsize(self.path) if self.row_count and os.path.exists(self.path) else 0
+        return os.fstat(self._file.fileno()).st_size
+
+    def sync(self):
+        """書き込み済みの内容をディスクに永続化"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def filenos(self) -> List[int]:
+        """永続化が必要なファイルのディスクリプタ（書き込みはフラッシュ済み）"""
+        return [self._file.fileno()] if self._file is not None else []
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        """行を書き込み、読み手から見えるようにフラッシュする"""
+        if not rows:
+            return
+        if self._file is None:
+            self._open()
+        self._file.write(self._encode(rows))
+        self._file.flush()
+        self.row_count += len(rows)
+
+    def close(self, keep_journal: bool = False):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class IncrementalCSVWriter(IncrementalFileWriter):
+    """CSVライター（既定ではExcelで開けるようにBOM付きのUTF-8）"""
+
+    def __init__(self, path: str, fieldnames: Optional[List[str]] = None, encoding: str = "utf-8-sig"):
+        super().__init__(path)
+        self.fieldnames = fieldnames or CSV_FIELDNAMES
+        self.encoding = encoding
+        # BOMはファイルの先頭（ヘッダー）にだけ書き込む
+        self._row_encoding = "utf-8" if encoding == "utf-8-sig" else encoding
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=self.fieldnames)
+
+    def _take(self, encoding: str) -> bytes:
+        data = self._buffer.getvalue().encode(encoding)
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def _header(self) -> bytes:
+        self._writer.writeheader()
+        return self._take(self.encoding)
+
+    def _encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        self._writer.writerows(rows)
+        return self._take(self._row_encoding)
+
+
+class CompressedCSVWriter(IncrementalCSVWriter):
+    """
+    gzip / zstd で圧縮したCSVライター
+
+    書き込みの単位ごとに独立した gzip メンバー / zstd フレームとして追記する
+    （連結したものはそのまま1つのファイルとして展開できる）。
+    """
+
+    def __init__(self, path: str, compress: Callable[[bytes], bytes], fieldnames: Optional[List[str]] = None):
+        super().__init__(path, fieldnames, encoding="utf-8")
+        self._compress = compress
+
+    def _header(self) -> bytes:
+        return self._compress(super()._header())
+
+    def _encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        return self._compress(super()._encode(rows))
+
+
+class JSONLWriter(IncrementalFileWriter):
+    """1行に1ツイートのJSONを書き込むライター（数値は数値のまま出力する）"""
+
+    def _encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+class ParquetOutputWriter:
+    """
+    型付きの Parquet ライター
+
+    行は PARQUET_ROW_GROUP_SIZE 件ごとに行グループとして書き込み、フッターは close() で書き込む。
+    Parquet は途中で切り詰めて追記できないため、同じ行を JSONL のジャーナル（path + ".rows.jsonl"）にも
+    ページごとに書き込み、チェックポイントの位置と実行中の部分結果のダウンロードにはジャーナルを使う。
+    再開時はジャーナルから Parquet ファイルを作り直す。
+    """
+
+    def __init__(self, path: str, row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        if pa is None:
+            raise ValueError("Parquet で出力するには pyarrow が必要です")
+        self.path = path
+        self.row_group_size = row_group_size
+        self.journal = JSONLWriter(journal_path(path, "parquet"))
+        self.schema = pa.schema([
+            ("Author Name", pa.string()),
+            ("Post Date", pa.timestamp("ms", tz="UTC")),
+            ("Post Link", pa.string()),
+            ("Other Hashtags", pa.string()),
+            ("Repost Count", pa.int64()),
+            ("Impression Count", pa.int64()),
+            ("Like Count", pa.int64()),
+        ])
+        self._writer = None
+        self._pending: List[Dict[str, Any]] = []
+
+    @property
+    def row_count(self) -> int:
+        return self.journal.row_count
+
+    @property
+    def size(self) -> int:
+        return self.journal.size
+
+    def _table(self, rows: List[Dict[str, Any]]):
+        columns = {name: [row.get(name) for row in rows] for name in CSV_FIELDNAMES}
+        # Post Date は "YYYY-MM-DD HH:MM:SS"（UTC）。想定外の形式は null にする
+        post_date = pc.strptime(
+            pa.array(columns.pop("Post Date"), pa.string()), format="%Y-%m-%d %H:%M:%S", unit="s", error_is_null=True
+        )
+        arrays = {name: pa.array(values, self.schema.field(name).type) for name, values in columns.items()}
+        arrays["Post Date"] = post_date.cast(self.schema.field("Post Date").type)
+        return pa.Table.from_pydict(arrays, schema=self.schema)
+
+    def _write_group(self, rows: List[Dict[str, Any]]):
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+        self._writer.write_table(self._table(rows), row_group_size=self.row_group_size)
+
+    def _flush_groups(self, final: bool = False):
+        while len(self._pending) >= self.row_group_size or (final and self._pending):
+            self._write_group(self._pending[: self.row_group_size])
+            del self._pending[: self.row_group_size]
+
+    def resume(self, size: int, row_count: int):
+        """ジャーナルをチェックポイント時点まで切り詰め、その内容で Parquet ファイルを作り直す"""
+        self.journal.resume(size, row_count)
+        if size == 0:
+            return
+        with open(self.journal.path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._pending.append(json.loads(line))
+                if len(self._pending) >= self.row_group_size:
+                    self._flush_groups()
+
+    def sync(self):
+        self.journal.sync()
+
+    def filenos(self) -> List[int]:
+        return self.journal.filenos()
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        self.journal.write_rows(rows)
+        self._pending.extend(rows)
+        self._flush_groups()
+
+    def close(self, keep_journal: bool = False):
+        """
+        残りの行を書き込んでフッターを閉じる
+
+        keep_journal が False ならジャーナルを削除する（再開する可能性がある場合は True）。
+        """
+        self._flush_groups(final=True)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.journal.close()
+        if not keep_journal and os.path.exists(self.journal.path):
+            os.remove(self.journal.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(keep_journal=exc_type is not None)
+
+
+# collect_tweets_from_session が使うライター（create_writer が返すもの）
+OutputWriter = Union[IncrementalFileWriter, ParquetOutputWriter]
+
+
+def journal_path(path: str, output_format: str) -> Optional[str]:
+    """ジャーナルを使う出力形式の場合、そのパス"""
+    return path + ".rows.jsonl" if output_format == "parquet" else None
+
+
+def output_extension(output_format: str) -> str:
+    return OUTPUT_FORMATS[output_format][0]
+
+
+def output_media_type(output_format: str) -> str:
+    return OUTPUT_FORMATS[output_format][1]
+
+
+def check_output_format(output_format: str):
+    """出力形式が使えるか確認する（使えない場合は ValueError）"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不明な出力形式です: {output_format}（{', '.join(OUTPUT_FORMATS)}）")
+    if output_format == "parquet" and pa is None:
+        raise ValueError("Parquet で出力するには pyarrow が必要です")
+    if output_format == "csv.zst" and zstandard is None:
+        raise ValueError("zstd で圧縮するには zstandard が必要です")
+
+
+def create_writer(path: str, output_format: str = "csv") -> OutputWriter:
+    """出力形式に応じたライターを作成"""
+    check_output_format(output_format)
+    if output_format == "csv":
+        return IncrementalCSVWriter(path)
+    if output_format == "csv.gz":
+        return CompressedCSVWriter(path, lambda data: gzip.compress(data, compresslevel=6))
+    if output_format == "csv.zst":
+        compressor = zstandard.ZstdCompressor(level=3)
+        return CompressedCSVWriter(path, compressor.compress)
+    if output_format == "jsonl":
+        return JSONLWriter(path)
+    return ParquetOutputWriter(path)
+
+
+def iter_rows(path: str, output_format: str = "csv") -> Iterator[Dict[str, Any]]:
+    """
+    出力ファイルの行を先頭から順に読み出す
+
+    CSVの値は文字列、JSONL・Parquetの数値は数値のまま返す（Parquet の Post Date は書き込み時と同じ文字列に戻す）。
+    """
+    check_output_format(output_format)
+    if output_format == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    elif output_format == "parquet":
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                if row["Post Date"] is not None:
+                    row["Post Date"] = row["Post Date"].strftime("%Y-%m-%d %H:%M:%S")
+                yield row
+    else:
+        if output_format == "csv.gz":
+            f = gzip.open(path, "rt", encoding="utf-8", newline="")
+        elif output_format == "csv.zst":
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+            f = io.TextIOWrapper(reader, encoding="utf-8", newline="")
+        else:
+            f = open(path, "r", encoding="utf-8-sig", newline="")
+        with f:
+            yield from csv.DictReader(f)
+
+
+async def iter_file_snapshot(path: str, size: int, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """
+    ファイルの先頭から size バイトまでを返す
+
+    実行中のジョブが書き込み中のファイルを、リクエスト時点の内容で切り出して配信するために使う。
+    """
+    remaining = size
+    async with aiofiles.open(path, "rb") as f:
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,284 @@
+"""
+リクエストのペース制御モジュール
+レスポンスのレート制限情報からトークンバケットを調整し、エラー時はジッター付きの指数バックオフで再試行する
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Optional
+
+
+# 例外メッセージからHTTPステータスを取り出す（レスポンスを観測できなかった場合の予備）
+_STATUS_IN_MESSAGE = re.compile(r"\b(429|5\d\d)\b")
+
+# バックオフの種類
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+
+
+class RequestPacer:
+    """
+    1つのセッション（アカウント）からのリクエスト間隔を制御する
+
+    トークンバケットの容量と補充速度は x-rate-limit-limit / x-rate-limit-remaining /
+    x-rate-limit-reset ヘッダーから合わせ込む。残りに余裕があるうちは待たずに送信し、
+    残りが少なくなるにつれて間隔が広がる。
+    429 はレート制限のリセットまで全リクエストを止め、5xx・タイムアウトはそのリクエストだけを
+    ジッター付きの指数バックオフで再試行する。
+    同じアカウントを使う複数のジョブで共有する場合は、acquire() の owner ごとに順番待ちに1つずつ並ぶため、
+    トークンはジョブの間で均等に割り当てられる。
+    """
+
+    def __init__(
+        self,
+        operation: str = "SearchTimeline",
+        default_limit: int = 50,
+        window: float = 900.0,
+        min_interval: float = 0.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        rate_limit_backoff: float = 60.0,
+    ):
+        self.operation = operation
+        self.window = window
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limit_backoff = rate_limit_backoff
+
+        # ヘッダーを観測するまでは既定値で始める
+        self.capacity = float(default_limit)
+        self.tokens = float(default_limit)
+        self.reset_at: Optional[float] = None
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_sent = 0.0
+        self._last_error_status: Optional[int] = None
+        self._last_error_at = 0.0
+        self._lock = asyncio.Lock()
+        # owner ごとの順番待ち（同じ owner の2つ目以降のリクエストは owner の中で待つ）
+        self._turns: Dict[Any, asyncio.Lock] = {}
+        self._turn_waiters: Dict[Any, int] = {}
+        # このペース制御を使っているジョブの数
+        self.users = 0
+        self.released_at = time.monotonic()
+
+        # 統計情報
+        self.requests_total = 0
+        self.retries_total = 0
+        self.rate_limited_total = 0
+        self.server_errors_total = 0
+        self.wait_total = 0.0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "RequestPacer":
+        """環境変数から設定を読み込んでペース制御を作成"""
+        return cls(
+            default_limit=int(os.environ.get("PACING_DEFAULT_LIMIT", "50")),
+            window=float(os.environ.get("PACING_RATE_WINDOW", "900")),
+            min_interval=float(os.environ.get("COLLECT_PAGE_INTERVAL", "0")),
+            max_retries=int(os.environ.get("PACING_MAX_RETRIES", "5")),
+            backoff_base=float(os.environ.get("PACING_BACKOFF_BASE", "1.0")),
+            backoff_max=float(os.environ.get("PACING_BACKOFF_MAX", "60")),
+            rate_limit_backoff=float(os.environ.get("PACING_RATE_LIMIT_BACKOFF", "60")),
+            **kwargs,
+        )
+
+    @property
+    def refill_rate(self) -> float:
+        """1秒あたりに補充するトークン数"""
+        return self.capacity / self.window
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._refilled_at) * self.refill_rate)
+        self._refilled_at = now
+
+    def next_delay(self) -> float:
+        """次のリクエストを送信できるまでの秒数（トークンは消費しない）"""
+        now = time.monotonic()
+        self._refill(now)
+        delay = max(0.0, self._blocked_until - now, self._last_sent + self.min_interval - now)
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.refill_rate)
+        return delay
+
+    async def acquire(self, owner: Any = None) -> float:
+        """
+        トークンを1つ取得する（必要な分だけ待つ）
+
+        Returns:
+            待った秒数（他のジョブの順番を待った時間を含む）
+        """
+        started = time.monotonic()
+        turn = self._turns.get(owner)
+        if turn is None:
+            turn = self._turns[owner] = asyncio.Lock()
+        self._turn_waiters[owner] = self._turn_waiters.get(owner, 0) + 1
+        try:
+            async with turn, self._lock:
+                while True:
+                    delay = self.next_delay()
+                    if delay <= 0:
+                        break
+                    self.wait_total += delay
+                    await asyncio.sleep(delay)
+                self.record_request()
+        finally:
+            self._turn_waiters[owner] -= 1
+            if not self._turn_waiters[owner]:
+                del self._turn_waiters[owner]
+                del self._turns[owner]
+        return time.monotonic() - started
+
+    def record_request(self):
+        """送信したリクエストを記録する（acquire() を経ずに送信された、ページ内のドライバーの分にも使う）"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        self._last_sent = now
+        self.requests_total += 1
+
+    # --- レスポンスの観測 ---
+
+    def on_response(self, response: Any):
+        """Playwright の response イベントのハンドラ（対象オペレーションのGraphQLレスポンスのみ反映）"""
+        if f"/{self.operation}" not in response.url or "/graphql/" not in response.url:
+            return
+        self.observe(response.status, response.headers)
+
+    def observe(self, status: int, headers: Dict[str, str]):
+        """レスポンスのステータスとレート制限ヘッダーを反映"""
+        now = time.monotonic()
+        if status == 429 or status >= 500:
+            self._last_error_status = status
+            self._last_error_at = now
+
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset = float(headers["x-rate-limit-reset"])
+        except (KeyError, ValueError):
+            return
+
+        self._refill(now)
+        # リセット時刻はUNIX時刻で返るため、monotonic 基準に直す
+        reset_at = now + max(0.0, reset - time.time())
+        if limit > 0:
+            self.capacity = float(limit)
+        if self.reset_at is None or reset_at > self.reset_at + 1:
+            # 新しいウィンドウ: サーバーの残り回数に合わせ、前のウィンドウでの停止を解除する
+            self.tokens = float(remaining)
+            if remaining > 0:
+                self._blocked_until = 0.0
+        else:
+            # 同じウィンドウ: 手元の見積もりがサーバーより多ければ減らす
+            self.tokens = min(self.tokens, float(remaining))
+        self.reset_at = reset_at
+        if remaining <= 0:
+            self._blocked_until = max(self._blocked_until, reset_at)
+
+    def classify_error(self, error: BaseException, started: float) -> Optional[str]:
+        """
+        リクエストの失敗を再試行の種類に分類する
+
+        Returns:
+            RATE_LIMITED / SERVER_ERROR / TIMEOUT、再試行しない失敗の場合は None
+        """
+        if isinstance(error, asyncio.TimeoutError):
+            return TIMEOUT
+        status = self._last_error_status if self._last_error_at >= started else None
+        if status is None:
+            match = _STATUS_IN_MESSAGE.search(str(error))
+            status = int(match.group(1)) if match else None
+        if status == 429:
+            return RATE_LIMITED
+        if status is not None and status >= 500:
+            return SERVER_ERROR
+        return None
+
+    def backoff(self, kind: str, attempt: int) -> float:
+        """
+        attempt 回目の失敗後に待つ秒数
+
+        5xx・タイムアウトはフルジッター（0〜上限の一様乱数）、429 はリセット時刻まで待ち、
+        待っている間は同じセッションの他のリクエストも止める。
+        """
+        now = time.monotonic()
+        if kind == RATE_LIMITED:
+            self.rate_limited_total += 1
+            self.tokens = 0.0
+            exponential = self.rate_limit_backoff * 2 ** (attempt - 1)
+            until_reset = self.reset_at - now if self.reset_at and self.reset_at > now else 0.0
+            delay = max(until_reset, min(exponential, self.window)) + random.uniform(0, self.backoff_base)
+            self._blocked_until = max(self._blocked_until, now + delay)
+        else:
+            if kind == SERVER_ERROR:
+                self.server_errors_total += 1
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        self.retries_total += 1
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 2),
+            "next_delay_sec": round(self.next_delay(), 3),
+            "requests_total": self.requests_total,
+            "retries_total": self.retries_total,
+            "rate_limited_total": self.rate_limited_total,
+            "server_errors_total": self.server_errors_total,
+            "wait_total_sec": round(self.wait_total, 3),
+            "jobs": self.users,
+        }
+
+
+class AccountPacers:
+    """
+    アカウントごとに共有するペース制御
+
+    クッキーから求めたアカウントのキー（session_cache_key）ごとに1つの RequestPacer を持ち、
+    同じアカウントを使う全ジョブのリクエストをそこから払い出す。
+    ジョブが終わった後もレート制限のウィンドウの間は残し、次のジョブに残り回数を引き継ぐ。
+    状態はプロセス内にのみ持つため、共有されるのは同じワーカープロセスのジョブの間だけ
+    （複数ワーカーで起動するとワーカーの数だけ別の予算になる）。
+    """
+
+    def __init__(self):
+        self._pacers: Dict[str, RequestPacer] = {}
+
+    def attach(self, key: str) -> RequestPacer:
+        """ジョブがアカウントの使用を開始する"""
+        self._prune()
+        pacer = self._pacers.get(key)
+        if pacer is None:
+            pacer = self._pacers[key] = RequestPacer.from_env()
+        pacer.users += 1
+        return pacer
+
+    def detach(self, key: str):
+        """ジョブがアカウントの使用を終える"""
+        pacer = self._pacers.get(key)
+        if pacer is not None:
+            pacer.users -= 1
+            pacer.released_at = time.monotonic()
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, pacer in list(self._pacers.items()):
+            if not pacer.users and now - pacer.released_at > pacer.window:
+                del self._pacers[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accounts": len(self._pacers),
+            "jobs": sum(pacer.users for pacer in self._pacers.values()),
+        }
+
+
+# アプリケーション全体で共有するアカウントごとのペース制御
+account_pacers = AccountPacers()
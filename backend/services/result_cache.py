@@ -0,0 +1,221 @@
+"""
+収集結果のキャッシュモジュール
+過去の期間（結果が変わらない時間窓）の収集結果を保存し、同じ条件のジョブではブラウザを起動せずに返す
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from services.dedup import normalize_query_key
+from services.sharding import date_to_epoch
+
+logger = logging.getLogger(__name__)
+
+
+def _link_or_copy(src: str, dst: str):
+    """ハードリンクを作成する（別のファイルシステムなどで作成できなければコピーする）"""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    収集結果のコンテンツアドレス型キャッシュ
+
+    検索条件（正規化した検索ワード・期間・取得件数・出力形式）のキーから、内容のハッシュで保存したファイルを引く。
+    同じ内容の結果は1つのファイルを共有する。終了日がすべて過去（min_age 秒以上前）の期間だけを対象とし、
+    保存から ttl 秒を過ぎたもの、合計サイズが max_bytes を超えた分は最後に使われた時刻の古い順に削除する。
+    ジョブの出力ファイルへはハードリンクで渡すため、キャッシュから削除してもジョブのファイルは残る。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3, ttl: float = 7 * 86400.0, min_age: float = 3600.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # 統計情報
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        """環境変数から設定を読み込んでキャッシュを作成"""
+        return cls(
+            directory=os.environ.get("RESULT_CACHE_DIR", "./output/cache"),
+            max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(1024 ** 3))),
+            ttl=float(os.environ.get("RESULT_CACHE_TTL", str(7 * 86400))),
+            min_age=float(os.environ.get("RESULT_CACHE_MIN_AGE", "3600")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # 最初に使われるまでディレクトリとデータベースを作成しない
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = sqlite3.connect(
+                os.path.join(self.directory, "index.sqlite3"), check_same_thread=False, timeout=30.0, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    blob TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    tweet_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_blob ON entries (blob)")
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def key(self, keyword: str, start_date: str, end_date: str, limit: int, output_format: str) -> Optional[str]:
+        """
+        検索条件のキャッシュキー
+
+        キャッシュが無効な場合と、期間の終わりが min_age 秒前より新しい場合は None。
+        """
+        if not self.enabled:
+            return None
+        until = date_to_epoch(end_date)
+        if until > time.time() - self.min_age:
+            return None
+        normalized = [normalize_query_key(keyword), date_to_epoch(start_date), until, int(limit), output_format]
+        return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+    def _blob_path(self, blob: str) -> str:
+        return os.path.join(self.directory, blob)
+
+    async def fetch(self, key: str, dest: str) -> Optional[int]:
+        """
+        キャッシュ済みの結果を dest に配置する
+
+        Returns:
+            ツイート件数、キャッシュに無い場合は None
+        """
+        return await self._run(self._fetch_sync, key, dest)
+
+    def _fetch_sync(self, key: str, dest: str) -> Optional[int]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT blob, tweet_count FROM entries WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        blob, tweet_count = row
+        try:
+            _link_or_copy(self._blob_path(blob), dest)
+        except FileNotFoundError:
+            # ファイルが外部から削除されていた
+            conn.execute("DELETE FROM entries WHERE blob = ?", (blob,))
+            self.misses += 1
+            return None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return tweet_count
+
+    async def store(self, key: str, path: str, tweet_count: int):
+        """ジョブの出力ファイルをキャッシュに登録する"""
+        await self._run(self._store_sync, key, path, tweet_count)
+
+    def _store_sync(self, key: str, path: str, tweet_count: int):
+        conn = self._connection()
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+        # 内容のハッシュ（拡張子は出力形式のもの）をファイル名にする
+        name = os.path.basename(path)
+        extension = name[name.index("."):] if "." in name else ""
+        blob = _file_digest(path) + extension
+        if not os.path.exists(self._blob_path(blob)):
+            _link_or_copy(path, self._blob_path(blob))
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, blob, size, tweet_count, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, blob, size, tweet_count, now, now),
+        )
+        self.stored += 1
+        self._evict_sync()
+
+    async def evict(self):
+        """期限切れの結果と、上限を超えた分を削除する"""
+        if self.enabled:
+            await self._run(self._evict_sync)
+
+    def _evict_sync(self):
+        conn = self._connection()
+        expired = conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+        self.evicted += max(0, expired)
+        # ファイルごとの合計サイズと最後に使われた時刻（同じファイルを共有するキーのうち最新のもの）
+        blobs = conn.execute(
+            "SELECT blob, MAX(size), MAX(accessed_at) FROM entries GROUP BY blob ORDER BY MAX(accessed_at)"
+        ).fetchall()
+        total = sum(size for _, size, _ in blobs)
+        for blob, size, _ in blobs:
+            if total <= self.max_bytes:
+                break
+            self.evicted += conn.execute("DELETE FROM entries WHERE blob = ?", (blob,)).rowcount
+            total -= size
+        # どのキーからも参照されなくなったファイルを削除する
+        referenced = {blob for (blob,) in conn.execute("SELECT DISTINCT blob FROM entries")}
+        for name in os.listdir(self.directory):
+            if name.startswith("index.sqlite3") or name.endswith(".tmp") or name in referenced:
+                continue
+            try:
+                os.remove(self._blob_path(name))
+            except OSError as e:
+                logger.warning("キャッシュファイルの削除に失敗しました: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "evicted": self.evicted,
+        }
+
+
+# アプリケーション全体で共有する結果キャッシュ
+result_cache = ResultCache.from_env()
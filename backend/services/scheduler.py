@@ -0,0 +1,177 @@
+"""
+ジョブスケジューラ
+同時に実行する収集ジョブの数を制限し、あふれたジョブは待ち行列に入れる
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.browser_pool import browser_pool
+from services.job_store import job_store
+from services.metrics import QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """待ち行列が満杯で、ジョブを受け付けられない"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"待ち行列が満杯です（{retry_after}秒後に再試行してください）")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """
+    上限付きのワーカープールと優先度付き待ち行列
+
+    priority が大きいジョブから、同じ優先度なら投入順（FIFO）に実行する。
+    同時実行数と待ち行列はプロセス内に持つため、複数ワーカーで起動すると上限はワーカーごとに適用される。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_queue: int = 20,
+        on_queue_change: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        if concurrency < 1:
+            raise ValueError("同時実行数は1以上である必要があります")
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.on_queue_change = on_queue_change
+        self._heap: List[Tuple[int, int, str, Callable[[], Awaitable[Any]]]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Condition()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, float] = {}
+        self._enqueued_at: Dict[str, float] = {}
+
+        # 統計情報（待ち時間の見積もりに使う）
+        self._completed_total = 0
+        self._rejected_total = 0
+        self._duration_total = 0.0
+        self._queue_wait_total = 0.0
+
+    @classmethod
+    def from_env(cls, default_concurrency: int = 4, **kwargs) -> "JobScheduler":
+        """環境変数から設定を読み込んでスケジューラを作成"""
+        return cls(
+            concurrency=int(os.environ.get("SCHEDULER_CONCURRENCY", str(default_concurrency))),
+            max_queue=int(os.environ.get("SCHEDULER_MAX_QUEUE", "20")),
+            **kwargs,
+        )
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def queued(self) -> int:
+        return len(self._heap)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def is_full(self) -> bool:
+        return len(self._heap) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """待ち行列が空くまでの見積もり秒数"""
+        # 実行中のいずれかのジョブが終われば、待ち行列の先頭が動いて1枠空く
+        average = self._duration_total / self._completed_total if self._completed_total else 60.0
+        return max(1, int(average / self.concurrency))
+
+    def submit(self, job_id: str, run: Callable[[], Awaitable[Any]], priority: int = 0) -> int:
+        """
+        ジョブを待ち行列に追加
+
+        Returns:
+            待ち行列内の順番（1始まり）
+
+        Raises:
+            QueueFullError: 待ち行列が満杯の場合
+        """
+        if self.is_full():
+            self._rejected_total += 1
+            raise QueueFullError(self.retry_after())
+        heapq.heappush(self._heap, (-priority, next(self._seq), job_id, run))
+        self._enqueued_at[job_id] = time.monotonic()
+        self._notify_queue_change()
+        asyncio.create_task(self._wake())
+        return self.position(job_id)
+
+    async def _wake(self):
+        async with self._wakeup:
+            self._wakeup.notify()
+
+    def positions(self) -> Dict[str, int]:
+        """待機中のジョブごとの順番（1始まり）"""
+        return {entry[2]: i + 1 for i, entry in enumerate(sorted(self._heap))}
+
+    def position(self, job_id: str) -> Optional[int]:
+        return self.positions().get(job_id)
+
+    def _notify_queue_change(self):
+        if self.on_queue_change:
+            self.on_queue_change(self.positions())
+
+    async def _worker(self):
+        while True:
+            async with self._wakeup:
+                while not self._heap:
+                    await self._wakeup.wait()
+                _, _, job_id, run = heapq.heappop(self._heap)
+            self._notify_queue_change()
+
+            started = time.monotonic()
+            queue_wait = started - self._enqueued_at.pop(job_id, started)
+            self._queue_wait_total += queue_wait
+            QUEUE_WAIT_SECONDS.observe(queue_wait)
+            self._running[job_id] = started
+            try:
+                await run()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job failed in scheduler", extra={"job_id": job_id})
+            finally:
+                del self._running[job_id]
+                self._completed_total += 1
+                self._duration_total += time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed_total": self._completed_total,
+            "rejected_total": self._rejected_total,
+            "avg_duration_sec": round(self._duration_total / self._completed_total, 3) if self._completed_total else 0.0,
+            "avg_queue_wait_sec": round(self._queue_wait_total / self._completed_total, 3) if self._completed_total else 0.0,
+        }
+
+
+def _store_queue_positions(positions: Dict[str, int]):
+    # 他のワーカーからも待ち順が見えるようにジョブストアへ記録する
+    for job_id, position in positions.items():
+        job_store.update_progress(job_id, queue_position=position)
+
+
+# アプリケーション全体で共有するスケジューラ（既定の同時実行数はブラウザプールの上限に合わせる）
+scheduler = JobScheduler.from_env(
+    default_concurrency=browser_pool.max_size,
+    on_queue_change=_store_queue_positions,
+)
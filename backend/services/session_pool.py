@@ -0,0 +1,234 @@
+"""
+セッションプール管理モジュール
+サーバー側に複数アカウントのセッションを保持し、レート制限を受けたアカウントのクールダウンを管理する
+"""
+import glob
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote
+
+# 親ディレクトリをパスに追加して、twitter_api_browser_pythonモジュールをインポート可能にする
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from twitter_api_browser_python.main import session_cache_key
+from services.session_manager import load_session_from_file, load_session_from_json
+
+logger = logging.getLogger(__name__)
+
+
+class SessionAccount:
+    """
+    1つのアカウントのセッション
+
+    クールダウンはアカウント単位で、同じアカウントを使う全ジョブで共有する。
+    """
+
+    def __init__(self, session_json: Dict[str, Any], source: str = "upload"):
+        self.session_json = session_json
+        self.key = session_cache_key(session_json)
+        self.source = source
+        self.cooldown_until = 0.0
+        self.rate_limited_total = 0
+        self.added_at = time.time()
+
+    @property
+    def account_id(self) -> str:
+        """APIで使う識別子（クッキーのハッシュの先頭）"""
+        return self.key[:16]
+
+    @property
+    def label(self) -> str:
+        """表示用の名前（twid クッキーのユーザーID、無ければ識別子）"""
+        for cookie in self.session_json.get("cookies", []):
+            if cookie.get("name") == "twid":
+                return unquote(cookie.get("value", "")).removeprefix("u=") or self.account_id
+        return self.account_id
+
+    def cooldown_remaining(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def cooldown(self, seconds: float):
+        """レート制限を受けたアカウントを seconds 秒間使わない"""
+        self.rate_limited_total += 1
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # クッキーの値は返さない
+        return {
+            "account_id": self.account_id,
+            "label": self.label,
+            "source": self.source,
+            "cooldown_sec": round(self.cooldown_remaining(), 1),
+            "rate_limited_total": self.rate_limited_total,
+        }
+
+
+class AccountLane:
+    """
+    ジョブ内の1アカウント分のリクエスト経路（ブラウザコンテキストのインジェクションとペース制御）
+
+    ペース制御は同じアカウントを使う他のジョブと共有するため、リクエスト数と待ち時間はこのジョブの分を数える。
+    """
+
+    def __init__(self, account: SessionAccount, inject: Any, pacer: Any):
+        self.account = account
+        self.inject = inject
+        self.pacer = pacer
+        # 最後に選ばれた順番（送信できるまでの時間が同じなら、長く使っていないものを選ぶ）
+        self.picked_at = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.wait = 0.0
+        # 同じアカウントを同時に使っていたジョブの数の最大（このジョブを含む）
+        self.shared_jobs = 1
+
+    def record(self, waited: float = 0.0):
+        """このジョブで送信したリクエストと、送信まで待った秒数を記録する"""
+        self.requests += 1
+        self.wait += waited
+        self.shared_jobs = max(self.shared_jobs, self.pacer.users)
+
+    def limit(self, seconds: float):
+        """レート制限を受けたアカウントをクールダウンに入れる"""
+        self.rate_limited += 1
+        self.account.cooldown(seconds)
+
+    def delay(self) -> float:
+        """このアカウントで次のリクエストを送信できるまでの秒数"""
+        return max(self.account.cooldown_remaining(), self.pacer.next_delay())
+
+
+class AccountLanes:
+    """
+    ジョブが使うアカウントの集合
+
+    リクエストごとに最も早く送信できるアカウントを選ぶため、1つのジョブのページングやシャードが
+    複数のアカウントに分散する。レート制限を受けたアカウントはクールダウンが明けるまで選ばない。
+    """
+
+    def __init__(self, lanes: List[AccountLane]):
+        if not lanes:
+            raise ValueError("使用できるアカウントがありません")
+        self.lanes = lanes
+        self._picks = 0
+
+    def __len__(self) -> int:
+        return len(self.lanes)
+
+    def pick(self, exclude: Optional[AccountLane] = None) -> AccountLane:
+        candidates = [lane for lane in self.lanes if lane is not exclude] or self.lanes
+        lane = min(candidates, key=lambda lane: (lane.delay(), lane.picked_at))
+        self._picks += 1
+        lane.picked_at = self._picks
+        return lane
+
+    def has_alternative(self, lane: AccountLane) -> bool:
+        """lane の他にクールダウン中でないアカウントがあるか"""
+        return any(other is not lane and other.account.cooldown_remaining() <= 0 for other in self.lanes)
+
+    def wait_total(self) -> float:
+        return sum(lane.wait for lane in self.lanes)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "account_id": lane.account.account_id,
+                "label": lane.account.label,
+                "requests": lane.requests,
+                "rate_limited": lane.rate_limited,
+                "wait_sec": round(lane.wait, 3),
+                "shared_jobs": lane.shared_jobs,
+            }
+            for lane in self.lanes
+        ]
+
+
+def validate_session(session_data: Any) -> Dict[str, Any]:
+    """
+    プールに登録できるセッションか検証する
+
+    Raises:
+        ValueError: セッションデータが無効な場合
+    """
+    session_data = load_session_from_json(session_data)
+    if not any(c.get("name") == "auth_token" and c.get("value") for c in session_data["cookies"]):
+        raise ValueError("セッションデータに'auth_token'クッキーが含まれていません")
+    return session_data
+
+
+class SessionPool:
+    """
+    サーバー側で保持するアカウントのセッション
+
+    起動時に SESSION_POOL_DIR の *.json を読み込み、API（SESSION_POOL_ADMIN_TOKEN が必要）から追加・削除できる。
+    APIから追加したセッションとクールダウンはこのプロセスのメモリにのみ保持するため、
+    複数ワーカーで起動している場合は管理APIを断る（worker_registry）。
+    """
+
+    def __init__(self):
+        self._accounts: Dict[str, SessionAccount] = {}
+
+    @classmethod
+    def from_env(cls) -> "SessionPool":
+        """環境変数の設定に応じてプールを作成し、ディレクトリのセッションを読み込む"""
+        pool = cls()
+        directory = os.environ.get("SESSION_POOL_DIR")
+        if directory:
+            for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+                try:
+                    pool.add(load_session_from_file(path), source=os.path.basename(path))
+                except (OSError, ValueError) as e:
+                    logger.warning("セッションを読み込めませんでした (%s): %s", path, e)
+        return pool
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def add(self, session_data: Any, source: str = "upload") -> SessionAccount:
+        """セッションを検証して登録（同じアカウントは置き換える）"""
+        account = SessionAccount(validate_session(session_data), source)
+        previous = self._accounts.get(account.key)
+        if previous is not None:
+            # クールダウンは引き継ぐ
+            account.cooldown_until = previous.cooldown_until
+            account.rate_limited_total = previous.rate_limited_total
+        self._accounts[account.key] = account
+        return account
+
+    def remove(self, account_id: str) -> bool:
+        for key, account in list(self._accounts.items()):
+            if account.account_id == account_id:
+                del self._accounts[key]
+                return True
+        return False
+
+    def account_for(self, session_json: Dict[str, Any]) -> SessionAccount:
+        """
+        アップロードされたセッションのアカウント
+
+        プールに同じアカウントがあれば、クールダウンを共有するためにそれを返す。
+        """
+        account = self._accounts.get(session_cache_key(session_json))
+        return account if account is not None else SessionAccount(session_json)
+
+    def select(self, count: int) -> List[SessionAccount]:
+        """クールダウンの残りが短い順に最大 count 個のアカウントを選ぶ"""
+        accounts = sorted(self._accounts.values(), key=lambda x: x.cooldown_remaining())
+        return accounts[:count]
+
+    def list_accounts(self) -> List[Dict[str, Any]]:
+        return [account.to_dict() for account in self._accounts.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accounts": len(self._accounts),
+            "cooling_down": sum(1 for account in self._accounts.values() if account.cooldown_remaining() > 0),
+        }
+
+
+# アプリケーション全体で共有するセッションプール
+session_pool = SessionPool.from_env()
@@ -0,0 +1,346 @@
+"""
+期間分割モジュール
+[start_date, end_date) を複数の時間窓（シャード）に分けて並列に収集するための部品
+"""
+import bisect
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from services.dedup import row_tweet_id
+from services.output_writer import OutputWriter
+
+
+# 直近のページの密度から残りの件数を推定し、これを超えるシャードは分割する
+SPLIT_TARGET_TWEETS = int(os.environ.get("SHARD_SPLIT_TARGET_TWEETS", "1000"))
+# これより短い時間窓は分割しない（秒）
+SPLIT_MIN_WINDOW = int(os.environ.get("SHARD_SPLIT_MIN_WINDOW", "3600"))
+# 1ジョブあたりのシャード数の上限（再分割を含む）
+MAX_TOTAL_SHARDS = int(os.environ.get("SHARD_MAX_TOTAL", "32"))
+
+
+def date_to_epoch(date_str: str) -> int:
+    """YYYY-MM-DD をUTCの0時のUNIX時刻に変換"""
+    return int(datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+def row_timestamp(row: Dict[str, Any]) -> Optional[int]:
+    """行の投稿日時（UTC）をUNIX時刻で返す"""
+    try:
+        dt = datetime.strptime(row["Post Date"], "%Y-%m-%d %H:%M:%S")
+    except (KeyError, ValueError):
+        return None
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+class Shard:
+    """
+    収集対象の時間窓 [since, until)
+
+    floor より古いツイートは別のシャードが担当するため、ここでは捨てて終了する。
+    再分割すると floor が引き上げられ、[since, floor) は新しいシャードに移る。
+    min_id を指定すると（差分収集）、そのID以下のツイートは収集済みとして捨てて終了する。
+    """
+
+    def __init__(self, index: int, since: int, until: int):
+        self.index = index
+        self.since = since
+        self.until = until
+        self.floor = since
+        # 次にリクエストするページのカーソル（チェックポイントから再開するために保持）
+        self.cursor: Optional[str] = None
+        self.row_count = 0
+        self.page_count = 0
+        self.oldest_seen: Optional[int] = None
+        # 直近のページの件数と、そのページが覆った時間幅（密度の推定に使う）
+        self.last_page_rows = 0
+        self.last_page_span = 0
+        self.done = False
+        self.error: Optional[str] = None
+        self.min_id: Optional[int] = None
+
+    def query(self, keyword: str) -> str:
+        return f"{keyword} since_time:{self.since} until_time:{self.until}"
+
+    def accept(self, rows: List[Dict[str, Any]]) -> tuple:
+        """
+        担当範囲内の行だけを返す
+
+        Returns:
+            (範囲内の行, floor に到達したか)
+        """
+        accepted = []
+        reached_floor = False
+        previous_oldest = self.oldest_seen if self.oldest_seen is not None else self.until
+        for row in rows:
+            if self.min_id is not None:
+                tweet_id = row_tweet_id(row)
+                if tweet_id is not None and tweet_id <= self.min_id:
+                    reached_floor = True
+                    continue
+            ts = row_timestamp(row)
+            if ts is not None:
+                if ts < self.floor:
+                    reached_floor = True
+                    continue
+                if self.oldest_seen is None or ts < self.oldest_seen:
+                    self.oldest_seen = ts
+            accepted.append(row)
+        self.page_count += 1
+        if self.oldest_seen is not None:
+            self.last_page_rows = len(accepted)
+            self.last_page_span = max(1, previous_oldest - self.oldest_seen)
+        return accepted, reached_floor
+
+    def split(self, next_index: int) -> Optional["Shard"]:
+        """
+        直近のページの密度から残りが多いと判断できれば、未取得部分の古い半分を新しいシャードとして切り出す
+        """
+        if self.oldest_seen is None or self.last_page_rows == 0:
+            return None
+        remaining_span = self.oldest_seen - self.floor
+        if remaining_span < 2 * SPLIT_MIN_WINDOW:
+            return None
+        estimated = self.last_page_rows / self.last_page_span * remaining_span
+        if estimated <= SPLIT_TARGET_TWEETS:
+            return None
+        mid = self.floor + remaining_span // 2
+        child = Shard(next_index, self.floor, mid)
+        child.min_id = self.min_id
+        self.floor = mid
+        return child
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "since": self.since,
+            "until": self.until,
+            "floor": self.floor,
+            "cursor": self.cursor,
+            "row_count": self.row_count,
+            "page_count": self.page_count,
+            "oldest_seen": self.oldest_seen,
+            "done": self.done,
+            "error": self.error,
+            "min_id": self.min_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Shard":
+        shard = cls(data["index"], data["since"], data["until"])
+        shard.floor = data["floor"]
+        shard.cursor = data.get("cursor")
+        shard.row_count = data.get("row_count", 0)
+        shard.page_count = data.get("page_count", 0)
+        shard.oldest_seen = data.get("oldest_seen")
+        shard.done = data.get("done", False)
+        shard.error = data.get("error")
+        shard.min_id = data.get("min_id")
+        return shard
+
+
+def plan_shards(start_date: str, end_date: str, max_shards: int, min_since: Optional[int] = None) -> List[Shard]:
+    """
+    期間を日単位で最大 max_shards 個の時間窓に分割（新しい順）
+
+    min_since を指定すると、開始をその時刻まで遅らせる（差分収集。期間が残らなければ空のリスト）。
+    """
+    since = date_to_epoch(start_date)
+    until = date_to_epoch(end_date)
+    if until <= since:
+        raise ValueError("終了日は開始日より後である必要があります")
+    if min_since is not None:
+        since = max(since, min_since)
+        if until <= since:
+            return []
+    days = (until - since) // 86400
+    count = max(1, min(max_shards, days))
+    step = (until - since) // count
+    bounds = [since + step * i for i in range(count)] + [until]
+    shards = [Shard(i, bounds[i], bounds[i + 1]) for i in range(count)]
+    shards.reverse()
+    return shards
+
+
+class LimitBudget:
+    """
+    全シャードで共有する取得件数の上限
+
+    結果は新しい時間窓から順に limit 件とするため、シャードが確保できるのは、それより新しいシャードの
+    行数を差し引いた残りだけ。確保した後に新しいシャードの行が増えた分は、書き込み時に切り捨てる。
+    """
+
+    def __init__(self, limit: int, shards: List[Shard]):
+        self.limit = limit
+        # 新しい順のシャード（OrderedShardWriter.shards）
+        self.shards = shards
+
+    @property
+    def used(self) -> int:
+        return min(self.limit, sum(shard.row_count for shard in self.shards))
+
+    @property
+    def exhausted(self) -> bool:
+        return sum(shard.row_count for shard in self.shards) >= self.limit
+
+    def remaining(self, shard: Shard) -> int:
+        """shard とそれより新しいシャードの行数を除いた、shard が確保できる残りの件数"""
+        used = 0
+        for other in self.shards:
+            used += other.row_count
+            if other is shard:
+                break
+        return self.limit - used
+
+    def full(self, shard: Shard) -> bool:
+        """shard の続きの行が結果に入る余地が無いか"""
+        return self.remaining(shard) <= 0
+
+    def claim(self, shard: Shard, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """shard の残り分だけ行を確保して返す"""
+        return rows[: max(0, self.remaining(shard))]
+
+
+class OrderedShardWriter:
+    """
+    シャードの結果を新しい順（時間窓の until の降順）に1つのファイルへまとめる
+
+    先頭のシャードは出力ファイルへ直接書き込み、それ以外は一時ファイルに退避する。
+    先頭のシャードが終わると、次のシャードの退避分を出力ファイルへ移して先頭を進める。
+    エラーで終わったシャードの先には進めない（再開時にそのシャードの続きを、より古いシャードより先に書き込む）。
+    limit を指定すると、出力ファイルには先頭から limit 件までを書き込み、残りは捨てる。
+    """
+
+    def __init__(self, writer: OutputWriter, limit: Optional[int] = None):
+        self.writer = writer
+        self.limit = limit
+        self.spool_dir = writer.path + ".parts"
+        self._order: List[Shard] = []
+        self._keys: List[int] = []
+        self._head = 0
+        self._spools: Dict[int, Any] = {}
+        # 上限を超えて捨てた行のツイートID（収集済みIDとして保存しない）
+        self.dropped_ids: Set[int] = set()
+
+    @property
+    def shards(self) -> List[Shard]:
+        """新しい順のシャード"""
+        return self._order
+
+    def add(self, shard: Shard):
+        key = -shard.until
+        pos = bisect.bisect_right(self._keys, key)
+        self._keys.insert(pos, key)
+        self._order.insert(pos, shard)
+
+    def _is_head(self, shard: Shard) -> bool:
+        return self._head < len(self._order) and self._order[self._head] is shard
+
+    def write(self, shard: Shard, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        shard.row_count += len(rows)
+        if self._is_head(shard):
+            self._write_output(rows)
+            return
+        spool = self._spools.get(shard.index)
+        if spool is None:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            spool = open(self._spool_path(shard), "w+", encoding="utf-8")
+            self._spools[shard.index] = spool
+        for row in rows:
+            spool.write(json.dumps(row, ensure_ascii=False))
+            spool.write("\n")
+        spool.flush()
+
+    def _write_output(self, rows: List[Dict[str, Any]]):
+        if self.limit is not None:
+            room = max(0, self.limit - self.writer.row_count)
+            for row in rows[room:]:
+                tweet_id = row_tweet_id(row)
+                if tweet_id is not None:
+                    self.dropped_ids.add(tweet_id)
+            rows = rows[:room]
+        self.writer.write_rows(rows)
+
+    def _spool_path(self, shard: Shard) -> str:
+        return os.path.join(self.spool_dir, f"{shard.index}.jsonl")
+
+    def finish(self, shard: Shard):
+        shard.done = True
+        self._advance()
+
+    def _advance(self):
+        while self._head < len(self._order) and self._order[self._head].done and not self._order[self._head].error:
+            self._head += 1
+            if self._head < len(self._order):
+                self._drain(self._order[self._head])
+
+    def flush(self):
+        """
+        残りのシャードの退避分をすべて順に出力ファイルへ移す
+
+        エラーで終わったシャードを再開しない場合の終了処理。
+        """
+        for shard in self._order[self._head:]:
+            self._drain(shard)
+        self._head = len(self._order)
+
+    def _drain(self, shard: Shard, batch_size: int = 500):
+        """退避していた行を出力ファイルへ移す"""
+        spool = self._spools.pop(shard.index, None)
+        if spool is None:
+            return
+        spool.seek(0)
+        batch = []
+        for line in spool:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                self._write_output(batch)
+                batch = []
+        self._write_output(batch)
+        spool.close()
+        os.remove(spool.name)
+
+    def filenos(self) -> List[int]:
+        """永続化が必要な出力ファイルと退避ファイルのディスクリプタ"""
+        return self.writer.filenos() + [spool.fileno() for spool in self._spools.values()]
+
+    def state(self) -> Dict[str, Any]:
+        """チェックポイントに保存する書き込み位置"""
+        return {
+            "output_size": self.writer.size,
+            "output_rows": self.writer.row_count,
+            "spool_sizes": {
+                str(index): os.fstat(spool.fileno()).st_size for index, spool in self._spools.items()
+            },
+            "dropped_ids": sorted(self.dropped_ids),
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        """
+        チェックポイント時点の書き込み位置に戻す
+
+        add() で全シャードを登録した後に呼び出す。チェックポイント後に書き込まれた分は切り捨てる。
+        """
+        self.writer.resume(state["output_size"], state["output_rows"])
+        self.dropped_ids = set(state.get("dropped_ids", ()))
+        by_index = {shard.index: shard for shard in self._order}
+        for index, size in state["spool_sizes"].items():
+            shard = by_index[int(index)]
+            path = self._spool_path(shard)
+            os.truncate(path, size)
+            self._spools[shard.index] = open(path, "a+", encoding="utf-8")
+        self._head = 0
+        if self._order:
+            self._drain(self._order[0])
+        self._advance()
+
+    def close(self, keep_spools: bool = False):
+        for spool in self._spools.values():
+            spool.close()
+        self._spools.clear()
+        if not keep_spools:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
@@ -0,0 +1,61 @@
+"""
+処理ステージごとの時間計測モジュール
+収集ループのどこが律速になっているかを確認するために使う
+"""
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# 親ディレクトリをパスに追加して、twitter_api_browser_pythonモジュールをインポート可能にする
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from twitter_api_browser_python.tracing import span
+
+
+class StageTimer:
+    """
+    ステージ名ごとに処理時間（回数・合計・最大）を集計する
+
+    *.blocked は後段のキューが満杯で待った時間（後段が律速）、
+    *.starved は前段からの入力を待った時間（前段が律速）を表す。
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        stats = self._stats.get(stage)
+        if stats is None:
+            self._stats[stage] = [1, seconds, seconds]
+            return
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """ステージの処理時間を計測する（ジョブのトレースにもスパンとして記録する）"""
+        started = time.perf_counter()
+        try:
+            with span(stage, "stage"):
+                yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """合計時間の長い順にステージごとの集計を返す"""
+        return {
+            stage: {
+                "count": int(count),
+                "total_sec": round(total, 3),
+                "avg_ms": round(total / count * 1000, 2),
+                "max_ms": round(maximum * 1000, 2),
+            }
+            for stage, (count, total, maximum) in sorted(self._stats.items(), key=lambda x: -x[1][1])
+        }
+
+    def format(self) -> str:
+        return ", ".join(f"{stage}={stats['total_sec']}s/{stats['count']}" for stage, stats in self.summary().items())
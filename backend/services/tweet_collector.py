@@ -3,11 +3,12 @@
 既存のcollect_tweets.pyを拡張してAPIから呼び出せるようにする
 """
 import asyncio
-import csv
 import json
+import logging
 import os
 import sys
-from datetime import datetime
+import time
+from contextlib import AsyncExitStack
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
@@ -15,305 +16,789 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from twitter_api_browser_python.main import TwitterAPIBrowser
+from twitter_api_browser_python.timeline_parser import parse_bottom_cursor, parse_search_timeline
+from twitter_api_browser_python.tracing import Trace, activate, deactivate, span
+from services.browser_pool import browser_pool
+from services.output_writer import create_writer
+from services.checkpoint import CollectionCheckpoint
+from services.dedup import TweetIdSet, seen_id_store
+from services.incremental import incremental_store
+from services.pacing import RATE_LIMITED, TIMEOUT, account_pacers
+from services.metrics import (
+    EMPTY_CURSORS_TOTAL,
+    GRAPHQL_REQUEST_SECONDS,
+    INJECT_BOOTSTRAP_SECONDS,
+    JOB_TWEETS_PER_SECOND,
+    PAGE_PARSE_SECONDS,
+    REQUEST_RETRIES_TOTAL,
+    REQUEST_TIMEOUTS_TOTAL,
+)
+from services.session_pool import AccountLane, AccountLanes, SessionAccount, session_pool
+from services.log import log_context
+from services.stage_timer import StageTimer
+from services.sharding import (
+    MAX_TOTAL_SHARDS,
+    LimitBudget,
+    OrderedShardWriter,
+    Shard,
+    plan_shards,
+)
+
+
+# 期間を分割する初期シャード数の上限
+MAX_SHARDS = int(os.environ.get("COLLECT_MAX_SHARDS", "4"))
+# 同時にページングするシャード数
+SHARD_CONCURRENCY = int(os.environ.get("COLLECT_SHARD_CONCURRENCY", "3"))
+# レスポンスをページ内で行とカーソルだけに絞り込んでから受け取るか
+IN_PAGE_PROJECTION = os.environ.get("COLLECT_IN_PAGE_PROJECTION", "0") == "1"
+# ページ内のドライバーでカーソルをたどり、結果をストリームで受け取るか（ページ内の射影を使う）
+STREAMING = os.environ.get("COLLECT_STREAMING", "0") == "1"
+# 取得・パース・書き込みの各ステージ間のキューの長さ（先読みするページ数の上限）
+PIPELINE_DEPTH = int(os.environ.get("COLLECT_PIPELINE_DEPTH", "2"))
+# 1リクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = float(os.environ.get("COLLECT_REQUEST_TIMEOUT", "30"))
+# ジョブごとにトレースを記録するか
+TRACE_ENABLED = os.environ.get("COLLECT_TRACE", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+def _search_variables(query: str, cursor: Optional[str]) -> Dict[str, Any]:
+    variables = {
+        "rawQuery": query,
+        "count": 50,
+        "querySource": "typed_query",
+        "product": "Latest",
+        "withGrokTranslatedBio": False,
+    }
+    if cursor:
+        variables["cursor"] = cursor
+    return variables
+
+
+async def _request_page(
+    lanes: AccountLanes,
+    query: str,
+    cursor: Optional[str],
+    report,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    SearchTimelineを1ページ分リクエスト（レート制限・サーバーエラー・タイムアウト時はバックオフして再試行）
+
+    最も早く送信できるアカウントを使う。レート制限を受けたアカウントはクールダウンに入れ、
+    他に使えるアカウントがあれば待たずにそちらで再試行する。
+    projection を指定した場合はページ内で射影した {"rows", "cursor"} を返す。
+
+    Raises:
+        KeyError: ページ内の射影でレスポンスの構造が想定と異なった場合
+    """
+    variables = _search_variables(query, cursor)
+    attempt = 0
+    lane = lanes.pick()
+    while True:
+        pacer = lane.pacer
+        # 他のジョブのレート制限でクールダウン中の場合（全アカウントがクールダウン中のときだけ選ばれる）
+        cooldown = lane.account.cooldown_remaining()
+        if cooldown > 0:
+            await asyncio.sleep(cooldown)
+        with span("pacer.acquire", "request", account=lane.account.account_id):
+            waited = await pacer.acquire(owner=lanes)
+        lane.record(waited)
+        if waited >= 1:
+            await report(f"アカウントのリクエスト予算を待ちました（{waited:.0f}秒、{pacer.users}件のジョブで共有）")
+        started = time.monotonic()
+        try:
+            # カーソルの切り出しもDEBUGが無効なら行わない
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Requesting SearchTimeline (cursor: %s, attempt %d/%d)",
+                    cursor[:20] if cursor else None, attempt + 1, pacer.max_retries + 1,
+                )
+            if projection is None:
+                sent = lane.inject.request("SearchTimeline", variables)
+            else:
+                sent = lane.inject.request_projected("SearchTimeline", variables, projection)
+            res = await asyncio.wait_for(sent, timeout=REQUEST_TIMEOUT)
+            GRAPHQL_REQUEST_SECONDS.labels("SearchTimeline", "ok").observe(time.monotonic() - started)
+            logger.debug("Response received")
+            return res
+        except KeyError:
+            raise
+        except Exception as e:
+            kind = pacer.classify_error(e, started)
+            GRAPHQL_REQUEST_SECONDS.labels("SearchTimeline", kind or "error").observe(time.monotonic() - started)
+            if kind == TIMEOUT:
+                REQUEST_TIMEOUTS_TOTAL.inc()
+            if kind is None:
+                error_msg = f"リクエストエラー: {e}"
+                logger.error(error_msg)
+                # レート制限・サーバーエラー以外は再試行せずに終了
+                await report(error_msg)
+                return None
+        
+        if kind == RATE_LIMITED and lanes.has_alternative(lane):
+            REQUEST_RETRIES_TOTAL.labels(kind).inc()
+            lane.limit(pacer.backoff(kind, attempt + 1))
+            limited, lane = lane, lanes.pick(exclude=lane)
+            logger.warning(
+                "Rate limited on account %s, switching to %s", limited.account.label, lane.account.label,
+                extra={"account": limited.account.account_id},
+            )
+            continue
+        
+        attempt += 1
+        if attempt > pacer.max_retries:
+            break
+        REQUEST_RETRIES_TOTAL.labels(kind).inc()
+        delay = pacer.backoff(kind, attempt)
+        logger.warning(
+            "Request failed (%s), retrying in %.1fs (%d/%d)", kind, delay, attempt, pacer.max_retries,
+            extra={"kind": kind, "account": lane.account.account_id},
+        )
+        if kind == RATE_LIMITED:
+            lane.limit(delay)
+            await report(f"レート制限中です。{delay:.0f}秒後に再開します")
+        with span("backoff", "request", kind=kind, attempt=attempt):
+            await asyncio.sleep(delay)
+        lane = lanes.pick()
+    
+    logger.error("Failed to fetch data after retries")
+    return None
+
+
+async def _accept_page(
+    shard: Shard,
+    page_tweets: List[Dict[str, Any]],
+    bottom_cursor: Optional[str],
+    budget: LimitBudget,
+    merger: OrderedShardWriter,
+    dedup: TweetIdSet,
+    spawn,
+    report,
+    save_checkpoint,
+    timer: StageTimer,
+) -> bool:
+    """
+    取得した1ページを書き込み、次のカーソルを保存する
+
+    Returns:
+        続きのページを取得するか
+    """
+    cursor = shard.cursor
+    # 担当範囲外（再分割で他のシャードへ移った部分）と取得済みのツイートを除き、上限の残り分だけ書き出す
+    with timer.measure("dedup"):
+        page_tweets, reached_floor = shard.accept(page_tweets)
+        page_tweets = budget.claim(shard, dedup.unseen(page_tweets))
+        dedup.add_rows(page_tweets)
+    with timer.measure("write"):
+        merger.write(shard, page_tweets)
+    with timer.measure("report"):
+        await report(f"収集中... (現在: {budget.used}件)")
+    if budget.full(shard) or reached_floor:
+        return False
+    
+    # 観測した密度が高ければ、残りの古い部分を別シャードに切り出す
+    spawn(shard)
+
+    if not bottom_cursor or bottom_cursor == cursor:
+        EMPTY_CURSORS_TOTAL.inc()
+        msg = "タイムラインの終端に到達しました" if not bottom_cursor else "カーソルが更新されませんでした（終端）"
+        logger.debug(msg)
+        return False
+    
+    # ページごとに次のカーソルと書き込み位置を保存する（次のリクエストまでの間隔は pacer が決める）
+    shard.cursor = bottom_cursor
+    with timer.measure("checkpoint"):
+        await save_checkpoint()
+    return True
+
+
+async def _collect_shard(
+    lanes: AccountLanes,
+    shard: Shard,
+    keyword: str,
+    budget: LimitBudget,
+    merger: OrderedShardWriter,
+    dedup: TweetIdSet,
+    spawn,
+    report,
+    save_checkpoint,
+    timer: StageTimer,
+):
+    """
+    1つの時間窓をカーソルで順にたどり、結果を merger に書き込む
+
+    取得・パース・書き込みを上限付きのキューでつないだパイプラインで処理する。
+    レスポンスからカーソルだけを先に取り出して次のリクエストを送り、その間に前のページの
+    パースと書き込み（範囲・重複の除外、CSV、進捗、チェックポイント）を進める。
+    書き込みは取得順に1ページずつ行うため、チェックポイントのカーソルは常に書き込み済みのページの続きを指す。
+    """
+    query = shard.query(keyword)
+    projection = {"keyword": keyword} if IN_PAGE_PROJECTION else None
+    parse_queue: asyncio.Queue = asyncio.Queue(PIPELINE_DEPTH)
+    write_queue: asyncio.Queue = asyncio.Queue(PIPELINE_DEPTH)
+    stop = asyncio.Event()
+
+    async def put(queue: asyncio.Queue, item, stage: str):
+        started = time.perf_counter()
+        await queue.put(item)
+        timer.add(f"{stage}.blocked", time.perf_counter() - started)
+
+    async def fetch():
+        cursor = shard.cursor
+        try:
+            while not stop.is_set() and not budget.full(shard):
+                with timer.measure("request"):
+                    res = await _request_page(lanes, query, cursor, report, projection)
+                if res is None:
+                    await put(parse_queue, ("failed", "リクエストに失敗しました"), "fetch")
+                    return
+                with timer.measure("cursor"):
+                    next_cursor = res["cursor"] if projection else parse_bottom_cursor(res)
+                await put(parse_queue, ("page", res, next_cursor), "fetch")
+                if not next_cursor or next_cursor == cursor:
+                    break
+                cursor = next_cursor
+            await put(parse_queue, None, "fetch")
+        except KeyError as e:
+            await put(parse_queue, ("parse_error", f"レスポンスパースエラー: {e}"), "fetch")
+        except Exception as e:
+            await put(parse_queue, ("failed", f"予期しないエラー: {e}"), "fetch")
+
+    async def parse():
+        while True:
+            item = await parse_queue.get()
+            if item is not None and item[0] == "page":
+                _, res, next_cursor = item
+                try:
+                    parse_started = time.perf_counter()
+                    with timer.measure("parse"):
+                        rows = res["rows"] if projection else parse_search_timeline(res, keyword)[0]
+                    PAGE_PARSE_SECONDS.observe(time.perf_counter() - parse_started)
+                    item = ("page", rows, next_cursor)
+                except Exception as e:
+                    item = ("parse_error", f"レスポンスパースエラー: {e}")
+            await put(write_queue, item, "parse")
+            if item is None or item[0] != "page":
+                return
+
+    tasks = [
+        asyncio.create_task(fetch(), name=f"shard-{shard.index}-fetch"),
+        asyncio.create_task(parse(), name=f"shard-{shard.index}-parse"),
+    ]
+
+    async def next_item():
+        # 取得・パースのタスクが異常終了した場合はキューに何も届かないため、タスクと一緒に待つ
+        getter = asyncio.ensure_future(write_queue.get())
+        try:
+            while not getter.done():
+                running = [task for task in tasks if not task.done()]
+                await asyncio.wait([getter, *running], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    break
+                for task in tasks:
+                    if task.done() and (task.cancelled() or task.exception() is not None):
+                        error = "キャンセルされました" if task.cancelled() else task.exception()
+                        return ("failed", f"予期しないエラー: {task.get_name()}: {error}")
+            return getter.result()
+        finally:
+            getter.cancel()
+
+    try:
+        while not budget.full(shard):
+            started = time.perf_counter()
+            item = await next_item()
+            timer.add("write.starved", time.perf_counter() - started)
+            if item is None:
+                break
+            kind, value, bottom_cursor = item if item[0] == "page" else (*item, None)
+            if kind != "page":
+                shard.error = value
+                if kind == "parse_error":
+                    await report(shard.error)
+                break
+            if not await _accept_page(shard, value, bottom_cursor, budget, merger, dedup, spawn, report, save_checkpoint, timer):
+                break
+    finally:
+        # 先読みしたページは捨てる（カーソルは書き込み済みのページまでしか進めていない）
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _stream_shard(
+    lanes: AccountLanes,
+    shard: Shard,
+    keyword: str,
+    budget: LimitBudget,
+    merger: OrderedShardWriter,
+    dedup: TweetIdSet,
+    spawn,
+    report,
+    save_checkpoint,
+    timer: StageTimer,
+):
+    """
+    1つの時間窓をページ内のドライバーでたどり、届いたページから順に merger に書き込む
+
+    ドライバーは Python の処理を待たずに次のページを取得する。待機時間は pacer の判断を後から伝え、
+    エラー時はドライバーを止めてバックオフ後に同じカーソルから再開させる。
+    ドライバーは1つのアカウントのページで動くため、レート制限を受けた場合は他に使えるアカウントがあれば
+    ドライバーを閉じ、そのアカウントで書き込み済みのカーソルから開始し直す。
+    """
+    variables = _search_variables(shard.query(keyword), None)
+    attempt = 0
+    while True:
+        lane = lanes.pick()
+        pacer = lane.pacer
+        cooldown = lane.account.cooldown_remaining()
+        if cooldown > 0:
+            await asyncio.sleep(cooldown)
+        stream = await lane.inject.paginate(
+            "SearchTimeline", variables, {"keyword": keyword}, cursor=shard.cursor, timeout=REQUEST_TIMEOUT
+        )
+        switch = False
+        started = time.monotonic()
+        async with stream:
+            try:
+                async for event in stream:
+                    if budget.full(shard):
+                        break
+                    if event["type"] == "error":
+                        if event.get("parse"):
+                            shard.error = f"レスポンスパースエラー: {event['message']}"
+                            await report(shard.error)
+                            break
+                        message = f"{event.get('status') or ''} {event['message']}".strip()
+                        kind = pacer.classify_error(Exception(message), started)
+                        if kind == RATE_LIMITED and lanes.has_alternative(lane):
+                            REQUEST_RETRIES_TOTAL.labels(kind).inc()
+                            lane.limit(pacer.backoff(kind, attempt + 1))
+                            logger.warning(
+                                "Rate limited on account %s, switching accounts", lane.account.label,
+                                extra={"account": lane.account.account_id},
+                            )
+                            switch = True
+                            break
+                        attempt += 1
+                        if kind is None or attempt > pacer.max_retries:
+                            shard.error = f"リクエストエラー: {message}"
+                            await report(shard.error)
+                            break
+                        REQUEST_RETRIES_TOTAL.labels(kind).inc()
+                        delay = pacer.backoff(kind, attempt)
+                        logger.warning(
+                            "Request failed (%s), retrying in %.1fs (%d/%d)", kind, delay, attempt, pacer.max_retries,
+                            extra={"kind": kind, "account": lane.account.account_id},
+                        )
+                        if kind == RATE_LIMITED:
+                            lane.limit(delay)
+                            await report(f"レート制限中です。{delay:.0f}秒後に再開します")
+                        await stream.resume(delay)
+                        started = time.monotonic()
+                        continue
+
+                    attempt = 0
+                    pacer.record_request()
+                    lane.record()
+                    if not await _accept_page(shard, event["rows"], event["cursor"], budget, merger, dedup, spawn, report, save_checkpoint, timer):
+                        break
+                    # ドライバーは既に次のリクエストを送っている場合があり、その次から間隔が反映される
+                    delay = pacer.next_delay()
+                    if delay > 0:
+                        await stream.pace(delay)
+                    started = time.monotonic()
+            except asyncio.TimeoutError:
+                REQUEST_TIMEOUTS_TOTAL.inc()
+                shard.error = "リクエストがタイムアウトしました"
+                await report(shard.error)
+        if not switch:
+            return
 
 
 async def collect_tweets_from_session(
-    session_json: Dict[str, Any],
+    session_json: Optional[Dict[str, Any]],
     keyword: str,
     start_date: str,
     end_date: str,
     output_file: str,
     limit: int = 100,
-    progress_callback: Optional[callable] = None
+    progress_callback: Optional[callable] = None,
+    max_shards: Optional[int] = None,
+    resume: bool = False,
+    skip_seen: bool = False,
+    output_format: str = "csv",
+    incremental: bool = False,
+    accounts: Optional[List[SessionAccount]] = None,
+    cpu_profile: bool = False,
 ) -> Dict[str, Any]:
     """
     セッションJSONを使用してツイートを収集
     
+    期間は複数の時間窓（シャード）に分割し、同じページ上で並列にページングする。
+    ツイートの多い時間窓は、直近のページの密度から判断してさらに分割する。
+    結果は新しい順に1つのCSVへまとめ、取得件数の上限は全シャードで共有する（新しい時間窓から順に limit 件）。
+    
+    ページごとに各シャードのカーソルと出力ファイルの位置をチェックポイントに保存する。
+    resume=True の場合はチェックポイントから続きを収集し、既存の出力ファイルに追記する
+    （失敗したシャードも最後のカーソルから再試行する）。
+    
+    ツイートIDで重複を除くため、同じツイートが上限の件数を消費することはない。
+    収集したIDは検索ワードごとに保存され、skip_seen=True なら過去のジョブで収集済みのツイートも除く。
+    
+    incremental=True の場合は、同じ検索ワードの前回の差分収集で得た最新のツイートより新しいものだけを収集し、
+    完了時に検索ワードごとのデータセットへ追記する。
+    
+    accounts を指定した場合はセッションプールの複数のアカウントでリクエストを分散する。
+    アカウントごとに同じブラウザ上の専用コンテキストを作成し、レート制限を受けたアカウントはクールダウンに入れて
+    他のアカウントに切り替える。
+    リクエストの間隔はアカウント（クッキーから求めたキー）ごとに全ジョブで共有し、同時に実行しているジョブで均等に分け合う。
+    
     Args:
-        session_json: セッションJSONデータ
+        session_json: セッションJSONデータ（accounts を指定した場合は None）
         keyword: 検索ワード（ハッシュタグまたはキーワード）
         start_date: 開始日（YYYY-MM-DD形式）
         end_date: 終了日（YYYY-MM-DD形式）
-        output_file: 出力CSVファイルのパス
+        output_file: 出力ファイルのパス
         limit: 最大取得件数
         progress_callback: 進捗を報告するコールバック関数（current, total, message）
+        max_shards: 初期シャード数の上限（省略時は COLLECT_MAX_SHARDS）
+        resume: チェックポイントから再開するか
+        skip_seen: 同じ検索ワードの過去のジョブで収集済みのツイートを除くか
+        output_format: 出力形式（csv / csv.gz / csv.zst / jsonl / parquet）
+        incremental: 差分収集するか
+        accounts: 使用するセッションプールのアカウント（省略時は session_json の1アカウント）
+        cpu_profile: サンプリングプロファイラでフレームグラフを採取するか
         
     Returns:
-        収集結果の辞書（tweet_count, output_file, error）
+        収集結果の辞書（tweet_count, output_file, error, resumable, complete, stage_timings, accounts, trace_file, cpu_profile_file）
+        エラーで中断した場合も、それまでに書き込んだ行があれば output_file を返す
+        resumable が True の場合はチェックポイントが残っており、resume=True で続きを収集できる
+        complete は全シャードがエラーなく終わったか（結果キャッシュに登録できるか）
+        差分収集の場合は incremental に更新後の状態（最新のID・投稿時刻・データセットの行数など）
+        stage_timings はステージごとの処理時間の集計（StageTimer.summary()）
+        accounts はアカウントごとのこのジョブのリクエスト数・レート制限の回数・予算を待った秒数
+        trace_file はジョブのトレース（Chromeのトレース形式、COLLECT_TRACE=0 の場合は None）
+        cpu_profile_file はフレームグラフ用の折りたたみ形式のプロファイル（cpu_profile=True の場合）
     """
+    # ジョブの処理（このタスクから作成したタスクを含む）をスパンとして記録する
+    trace = Trace(f"collect {keyword}", profile=cpu_profile) if TRACE_ENABLED or cpu_profile else None
+    token = activate(trace) if trace is not None else None
     try:
-        # 検索クエリを構築
-        query = f"{keyword} since:{start_date} until:{end_date}"
-        
+        with span("job", keyword=keyword, resume=resume):
+            result = await _collect(
+                session_json, keyword, start_date, end_date, output_file, limit, progress_callback,
+                max_shards, resume, skip_seen, output_format, incremental, accounts,
+            )
+    finally:
+        if token is not None:
+            deactivate(token)
+    result.update({"trace_file": None, "cpu_profile_file": None})
+    if trace is not None:
+        try:
+            result.update(await asyncio.to_thread(_save_trace, trace, output_file))
+        except OSError as e:
+            logger.warning("トレースの保存に失敗しました: %s", e)
+    return result
+
+
+def _save_trace(trace: Trace, output_file: str) -> Dict[str, Optional[str]]:
+    """トレースとプロファイルを出力ファイルの隣に保存する"""
+    trace_file = output_file + ".trace.json"
+    with open(trace_file, "w", encoding="utf-8") as f:
+        json.dump(trace.to_chrome(), f, ensure_ascii=False)
+    profile_file = None
+    if trace.samples is not None:
+        profile_file = output_file + ".profile.folded"
+        with open(profile_file, "w", encoding="utf-8") as f:
+            f.write(trace.folded())
+    return {"trace_file": trace_file, "cpu_profile_file": profile_file}
+
+
+def _persist_checkpoint(checkpoint: CollectionCheckpoint, state: Dict[str, Any], fds: List[int]):
+    """出力ファイル・退避ファイル・ジャーナルを永続化してからチェックポイントを保存する（スレッドで実行する）"""
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+    checkpoint.save(state)
+
+
+async def _collect(
+    session_json: Optional[Dict[str, Any]],
+    keyword: str,
+    start_date: str,
+    end_date: str,
+    output_file: str,
+    limit: int = 100,
+    progress_callback: Optional[callable] = None,
+    max_shards: Optional[int] = None,
+    resume: bool = False,
+    skip_seen: bool = False,
+    output_format: str = "csv",
+    incremental: bool = False,
+    accounts: Optional[List[SessionAccount]] = None,
+) -> Dict[str, Any]:
+    """collect_tweets_from_session の本体"""
+    # 行はページごとにファイルへ書き出し、メモリには保持しない
+    writer = create_writer(output_file, output_format)
+    merger = OrderedShardWriter(writer, limit)
+    budget = LimitBudget(limit, merger.shards)
+    checkpoint = CollectionCheckpoint.for_output(output_file)
+    all_shards: List[Shard] = []
+    # 書き込んだツイートID（チェックポイント用にジャーナルへも追記する）
+    dedup = TweetIdSet()
+    journal_path = output_file + ".ids"
+    # ステージごとの処理時間（どこが律速かを結果とステータスで確認できるようにする）
+    timer = StageTimer()
+    job_started = time.monotonic()
+    if not accounts:
+        # プールに同じアカウントがあればクールダウンを共有する
+        accounts = [session_pool.account_for(session_json)]
+    lanes: Optional[AccountLanes] = None
+    checkpoint_lock = asyncio.Lock()
+    # 出力ファイル・チェックポイントへの書き込みの失敗（以降は収集を止め、最後に保存した位置から再開させる）
+    write_errors: List[str] = []
+    
+    async def report(message: str):
         if progress_callback:
-            await progress_callback(0, limit, f"検索クエリ: {query}")
-        
-        # セッションJSONを使用してブラウザを起動
-        async with TwitterAPIBrowser(session_json=session_json, headless=True) as browser:
-            if progress_callback:
-                await progress_callback(0, limit, "ブラウザを起動しています...")
-            
-            # インジェクションスクリプトを実行
-            inject = await browser.inject(sleep=2)  # 初期化待機時間を短縮
-            
-            if progress_callback:
-                await progress_callback(0, limit, "ツイート収集を開始しています...")
-            
-            collected_tweets = []
-            cursor = None
+            await progress_callback(budget.used, limit, message)
+    
+    async def save_checkpoint():
+        if write_errors:
+            # 書き込みに失敗した後の位置は不確かなため、直前のチェックポイントを残して収集を止める
+            raise RuntimeError(write_errors[0])
+        # 書き込み位置はここで確定し、fsync と保存はイベントループを止めないようにスレッドで行う
+        # （ディスクリプタは複製して渡すため、その間に退避ファイルが閉じられても構わない）
+        state = {
+            "keyword": keyword,
+            "start_date": start_date,
+            "end_date": end_date,
+            "limit": limit,
+            "skip_seen": skip_seen,
+            "writer": merger.state(),
+            "dedup_journal_size": dedup.journal_size(),
+            "shards": [shard.to_dict() for shard in all_shards],
+        }
+        try:
+            fds = [os.dup(fd) for fd in merger.filenos() + dedup.filenos()]
+            # 保存は呼び出した順に行う（古い状態で新しいチェックポイントを上書きしない）
+            async with checkpoint_lock:
+                await asyncio.to_thread(_persist_checkpoint, checkpoint, state, fds)
+        except Exception as e:
+            # 同じ保存を繰り返さず、ジョブのエラーとして直前のチェックポイントから再開させる
+            write_errors.append(f"チェックポイントの保存に失敗しました: {e}")
+            logger.error("Failed to save checkpoint: %s", e)
+            raise
+    
+    try:
+        if resume:
+            state = checkpoint.load()
+            if state is None:
+                raise ValueError("チェックポイントが見つかりません")
+            if (state["keyword"], state["start_date"], state["end_date"]) != (keyword, start_date, end_date):
+                raise ValueError("チェックポイントの検索条件が一致しません")
+            all_shards.extend(Shard.from_dict(data) for data in state["shards"])
+            for shard in all_shards:
+                merger.add(shard)
+                # 失敗したシャードは最後のカーソルから再試行する
+                if shard.error:
+                    shard.error = None
+                    shard.done = False
+            merger.restore(state["writer"])
+            skip_seen = state.get("skip_seen", skip_seen)
+            journal_size = state.get("dedup_journal_size", 0)
+            dedup = await asyncio.to_thread(TweetIdSet.load, journal_path, journal_size)
+            dedup.open_journal(journal_path, journal_size)
+            shards = sorted((shard for shard in all_shards if not shard.done), key=lambda x: -x.until)
+            await report(f"チェックポイントから再開します（{budget.used}件収集済み、残り{len(shards)}区間）")
+        else:
+            checkpoint.remove()
+            dedup.open_journal(journal_path)
+            min_since = min_id = None
+            shard_count = max_shards or MAX_SHARDS
+            if incremental:
+                state = incremental_store.load(keyword)
+                if state and state["max_id"]:
+                    # 前回の最新ツイートの投稿時刻から検索し、そのID以下に到達したら終える
+                    # （差分は少ないため1つの時間窓から始め、多ければ密度に応じて再分割する）
+                    min_since, min_id = state["max_time"], state["max_id"]
+                    shard_count = 1
+                    await report(f"差分収集: 前回の最新ツイート（ID {min_id}）より新しいものを収集します")
+            shards = plan_shards(start_date, end_date, shard_count, min_since)
+            all_shards.extend(shards)
+            for shard in shards:
+                shard.min_id = min_id
+                merger.add(shard)
             
-            while len(collected_tweets) < limit:
-                if progress_callback:
-                    await progress_callback(
-                        len(collected_tweets), 
-                        limit, 
-                        f"収集中... (現在: {len(collected_tweets)}件)"
+            await report(f"検索クエリ: {keyword} since:{start_date} until:{end_date}（{len(shards)}分割）")
+        
+        if skip_seen:
+            # 過去のジョブで収集済みのIDも重複として扱う（ジャーナルには含めない）
+            # 読み込みと結合（ソート）は件数に比例するため、イベントループを止めないようにスレッドで行う
+            seen = await asyncio.to_thread(seen_id_store.load, keyword)
+            await asyncio.to_thread(dedup.update, seen)
+        
+        # 差分収集で新しい期間が残っていなければ、ブラウザを起動せずに終える
+        if shards:
+            # プールからブラウザを借り、セッションJSONで専用コンテキストを作成
+            await report("ブラウザを準備しています...")
+            async with browser_pool.lease() as pooled_browser, AsyncExitStack() as stack:
+                
+                async def open_lane(account: SessionAccount) -> AccountLane:
+                    bootstrap_started = time.monotonic()
+                    browser = await stack.enter_async_context(
+                        TwitterAPIBrowser(session_json=account.session_json, browser=pooled_browser)
                     )
+                    # インジェクションスクリプトを実行
+                    inject = await browser.inject()
+                    INJECT_BOOTSTRAP_SECONDS.observe(time.monotonic() - bootstrap_started)
+                    # 同じアカウントを使う全ジョブで共有するペース制御（レスポンスのレート制限ヘッダーを観測する）
+                    pacer = account_pacers.attach(account.key)
+                    stack.callback(account_pacers.detach, account.key)
+                    browser.page.on("response", pacer.on_response)
+                    return AccountLane(account, inject, pacer)
                 
-                variables = {
-                    "rawQuery": query,
-                    "count": 50,
-                    "querySource": "typed_query",
-                    "product": "Latest",
-                    "withGrokTranslatedBio": False,
-                }
+                # アカウントごとにコンテキストを作成する（復元できなかったアカウントは使わない）
+                opened = await asyncio.gather(*(open_lane(account) for account in accounts), return_exceptions=True)
+                for account, result in zip(accounts, opened):
+                    if isinstance(result, BaseException):
+                        logger.warning(
+                            "アカウント %s のセッションを復元できませんでした: %s", account.label, result,
+                            extra={"account": account.account_id},
+                        )
+                usable = [result for result in opened if isinstance(result, AccountLane)]
+                if not usable:
+                    raise opened[0]
+                lanes = AccountLanes(usable)
+                await report(f"セッションを復元しました（{len(lanes)}アカウント）" if len(accounts) > 1 else "セッションを復元しました")
                 
-                if cursor:
-                    variables["cursor"] = cursor
-
-                # リトライロジック
-                max_retries = 3
-                retry_count = 0
-                res = None
+                await report("ツイート収集を開始しています...")
                 
-                while retry_count < max_retries:
-                    try:
-                        print(f"[DEBUG] Requesting SearchTimeline (cursor: {cursor[:20] if cursor else 'None'})... (Attempt {retry_count + 1}/{max_retries})")
-                        
-                        # 30秒のタイムアウトを設定
-                        res = await asyncio.wait_for(
-                            inject.request("SearchTimeline", variables),
-                            timeout=30.0
-                        )
-                        print("[DEBUG] Response received.")
-                        break # 成功したらループを抜ける
-                        
-                    except asyncio.TimeoutError:
-                        retry_count += 1
-                        print(f"[WARN] Request timed out. Retrying... ({retry_count}/{max_retries})")
-                        if retry_count < max_retries:
-                            await asyncio.sleep(5.0) # リトライ前に少し待つ
-                        
-                    except Exception as e:
-                        error_msg = f"リクエストエラー: {e}"
-                        print(f"[ERROR] {error_msg}")
-                        # その他のエラーはリトライせずに終了
-                        if progress_callback:
-                            await progress_callback(len(collected_tweets), limit, error_msg)
-                        res = None
-                        break
+                # 新しい時間窓から順に処理する
+                queue: asyncio.Queue = asyncio.Queue()
+                for shard in shards:
+                    queue.put_nowait(shard)
                 
-                if res is None:
-                    print("[ERROR] Failed to fetch data after retries.")
-                    break
-
-                # レスポンスをパース
-                try:
-                    timeline = res["data"]["search_by_raw_query"]["search_timeline"]["timeline"]
-                    instructions = timeline["instructions"]
-                    
-                    entries = []
-                    for instruction in instructions:
-                        if instruction["type"] == "TimelineAddEntries":
-                            entries = instruction["entries"]
-                            break
-                        elif instruction["type"] == "TimelineReplaceEntry":
-                            if instruction["entry"]["entryIdToReplace"] == "cursor-bottom-0":
-                                entries.append(instruction["entry"])
-
-                    new_tweets_found = False
-                    bottom_cursor = None
-
-                    for entry in entries:
+                def spawn(shard: Shard):
+                    if len(all_shards) >= MAX_TOTAL_SHARDS:
+                        return
+                    child = shard.split(len(all_shards))
+                    if child is None:
+                        return
+                    logger.debug("Split shard %d: new shard %d [%d, %d)", shard.index, child.index, child.since, child.until)
+                    all_shards.append(child)
+                    merger.add(child)
+                    queue.put_nowait(child)
+                
+                async def worker():
+                    while True:
+                        shard = await queue.get()
                         try:
-                            content = entry["content"]
-                            
-                            # カーソルを処理
-                            if content["entryType"] == "TimelineTimelineCursor":
-                                if content["cursorType"] == "Bottom" or content["cursorType"] == "ShowMore":
-                                    bottom_cursor = content["value"]
-                                continue
-
-                            # ツイートを処理
-                            if content["entryType"] == "TimelineTimelineItem":
-                                item_result = content["itemContent"]["tweet_results"].get("result")
-                                
-                                if not item_result:
-                                    continue
-                                    
-                                if "tweet" in item_result:
-                                    item_result = item_result["tweet"]
-                                    
-                                if "legacy" not in item_result:
-                                    continue
-
-                                legacy = item_result["legacy"]
-                                
-                                # ユーザーデータをチェック
-                                if "core" not in item_result or "user_results" not in item_result["core"]:
-                                    continue
-                                    
-                                user_result = item_result["core"]["user_results"]["result"]
-                                
-                                if "legacy" in user_result:
-                                    user_legacy = user_result["legacy"]
-                                elif "user" in user_result and "legacy" in user_result["user"]:
-                                    user_legacy = user_result["user"]["legacy"]
-                                else:
-                                    continue
-                                
-                                # データを抽出
-                                tweet_id = legacy["id_str"]
-                                
-                                screen_name = user_legacy.get("screen_name")
-                                author_name = user_legacy.get("name")
-                                
-                                if not screen_name and "core" in user_result:
-                                    screen_name = user_result["core"].get("screen_name")
-                                if not author_name and "core" in user_result:
-                                    author_name = user_result["core"].get("name")
-
-                                if not screen_name and "screen_name" in user_result:
-                                    screen_name = user_result["screen_name"]
-                                if not author_name and "name" in user_result:
-                                    author_name = user_result["name"]
-                                    
-                                if not screen_name:
-                                    screen_name = "Unknown"
-                                if not author_name:
-                                    author_name = "Unknown"
-
-                                # 日付を変換
-                                post_date = legacy["created_at"]
-                                try:
-                                    dt = datetime.strptime(post_date, "%a %b %d %H:%M:%S %z %Y")
-                                    formatted_date = dt.strftime("%Y-%m-%d %H:%M:%S")
-                                except:
-                                    formatted_date = post_date
-
-                                post_link = f"https://x.com/{screen_name}/status/{tweet_id}"
-                                
-                                # メトリクス
-                                repost_count = legacy.get("retweet_count", 0)
-                                favorite_count = legacy.get("favorite_count", 0)
-                                
-                                impression_count = 0
-                                if "views" in item_result and "count" in item_result["views"]:
-                                    impression_count = int(item_result["views"]["count"])
-
-                                # ハッシュタグ
-                                hashtags = [tag["text"] for tag in legacy.get("entities", {}).get("hashtags", [])]
-                                search_tag_clean = keyword.replace("#", "").lower()
-                                other_tags = [f"#{tag}" for tag in hashtags if tag.lower() != search_tag_clean]
-                                
-                                tweet_data = {
-                                    "Author Name": author_name,
-                                    "Post Date": formatted_date,
-                                    "Post Link": post_link,
-                                    "Other Hashtags": ", ".join(other_tags),
-                                    "Repost Count": repost_count,
-                                    "Impression Count": impression_count,
-                                    "Like Count": favorite_count
-                                }
-                                
-                                collected_tweets.append(tweet_data)
-                                new_tweets_found = True
-                                
-                                if len(collected_tweets) >= limit:
-                                    break
+                            if not budget.full(shard) and not write_errors:
+                                collect = _stream_shard if STREAMING else _collect_shard
+                                with span("shard", index=shard.index, since=shard.since, until=shard.until), \
+                                        log_context(shard=shard.index):
+                                    await collect(lanes, shard, keyword, budget, merger, dedup, spawn, report, save_checkpoint, timer)
                         except Exception as e:
-                            continue
-                    
-                    if len(collected_tweets) >= limit:
-                        break
-
-                    # カーソルを抽出
-                    print(f"[DEBUG] Extracting cursor from instructions: {len(instructions)} items")
-                    for instruction in instructions:
-                        # print(f"[DEBUG] Instruction type: {instruction.get('type')}")
-                        if instruction["type"] == "TimelineAddEntries":
-                            for entry in instruction["entries"]:
-                                if entry["content"]["entryType"] == "TimelineTimelineCursor" and entry["content"]["cursorType"] == "Bottom":
-                                    bottom_cursor = entry["content"]["value"]
-                                    print(f"[DEBUG] Found cursor in TimelineAddEntries: {bottom_cursor[:20]}...")
-                        elif instruction["type"] == "TimelineReplaceEntry":
-                            if instruction["entry"]["content"]["entryType"] == "TimelineTimelineCursor" and instruction["entry"]["content"]["cursorType"] == "Bottom":
-                                bottom_cursor = instruction["entry"]["content"]["value"]
-                                print(f"[DEBUG] Found cursor in TimelineReplaceEntry: {bottom_cursor[:20]}...")
-
-                    if not bottom_cursor:
-                        for entry in entries:
-                            if entry["content"]["entryType"] == "TimelineTimelineCursor" and entry["content"]["cursorType"] == "Bottom":
-                                bottom_cursor = entry["content"]["value"]
-                                print(f"[DEBUG] Found cursor in entries: {bottom_cursor[:20]}...")
-
-                    if not bottom_cursor:
-                        print("[DEBUG] No cursor found in response")
-                        # デバッグ用にレスポンス構造の一部を出力（必要なら）
-                        # print(json.dumps(instructions, indent=2)[:500])
-
-                    if not bottom_cursor or bottom_cursor == cursor:
-                        if progress_callback:
-                            msg = "タイムラインの終端に到達しました" if not bottom_cursor else "カーソルが更新されませんでした（終端）"
-                            print(f"[DEBUG] {msg}")
-                            await progress_callback(len(collected_tweets), limit, msg)
-                        break
-                    
-                    cursor = bottom_cursor
-                    print(f"[DEBUG] Sleeping for 2.0 seconds...")
-                    await asyncio.sleep(2.0)  # 待機時間を0.5秒から2.0秒に延長して負荷軽減
-
-                except KeyError as e:
-                    error_msg = f"レスポンスパースエラー: {e}"
-                    if progress_callback:
-                        await progress_callback(len(collected_tweets), limit, error_msg)
-                    break
-                except Exception as e:
-                    error_msg = f"予期しないエラー: {e}"
-                    if progress_callback:
-                        await progress_callback(len(collected_tweets), limit, error_msg)
-                    break
+                            # 書き込みに失敗した場合は（他のシャードでの失敗で止めた場合も）その内容を記録する
+                            shard.error = write_errors[0] if write_errors else f"予期しないエラー: {e}"
+                            await report(shard.error)
+                        finally:
+                            try:
+                                if not write_errors:
+                                    merger.finish(shard)
+                                    await save_checkpoint()
+                            except Exception as e:
+                                # 退避分を出力ファイルへ移せなかった場合など（チェックポイントの失敗は記録済み）
+                                if not write_errors:
+                                    write_errors.append(f"出力ファイルへの書き込みに失敗しました: {e}")
+                                logger.error("Failed to finish shard %d: %s", shard.index, e)
+                            finally:
+                                queue.task_done()
+                
+                workers = [asyncio.create_task(worker(), name=f"shard-worker-{i}") for i in range(max(1, SHARD_CONCURRENCY))]
+                try:
+                    await queue.join()
+                finally:
+                    for task in workers:
+                        task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
 
-        # CSVに書き込み
-        if collected_tweets:
-            os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else ".", exist_ok=True)
-            with open(output_file, "w", newline="", encoding="utf-8-sig") as f:
-                writer = csv.DictWriter(f, fieldnames=collected_tweets[0].keys())
-                writer.writeheader()
-                writer.writerows(collected_tweets)
-            
-            if progress_callback:
-                await progress_callback(len(collected_tweets), limit, f"完了: {len(collected_tweets)}件のツイートを収集しました")
+        # 上限に収まる新しい行で埋まったシャードのエラーは結果に影響しない
+        errors = [shard.error for shard in all_shards if shard.error and not budget.full(shard)] + write_errors
+        # 失敗したシャードがあればチェックポイントを残し、後から続きを収集できるようにする
+        resumable = bool(errors) and checkpoint.exists()
+        with span("finalize"):
+            # 再開する場合は、失敗したシャードより古いシャードの退避分を残しておく
+            if not resumable:
+                merger.flush()
+            merger.close(keep_spools=resumable)
+            writer.close(keep_journal=resumable)
+            # 再開する場合は、退避分のどこまでが結果に入るか決まっていないため、再開後に保存する
+            # （IDはジャーナルから引き継ぐ。上限を超えて捨てた行は収集済みとして扱わない）
+            if dedup.journal_size() and not resumable:
+                await asyncio.to_thread(dedup.discard, merger.dropped_ids)
+                await asyncio.to_thread(seen_id_store.merge_save, keyword, dedup)
+            dedup.close_journal(remove=not resumable)
+        if not resumable:
+            checkpoint.remove()
+        logger.info("Stage timings: %s", timer.format(), extra={"tweet_count": writer.row_count})
+        elapsed = time.monotonic() - job_started
+        if writer.row_count and elapsed > 0:
+            JOB_TWEETS_PER_SECOND.observe(writer.row_count / elapsed)
+        incremental_state = None
+        if incremental and not errors and not budget.exhausted:
+            # 取りこぼしがない場合だけ最新のIDを進める（上限で打ち切った場合は間の期間が欠けるため進めない）
+            # データセットへの追記は出力ファイル全体を読み書きするため、イベントループを止めないようにスレッドで行う
+            incremental_state = await asyncio.to_thread(
+                incremental_store.merge, keyword, output_file if writer.row_count else None, output_format
+            )
+        elif incremental:
+            logger.warning("差分収集の結果に欠けがあるため、データセットに追記しませんでした")
+        if writer.row_count or incremental_state:
+            if writer.row_count:
+                await report(f"完了: {writer.row_count}件のツイートを収集しました")
+            else:
+                await report("完了: 新しいツイートはありませんでした")
             
             return {
-                "tweet_count": len(collected_tweets),
-                "output_file": output_file,
-                "error": None
+                "tweet_count": writer.row_count,
+                "output_file": output_file if writer.row_count else None,
+                "error": None,
+                "resumable": resumable,
+                "complete": not errors,
+                "incremental": incremental_state,
+                "stage_timings": timer.summary(),
+                "accounts": lanes.stats() if lanes else []
             }
         else:
             return {
                 "tweet_count": 0,
                 "output_file": None,
-                "error": "ツイートが収集されませんでした"
+                "error": errors[0] if errors else "ツイートが収集されませんでした",
+                "resumable": resumable,
+                "complete": False,
+                "stage_timings": timer.summary(),
+                "accounts": lanes.stats() if lanes else []
             }
             
     except Exception as e:
+        merger.close(keep_spools=True)
+        dedup.close_journal()
+        writer.close(keep_journal=True)
         error_msg = f"収集エラー: {str(e)}"
-        if progress_callback:
-            await progress_callback(0, limit, error_msg)
+        await report(error_msg)
         return {
-            "tweet_count": 0,
-            "output_file": None,
-            "error": error_msg
+            "tweet_count": writer.row_count,
+            "output_file": output_file if writer.row_count else None,
+            "error": error_msg,
+            "resumable": checkpoint.exists(),
+            "complete": False,
+            "stage_timings": timer.summary(),
+            "accounts": lanes.stats() if lanes else []
         }
-
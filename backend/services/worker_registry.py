@@ -0,0 +1,87 @@
+"""
+ワーカープロセスの登録モジュール
+同じ状態ディレクトリを使って起動しているサーバープロセスの数を数える
+（プロセス内にだけ状態を持つ機能を、複数ワーカーでは使わせないために使う）
+"""
+import glob
+import logging
+import os
+import uuid
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows ではプロセスを数えられないため、常に1プロセスとして扱う
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerRegistry:
+    """
+    起動中のワーカープロセスの登録簿
+
+    各プロセスは directory に自分のロックファイルを作り、終了するまで排他ロックを保持する。
+    ロックを取得できるファイルは終了したプロセスの残りとして削除し、取得できないファイルの数を
+    起動中のワーカー数とする（異常終了したプロセスのロックはOSが解放する）。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._file: Optional[IO] = None
+
+    @classmethod
+    def from_env(cls) -> "WorkerRegistry":
+        """環境変数から設定を読み込んで登録簿を作成"""
+        return cls(os.environ.get("WORKER_REGISTRY_DIR", "./output/workers"))
+
+    def register(self):
+        """このプロセスを登録する（起動時に呼び出す）"""
+        if fcntl is None or self._file is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # PIDは再利用されるため、ファイル名にはランダムな値も含める
+        path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.lock")
+        self._file = open(path, "w")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+
+    def unregister(self):
+        """登録を取り消す（終了時に呼び出す）"""
+        if self._file is None:
+            return
+        path = self._file.name
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def count(self) -> int:
+        """起動中のワーカー数（このプロセスを含む）"""
+        if fcntl is None:
+            return 1
+        alive = 1
+        for path in glob.glob(os.path.join(self.directory, "*.lock")):
+            if self._file is not None and path == self._file.name:
+                continue
+            try:
+                f = open(path, "r")
+            except OSError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    alive += 1
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return alive
+
+
+# アプリケーション全体で共有するワーカーの登録簿
+worker_registry = WorkerRegistry.from_env()
@@ -0,0 +1,243 @@
+"""
+リプレイサーバーを相手にしたエンドツーエンドのスループット計測
+
+x.com の代わりに benchmarks/replay_server.py を起動し、以下の2通りで収集を実行する:
+    - browser: TwitterAPIBrowser と inject().request で SearchTimeline を直接ページングする
+    - collector: backend の collect_tweets_from_session（ブラウザプール・シャード分割・CSV書き込みを含む）
+
+それぞれについて pages/sec、最初のツイートが得られるまでの時間、ピークRSSを表示する。
+startup では、ブラウザのプロファイル（full / lean）ごとに、起動から inject() 完了までの時間とピークRSS、
+/home が読み込んだリソースの数を比較する（--home-assets で /home に画像・動画・フォント・外部スクリプトを埋め込む）。
+psutil がインストールされていればChromiumの子プロセスを含めたRSSを、無ければPythonプロセスのみを計測する。
+
+実行:
+    python benchmarks/bench_end_to_end.py --latency-ms 100 --error-rate 0.02 --limit 2000
+    python benchmarks/bench_end_to_end.py --only startup --home-assets 20
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from replay_server import ReplayConfig, ReplayServer
+
+
+# リプレイサーバー用のダミーセッション（クッキーは送信されるだけで検証されない）
+DUMMY_SESSION = {
+    "cookies": [
+        {"name": "auth_token", "value": "replay", "domain": "127.0.0.1", "path": "/"},
+        {"name": "twid", "value": "u%3D1", "domain": "127.0.0.1", "path": "/"},
+    ],
+    "localStorage": {},
+    "sessionStorage": {},
+}
+
+
+class PeakRSS:
+    """実行中のピークRSSを定期的にサンプリングする"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def current() -> int:
+        if psutil is None:
+            # ru_maxrss はLinuxではKB単位
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, self.current())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._task.cancel()
+        self.peak = max(self.peak, self.current())
+
+
+def report(label: str, pages: int, tweets: int, elapsed: float, first_tweet: Optional[float], peak_rss: int):
+    first = f"{first_tweet:.2f}s" if first_tweet is not None else "-"
+    scope = "process tree" if psutil is not None else "python only"
+    print(
+        f"{label:>10}: {pages} pages, {tweets} tweets in {elapsed:.2f}s "
+        f"({pages / elapsed if elapsed else 0:.1f} pages/sec), "
+        f"time-to-first-tweet {first}, peak RSS {peak_rss / 1024 / 1024:.0f} MiB ({scope})"
+    )
+
+
+async def bench_browser(server: ReplayServer, keyword: str, start_date: str, end_date: str, limit: int):
+    from twitter_api_browser_python.main import TwitterAPIBrowser
+    from twitter_api_browser_python.timeline_parser import parse_search_timeline
+
+    pages_before = server.stats["pages"]
+    tweets = 0
+    first_tweet = None
+    started = time.perf_counter()
+    with PeakRSS() as rss:
+        async with TwitterAPIBrowser(session_json=DUMMY_SESSION) as browser:
+            inject = await browser.inject()
+            cursor = None
+            failures = 0
+            while tweets < limit and failures < 10:
+                variables = {
+                    "rawQuery": f"{keyword} since:{start_date} until:{end_date}",
+                    "count": 50,
+                    "querySource": "typed_query",
+                    "product": "Latest",
+                    "withGrokTranslatedBio": False,
+                }
+                if cursor:
+                    variables["cursor"] = cursor
+                try:
+                    res = await inject.request("SearchTimeline", variables)
+                except Exception as e:
+                    # エラー注入時は同じカーソルで再試行する
+                    failures += 1
+                    print(f"[WARN] request failed: {e}")
+                    await asyncio.sleep(0.1 * failures)
+                    continue
+                failures = 0
+                rows, bottom_cursor = parse_search_timeline(res, keyword)
+                if rows and first_tweet is None:
+                    first_tweet = time.perf_counter() - started
+                tweets += len(rows)
+                if not bottom_cursor or bottom_cursor == cursor:
+                    break
+                cursor = bottom_cursor
+    elapsed = time.perf_counter() - started
+    report("browser", server.stats["pages"] - pages_before, tweets, elapsed, first_tweet, rss.peak)
+
+
+async def bench_startup(server: ReplayServer, profile: str, rounds: int):
+    from twitter_api_browser_python.main import TwitterAPIBrowser, bootstrap_cache
+
+    elapsed = []
+    peak = 0
+    assets_before = server.stats["assets"]
+    blocked = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        with PeakRSS() as rss:
+            async with TwitterAPIBrowser(session_json=DUMMY_SESSION, profile=profile) as browser:
+                await browser.inject()
+                elapsed.append(time.perf_counter() - started)
+                blocked += browser.blocked_requests
+                # 毎回オペレーションの収集から計測する
+                bootstrap_cache.invalidate(browser._bootstrap_key())
+        peak = max(peak, rss.peak)
+    scope = "process tree" if psutil is not None else "python only"
+    print(
+        f"{'startup/' + profile:>14}: best {min(elapsed):.2f}s, mean {sum(elapsed) / rounds:.2f}s over {rounds} rounds, "
+        f"peak RSS {peak / 1024 / 1024:.0f} MiB ({scope}), "
+        f"assets served {(server.stats['assets'] - assets_before) / rounds:.0f}/round, blocked {blocked / rounds:.0f}/round"
+    )
+
+
+async def bench_collector(server: ReplayServer, keyword: str, start_date: str, end_date: str, limit: int):
+    from services.browser_pool import browser_pool
+    from services.tweet_collector import collect_tweets_from_session
+
+    first_tweet = None
+    started = time.perf_counter()
+
+    async def progress(current: int, total: int, message: str):
+        nonlocal first_tweet
+        if current and first_tweet is None:
+            first_tweet = time.perf_counter() - started
+
+    pages_before = server.stats["pages"]
+    with tempfile.TemporaryDirectory() as tmp, PeakRSS() as rss:
+        await browser_pool.start()
+        try:
+            result: Dict[str, Any] = await collect_tweets_from_session(
+                session_json=DUMMY_SESSION,
+                keyword=keyword,
+                start_date=start_date,
+                end_date=end_date,
+                output_file=os.path.join(tmp, "tweets.csv"),
+                limit=limit,
+                progress_callback=progress,
+            )
+        finally:
+            await browser_pool.close()
+    elapsed = time.perf_counter() - started
+    if result["error"]:
+        print(f"[WARN] collector finished with error: {result['error']}")
+    report("collector", server.stats["pages"] - pages_before, result["tweet_count"], elapsed, first_tweet, rss.peak)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="リプレイサーバーを相手にしたエンドツーエンドのスループット計測")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    parser.add_argument("--fixtures", default=None)
+    parser.add_argument("--keyword", default="#Python")
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--end-date", default="2024-01-08")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--only", choices=["browser", "collector", "startup"], default=None)
+    parser.add_argument("--home-assets", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3, help="startup の計測回数")
+    args = parser.parse_args()
+
+    config = ReplayConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        fixtures_dir=args.fixtures,
+        home_assets=args.home_assets,
+    )
+    server = ReplayServer(config, port=args.port)
+    # 収集処理の設定はモジュールの読み込み時に決まるため、import より前に環境変数を設定する
+    os.environ["X_BASE_URL"] = server.base_url
+    os.environ.setdefault("SEEN_IDS_DIR", tempfile.mkdtemp(prefix="seen-"))
+
+    async with server:
+        print(f"replay server: {server.base_url} (latency {args.latency_ms}ms ±{args.jitter_ms}ms, "
+              f"error rate {args.error_rate}, rate limit {args.rate_limit or 'none'})")
+        if args.only in (None, "startup"):
+            for profile in ("full", "lean"):
+                await bench_startup(server, profile, args.rounds)
+        if args.only in (None, "browser"):
+            await bench_browser(server, args.keyword, args.start_date, args.end_date, args.limit)
+        if args.only in (None, "collector"):
+            await bench_collector(server, args.keyword, args.start_date, args.end_date, args.limit)
+        print(f"server stats: {server.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
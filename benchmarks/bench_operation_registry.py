@@ -0,0 +1,140 @@
+"""
+TwitterAPIRequest.request のリクエストごとのオーバーヘッドを計測するマイクロベンチマーク
+
+ページとの通信を除いた Python 側の処理だけを比較する:
+    - legacy: 毎回 operation_list を線形探索し、feature switch を結合・フィルタする従来の方式
+    - compiled: inject 時に作成したオペレーション表を引き、variables だけを追加する方式
+
+実行:
+    python benchmarks/bench_operation_registry.py
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from twitter_api_browser_python.main import TwitterAPIRequest, one
+
+
+OPERATION_COUNT = 400
+FEATURE_COUNT = 600
+ITERATIONS = 20000
+
+
+class NullPage:
+    """evaluate の引数をそのまま返すだけのページ"""
+
+    async def evaluate(self, expression, arg=None):
+        return arg
+
+
+def make_fixture():
+    """実際の x.com と同程度の規模のオペレーション一覧と初期状態を生成"""
+    features = [f"feature_{i}" for i in range(FEATURE_COUNT)]
+    operation_list = []
+    for i in range(OPERATION_COUNT):
+        operation_list.append({
+            "operationName": f"Operation{i}",
+            "queryId": f"query{i:04d}",
+            "operationType": "query" if i % 3 else "mutation",
+            "metadata": {
+                "featureSwitches": features[i % 50::7],
+                "fieldToggles": ["withArticleRichContentState"],
+            },
+        })
+    operation_list.append({
+        "operationName": "SearchTimeline",
+        "queryId": "searchQuery",
+        "operationType": "query",
+        "metadata": {"featureSwitches": features[::3], "fieldToggles": []},
+    })
+    section = {name: {"value": i % 2 == 0} for i, name in enumerate(features)}
+    init_state = {
+        "featureSwitch": {
+            "defaultConfig": section,
+            "user": dict(list(section.items())[:100]),
+            "debug": {},
+            "customOverrides": {},
+        }
+    }
+    return operation_list, init_state
+
+
+async def legacy_request(self: TwitterAPIRequest, operation: str, variables: dict, fieldToggles: dict = {}):
+    """最適化前の TwitterAPIRequest.request と同じ処理"""
+    method_map = {
+        "query": "GET",
+        "mutation": "POST",
+    }
+    exp = one(
+        [x for x in self.operation_list if x["operationName"] == operation],
+        name="operation",
+    )
+    queryId = exp["queryId"]
+    featureSwitches = exp["metadata"]["featureSwitches"]
+    allowFieldToggles = exp["metadata"]["fieldToggles"]
+    fieldToggles = {k: v for k, v in fieldToggles.items() if k in allowFieldToggles}
+    method = method_map[exp["operationType"]]
+    flag = {
+        **self.init_state["featureSwitch"]["defaultConfig"],
+        **self.init_state["featureSwitch"]["user"],
+        **self.init_state["featureSwitch"]["debug"],
+        **self.init_state["featureSwitch"]["customOverrides"],
+    }
+    featureSwitchesMap = {
+        k: v["value"] for k, v in flag.items() if k in featureSwitches
+    }
+    body = {
+        "variables": variables,
+        "queryId": queryId,
+    }
+    if featureSwitchesMap:
+        body.update({"features": featureSwitchesMap})
+    if fieldToggles:
+        body.update({"fieldToggles": fieldToggles})
+    return await self.graphql(method=method, body=body, path=f"/graphql/{queryId}/{operation}")
+
+
+async def measure(label: str, func, iterations: int) -> float:
+    variables = {
+        "rawQuery": "#Python since:2024-01-01 until:2024-01-31",
+        "count": 50,
+        "querySource": "typed_query",
+        "product": "Latest",
+        "withGrokTranslatedBio": False,
+    }
+    started = time.perf_counter()
+    for i in range(iterations):
+        variables["cursor"] = f"DAADDAABCgABG{i}"
+        await func("SearchTimeline", variables)
+    elapsed = time.perf_counter() - started
+    per_request = elapsed / iterations * 1e6
+    print(f"{label:>10}: {per_request:8.2f} us/request ({iterations} requests)")
+    return per_request
+
+
+async def main():
+    operation_list, init_state = make_fixture()
+    page = NullPage()
+
+    started = time.perf_counter()
+    request = TwitterAPIRequest(operation_list, init_state, page)
+    compile_ms = (time.perf_counter() - started) * 1000
+    print(f"operations: {len(operation_list)}, feature switches: {FEATURE_COUNT}")
+    print(f"registry build: {compile_ms:.2f} ms (one-off at inject time)")
+
+    # 同じ入力に対して同じペイロードになることを確認
+    variables = {"rawQuery": "#Python", "count": 50}
+    assert await legacy_request(request, "SearchTimeline", variables) == await request.request("SearchTimeline", variables)
+    assert json.loads((await request.request("SearchTimeline", variables))["params"]["variables"]) == variables
+
+    legacy = await measure("legacy", lambda op, v: legacy_request(request, op, v), ITERATIONS // 10)
+    compiled = await measure("compiled", request.request, ITERATIONS)
+    print(f"speedup: {legacy / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
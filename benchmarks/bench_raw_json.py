@@ -0,0 +1,113 @@
+"""
+page.evaluate からレスポンスを受け取る方式の比較
+
+ページ内のリクエスト関数を、用意したレスポンスをそのまま返す関数に差し替え、
+1ページ分のレスポンスをツイート行とカーソルにするまでの転送とパースの時間だけを計測する:
+    - structured: evaluate の戻り値としてオブジェクトをそのまま受け取る従来の方式（CDP上で値ごとにシリアライズ）
+    - raw: ページ内で JSON.stringify した1つの文字列を受け取り、Python側でパースする方式（orjson があれば使用）
+    - projected: ページ内で projection.js により行とカーソルだけに絞り込んでから受け取る方式
+
+引数に SearchTimeline のレスポンスを保存したJSONファイルを指定すると、それを使って計測する。
+指定しない場合は、リプレイサーバーと同じ生成ページを使う。
+
+実行:
+    python benchmarks/bench_raw_json.py [response.json ...]
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from playwright.async_api import async_playwright
+
+from replay_server import FEATURE_SWITCHES, OPERATIONS, SyntheticTimeline
+from twitter_api_browser_python.main import TwitterAPIRequest, load_script, orjson
+from twitter_api_browser_python.timeline_parser import parse_search_timeline
+
+
+PAGES = 20
+ROUNDS = 5
+MODES = ("structured", "raw", "projected")
+
+
+def load_pages(paths):
+    if paths:
+        return [json.loads(Path(p).read_text(encoding="utf-8")) for p in paths]
+    # 1ページ50件（実際のリクエストの count と同じ）
+    timeline = SyntheticTimeline(tweets_per_page=50, tweet_interval=60.0)
+    query = "#Python since:2024-01-01 until:2024-01-31"
+    pages, cursor = [], None
+    for _ in range(PAGES):
+        page = timeline.page(query, cursor)
+        pages.append(page)
+        entries = page["data"]["search_by_raw_query"]["search_timeline"]["timeline"]["instructions"][0]["entries"]
+        cursor = entries[-1]["content"]["value"]
+    return pages
+
+
+async def fetch_rows(request: TwitterAPIRequest, mode: str) -> tuple:
+    variables = {"rawQuery": "#Python", "count": 50}
+    if mode == "projected":
+        res = await request.request_projected("SearchTimeline", variables, {"keyword": "#Python"})
+        return res["rows"], res["cursor"]
+    request.raw_json_operations = {"SearchTimeline"} if mode == "raw" else set()
+    return parse_search_timeline(await request.request("SearchTimeline", variables), "#Python")
+
+
+async def measure(request: TwitterAPIRequest, page, count: int, mode: str) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        elapsed = 0.0
+        for i in range(count):
+            await page.evaluate("(i) => { globalThis.__payload_index = i; }", i)
+            started = time.perf_counter()
+            await fetch_rows(request, mode)
+            elapsed += time.perf_counter() - started
+        best = min(best, elapsed)
+    return best
+
+
+async def main():
+    payloads = load_pages(sys.argv[1:])
+    total_bytes = sum(len(json.dumps(p, separators=(",", ":"))) for p in payloads)
+    init_state = {"featureSwitch": {"defaultConfig": FEATURE_SWITCHES, "user": {}, "debug": {}, "customOverrides": {}}}
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.evaluate(
+            """(payloads) => {
+              globalThis.__payloads = payloads;
+              globalThis.__payload_index = 0;
+              globalThis.elonmusk_114514_request = async () => globalThis.__payloads[globalThis.__payload_index];
+            }""",
+            payloads,
+        )
+        await page.evaluate(await load_script("projection.js"))
+        request = TwitterAPIRequest(OPERATIONS, init_state, page)
+
+        # 各方式の結果が一致することを確認してから計測する
+        for i, payload in enumerate(payloads[:3]):
+            await page.evaluate("(i) => { globalThis.__payload_index = i; }", i)
+            request.raw_json_operations = {"SearchTimeline"}
+            assert await request.request("SearchTimeline", {}) == payload
+            expected = parse_search_timeline(payload, "#Python")
+            for mode in MODES:
+                assert await fetch_rows(request, mode) == expected, mode
+
+        times = {mode: await measure(request, page, len(payloads), mode) for mode in MODES}
+        await browser.close()
+
+    print(f"pages: {len(payloads)}, payload: {total_bytes / len(payloads) / 1024:.0f} KiB/page, rounds: {ROUNDS} (best)")
+    for mode in MODES:
+        label = f"{mode} ({'orjson' if orjson is not None else 'json'})" if mode == "raw" else mode
+        print(f"{label:>16}: {times[mode] / len(payloads) * 1000:8.2f} ms/page  "
+              f"{total_bytes / times[mode] / 1e6:8.1f} MB/s  speedup {times['structured'] / times[mode]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
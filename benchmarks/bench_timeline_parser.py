@@ -0,0 +1,268 @@
+"""
+SearchTimeline レスポンス解析のマイクロベンチマーク
+
+1ページ分のレスポンスからツイート行とカーソルを取り出す処理を比較する:
+    - legacy: 変更前の tweet_collector._parse_search_page（instructions を3回走査する方式、DEBUG出力は除去）
+    - shared: timeline_parser.parse_search_timeline（1回の走査で行とカーソルを取り出す方式）
+
+引数に SearchTimeline のレスポンスを保存したJSONファイルを指定すると、それを使って計測する。
+指定しない場合は、実際のレスポンスと同じ構造のページを生成して使う。
+
+実行:
+    python benchmarks/bench_timeline_parser.py [response.json ...]
+"""
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from twitter_api_browser_python.timeline_parser import parse_search_timeline
+
+
+PAGES = 50
+TWEETS_PER_PAGE = 20
+ROUNDS = 20
+KEYWORD = "#Python"
+
+
+def legacy_parse(res: dict, keyword: str) -> tuple:
+    """
+    SearchTimelineのレスポンスからツイート行と次ページのカーソルを取り出す
+    
+    Returns:
+        (ツイート行のリスト, ボトムカーソル)
+    
+    Raises:
+        KeyError: レスポンスの構造が想定と異なる場合
+    """
+    timeline = res["data"]["search_by_raw_query"]["search_timeline"]["timeline"]
+    instructions = timeline["instructions"]
+    
+    entries = []
+    for instruction in instructions:
+        if instruction["type"] == "TimelineAddEntries":
+            entries = instruction["entries"]
+            break
+        elif instruction["type"] == "TimelineReplaceEntry":
+            if instruction["entry"]["entryIdToReplace"] == "cursor-bottom-0":
+                entries.append(instruction["entry"])
+
+    page_tweets = []
+    bottom_cursor = None
+
+    for entry in entries:
+        try:
+            content = entry["content"]
+
+            # カーソルを処理
+            if content["entryType"] == "TimelineTimelineCursor":
+                if content["cursorType"] == "Bottom" or content["cursorType"] == "ShowMore":
+                    bottom_cursor = content["value"]
+                continue
+
+            # ツイートを処理
+            if content["entryType"] == "TimelineTimelineItem":
+                item_result = content["itemContent"]["tweet_results"].get("result")
+
+                if not item_result:
+                    continue
+
+                if "tweet" in item_result:
+                    item_result = item_result["tweet"]
+
+                if "legacy" not in item_result:
+                    continue
+
+                legacy = item_result["legacy"]
+
+                # ユーザーデータをチェック
+                if "core" not in item_result or "user_results" not in item_result["core"]:
+                    continue
+
+                user_result = item_result["core"]["user_results"]["result"]
+
+                if "legacy" in user_result:
+                    user_legacy = user_result["legacy"]
+                elif "user" in user_result and "legacy" in user_result["user"]:
+                    user_legacy = user_result["user"]["legacy"]
+                else:
+                    continue
+
+                # データを抽出
+                tweet_id = legacy["id_str"]
+
+                screen_name = user_legacy.get("screen_name")
+                author_name = user_legacy.get("name")
+
+                if not screen_name and "core" in user_result:
+                    screen_name = user_result["core"].get("screen_name")
+                if not author_name and "core" in user_result:
+                    author_name = user_result["core"].get("name")
+
+                if not screen_name and "screen_name" in user_result:
+                    screen_name = user_result["screen_name"]
+                if not author_name and "name" in user_result:
+                    author_name = user_result["name"]
+
+                if not screen_name:
+                    screen_name = "Unknown"
+                if not author_name:
+                    author_name = "Unknown"
+
+                # 日付を変換
+                post_date = legacy["created_at"]
+                try:
+                    dt = datetime.strptime(post_date, "%a %b %d %H:%M:%S %z %Y")
+                    formatted_date = dt.strftime("%Y-%m-%d %H:%M:%S")
+                except:
+                    formatted_date = post_date
+
+                post_link = f"https://x.com/{screen_name}/status/{tweet_id}"
+
+                # メトリクス
+                repost_count = legacy.get("retweet_count", 0)
+                favorite_count = legacy.get("favorite_count", 0)
+
+                impression_count = 0
+                if "views" in item_result and "count" in item_result["views"]:
+                    impression_count = int(item_result["views"]["count"])
+
+                # ハッシュタグ
+                hashtags = [tag["text"] for tag in legacy.get("entities", {}).get("hashtags", [])]
+                search_tag_clean = keyword.replace("#", "").lower()
+                other_tags = [f"#{tag}" for tag in hashtags if tag.lower() != search_tag_clean]
+
+                tweet_data = {
+                    "Author Name": author_name,
+                    "Post Date": formatted_date,
+                    "Post Link": post_link,
+                    "Other Hashtags": ", ".join(other_tags),
+                    "Repost Count": repost_count,
+                    "Impression Count": impression_count,
+                    "Like Count": favorite_count
+                }
+
+                page_tweets.append(tweet_data)
+        except Exception:
+            continue
+
+    # カーソルを抽出
+    for instruction in instructions:
+        if instruction["type"] == "TimelineAddEntries":
+            for entry in instruction["entries"]:
+                if entry["content"]["entryType"] == "TimelineTimelineCursor" and entry["content"]["cursorType"] == "Bottom":
+                    bottom_cursor = entry["content"]["value"]
+        elif instruction["type"] == "TimelineReplaceEntry":
+            if instruction["entry"]["content"]["entryType"] == "TimelineTimelineCursor" and instruction["entry"]["content"]["cursorType"] == "Bottom":
+                bottom_cursor = instruction["entry"]["content"]["value"]
+
+    if not bottom_cursor:
+        for entry in entries:
+            if entry["content"]["entryType"] == "TimelineTimelineCursor" and entry["content"]["cursorType"] == "Bottom":
+                bottom_cursor = entry["content"]["value"]
+
+
+    return page_tweets, bottom_cursor
+
+
+def make_tweet(rng: random.Random, tweet_id: int) -> dict:
+    """tweet_results.result 相当のデータを生成（一部は visibility ラッパー付き）"""
+    screen_name = f"user{rng.randrange(100000)}"
+    tags = [{"text": "Python", "indices": [0, 7]}] + [
+        {"text": f"tag{rng.randrange(50)}", "indices": [0, 0]} for _ in range(rng.randrange(4))
+    ]
+    result = {
+        "__typename": "Tweet",
+        "rest_id": str(tweet_id),
+        "core": {"user_results": {"result": {
+            "__typename": "User",
+            "rest_id": str(rng.randrange(10**12)),
+            "core": {"screen_name": screen_name, "name": f"User {screen_name}"},
+            "legacy": {"followers_count": rng.randrange(10000), "description": "x" * 80},
+        }}},
+        "views": {"count": str(rng.randrange(100000)), "state": "EnabledWithCount"},
+        "legacy": {
+            "id_str": str(tweet_id),
+            "created_at": time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(1700000000 - tweet_id % 10**6)),
+            "full_text": "#Python " + "lorem ipsum " * 10,
+            "entities": {"hashtags": tags, "urls": [], "user_mentions": []},
+            "retweet_count": rng.randrange(1000),
+            "favorite_count": rng.randrange(5000),
+            "reply_count": rng.randrange(100),
+        },
+    }
+    if rng.random() < 0.1:
+        return {"__typename": "TweetWithVisibilityResults", "tweet": result}
+    return result
+
+
+def make_page(rng: random.Random, page: int) -> dict:
+    entries = []
+    for i in range(TWEETS_PER_PAGE):
+        tweet_id = 1800000000000000000 + page * 1000 + i
+        entries.append({
+            "entryId": f"tweet-{tweet_id}",
+            "sortIndex": str(tweet_id),
+            "content": {
+                "entryType": "TimelineTimelineItem",
+                "__typename": "TimelineTimelineItem",
+                "itemContent": {
+                    "itemType": "TimelineTweet",
+                    "tweet_results": {"result": make_tweet(rng, tweet_id)},
+                },
+            },
+        })
+    entries.append({"entryId": "cursor-top-0", "content": {
+        "entryType": "TimelineTimelineCursor", "cursorType": "Top", "value": f"top-{page}"}})
+    entries.append({"entryId": "cursor-bottom-0", "content": {
+        "entryType": "TimelineTimelineCursor", "cursorType": "Bottom", "value": f"bottom-{page}"}})
+    instructions = [{"type": "TimelineClearCache"}, {"type": "TimelineAddEntries", "entries": entries}]
+    if page % 2:
+        # 2ページ目以降はカーソルが TimelineReplaceEntry で返ることがある
+        instructions.append({"type": "TimelineReplaceEntry", "entry_id_to_replace": "cursor-bottom-0", "entry": {
+            "entryId": "cursor-bottom-0", "entryIdToReplace": "cursor-bottom-0", "content": {
+                "entryType": "TimelineTimelineCursor", "cursorType": "Bottom", "value": f"replaced-{page}"}}})
+    return {"data": {"search_by_raw_query": {"search_timeline": {"timeline": {"instructions": instructions}}}}}
+
+
+def load_pages(paths):
+    if paths:
+        return [json.loads(Path(p).read_text(encoding="utf-8")) for p in paths]
+    rng = random.Random(0)
+    return [make_page(rng, page) for page in range(PAGES)]
+
+
+def measure(parse, pages) -> tuple:
+    tweets = 0
+    best = float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        count = 0
+        for page in pages:
+            count += len(parse(page, KEYWORD)[0])
+        best = min(best, time.perf_counter() - started)
+        tweets = count
+    return tweets, best
+
+
+def main():
+    pages = load_pages(sys.argv[1:])
+
+    # 両方式の結果が一致することを確認してから計測する
+    for page in pages:
+        assert legacy_parse(page, KEYWORD) == parse_search_timeline(page, KEYWORD)
+
+    legacy_tweets, legacy_time = measure(legacy_parse, pages)
+    shared_tweets, shared_time = measure(parse_search_timeline, pages)
+    print(f"pages: {len(pages)}, tweets/round: {shared_tweets}, rounds: {ROUNDS} (best)")
+    print(f"legacy: {legacy_time * 1000:8.2f} ms  {legacy_tweets / legacy_time:10.0f} tweets/sec")
+    print(f"shared: {shared_time * 1000:8.2f} ms  {shared_tweets / shared_time:10.0f} tweets/sec")
+    print(f"speedup: {legacy_time / shared_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""
+オフライン検証用の X Webアプリ代替サーバー
+
+x.com にログインせずに TwitterAPIBrowser と収集処理を動かすためのサーバー。
+以下を提供する:
+    - /home: inject スクリプトが待つグローバル（オペレーション・初期状態・dispatch）を用意するスタブページ
+    - /i/api/graphql/{queryId}/{operationName}: SearchTimeline のページを返す
+      （保存済みレスポンスのディレクトリを指定した場合はそれを順に、指定しない場合は検索期間に合わせて生成したもの）
+    - 遅延・エラー・レート制限の設定
+    - /home に埋め込む画像・動画・フォント・外部ドメインのスクリプト（ブラウザのプロファイルの比較用）
+
+TwitterAPIBrowser は環境変数 X_BASE_URL をこのサーバーに向けて使う。
+
+実行:
+    python benchmarks/replay_server.py --port 8765 --latency-ms 200 --error-rate 0.05 --rate-limit 50
+    X_BASE_URL=http://127.0.0.1:8765 python ...
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
+
+
+# スノーフレークIDの基準時刻（ミリ秒）
+TWITTER_EPOCH_MS = 1288834974657
+
+# スタブページが提供するオペレーション
+OPERATIONS = [
+    {
+        "queryId": "replaySearchTimeline",
+        "operationName": "SearchTimeline",
+        "operationType": "query",
+        "metadata": {
+            "featureSwitches": ["responsive_web_graphql_timeline_navigation_enabled", "view_counts_everywhere_api_enabled"],
+            "fieldToggles": ["withArticleRichContentState"],
+        },
+    },
+    {
+        "queryId": "replayUserByScreenName",
+        "operationName": "UserByScreenName",
+        "operationType": "query",
+        "metadata": {"featureSwitches": ["responsive_web_graphql_timeline_navigation_enabled"], "fieldToggles": []},
+    },
+]
+
+FEATURE_SWITCHES = {
+    "responsive_web_graphql_timeline_navigation_enabled": {"value": True},
+    "view_counts_everywhere_api_enabled": {"value": True},
+}
+
+HOME_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>replay</title></head>
+<body>
+<script>
+(() => {
+  // webpack のモジュール読み込みと同じく Function.prototype.call でオペレーションを公開する
+  const operations = __OPERATIONS__;
+  for (const operation of operations) {
+    const module = { exports: {} };
+    (function (m) { m.exports = operation; }).call(null, module);
+  }
+
+  window.__INITIAL_STATE__ = {
+    featureSwitch: {
+      defaultConfig: __FEATURE_SWITCHES__,
+      user: {},
+      debug: {},
+      customOverrides: {},
+    },
+  };
+
+  const client = {
+    dispatch(query) {
+      if (query.noop) return Promise.resolve(null);
+      let url = "/i/api" + query.path;
+      const init = { method: query.method, headers: query.headers, credentials: "include" };
+      if (query.params) url += "?" + new URLSearchParams(query.params);
+      if (query.data) init.body = JSON.stringify(query.data);
+      return fetch(url, init).then(async (res) => {
+        const body = await res.json();
+        if (!res.ok) {
+          const error = new Error(`HTTP ${res.status}`);
+          error.status = res.status;
+          error.body = body;
+          throw error;
+        }
+        return body;
+      });
+    },
+  };
+  // アプリのバックグラウンド通信と同様に dispatch を定期的に呼び、setup.js がクライアントを捕捉できるようにする
+  setInterval(() => client.dispatch.apply(client, [{ noop: true }]), 50);
+})();
+</script>
+__ASSETS__
+</body>
+</html>
+"""
+
+# /home に埋め込むリソースの種類ごとの Content-Type
+ASSET_TYPES = {
+    "png": "image/png",
+    "mp4": "video/mp4",
+    "woff2": "font/woff2",
+    "js": "application/javascript",
+}
+
+
+@dataclass
+class ReplayConfig:
+    """リプレイサーバーの動作設定"""
+
+    # GraphQLレスポンスまでの遅延（ミリ秒）と、それに加える一様乱数の幅
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # 500を返す確率
+    error_rate: float = 0.0
+    # rate_window 秒あたりの上限リクエスト数（0は無制限）。超えると429を返す
+    rate_limit: int = 0
+    rate_window: float = 900.0
+    # 生成するページの件数と、ツイート同士の投稿間隔（秒）
+    tweets_per_page: int = 20
+    tweet_interval: float = 60.0
+    # 保存済みの SearchTimeline レスポンス（*.json）のディレクトリ
+    fixtures_dir: Optional[str] = None
+    seed: int = 0
+    # /home に埋め込む画像・動画・フォント・外部スクリプトのそれぞれの数と、1つあたりのサイズ（KB）
+    home_assets: int = 0
+    asset_kb: int = 64
+
+
+_SINCE_TIME = re.compile(r"since_time:(\d+)")
+_UNTIL_TIME = re.compile(r"until_time:(\d+)")
+_SINCE_DATE = re.compile(r"since:(\d{4}-\d{2}-\d{2})")
+_UNTIL_DATE = re.compile(r"until:(\d{4}-\d{2}-\d{2})")
+
+
+def _date_epoch(date_str: str) -> int:
+    return int(datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+def query_window(raw_query: str) -> Tuple[int, int]:
+    """検索クエリの since_time/until_time（または since/until）から [since, until) を取り出す"""
+    now = int(time.time())
+    since = _SINCE_TIME.search(raw_query)
+    until = _UNTIL_TIME.search(raw_query)
+    since_value = int(since.group(1)) if since else None
+    until_value = int(until.group(1)) if until else None
+    if since_value is None:
+        match = _SINCE_DATE.search(raw_query)
+        since_value = _date_epoch(match.group(1)) if match else now - 7 * 86400
+    if until_value is None:
+        match = _UNTIL_DATE.search(raw_query)
+        until_value = _date_epoch(match.group(1)) if match else now
+    return since_value, until_value
+
+
+def snowflake_id(timestamp_ms: int, sequence: int = 0) -> int:
+    return ((timestamp_ms - TWITTER_EPOCH_MS) << 22) | (sequence & 0xFFF)
+
+
+def _cursor_entry(cursor_type: str, value: str) -> Dict[str, Any]:
+    return {
+        "entryId": f"cursor-{cursor_type.lower()}-0",
+        "content": {"entryType": "TimelineTimelineCursor", "cursorType": cursor_type, "value": value},
+    }
+
+
+def _search_response(instructions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"data": {"search_by_raw_query": {"search_timeline": {"timeline": {"instructions": instructions}}}}}
+
+
+class SyntheticTimeline:
+    """
+    検索期間に合わせて SearchTimeline のページを生成する
+
+    ツイートは until から tweet_interval 秒ごとに新しい順に並び、since に達したら終わる。
+    カーソルには次のツイートの時刻を入れるため、サーバー側に状態を持たない。
+    """
+
+    def __init__(self, tweets_per_page: int = 20, tweet_interval: float = 60.0, seed: int = 0):
+        self.tweets_per_page = tweets_per_page
+        self.tweet_interval = tweet_interval
+        self.seed = seed
+
+    def _tweet(self, timestamp: float) -> Dict[str, Any]:
+        timestamp_ms = int(timestamp * 1000)
+        rng = random.Random(timestamp_ms ^ self.seed)
+        tweet_id = snowflake_id(timestamp_ms, rng.randrange(4096))
+        screen_name = f"user{rng.randrange(100000)}"
+        hashtags = [{"text": "Python", "indices": [0, 7]}] + [
+            {"text": f"tag{rng.randrange(50)}", "indices": [0, 0]} for _ in range(rng.randrange(4))
+        ]
+        return {
+            "entryId": f"tweet-{tweet_id}",
+            "sortIndex": str(tweet_id),
+            "content": {
+                "entryType": "TimelineTimelineItem",
+                "__typename": "TimelineTimelineItem",
+                "itemContent": {
+                    "itemType": "TimelineTweet",
+                    "tweet_results": {"result": {
+                        "__typename": "Tweet",
+                        "rest_id": str(tweet_id),
+                        "core": {"user_results": {"result": {
+                            "__typename": "User",
+                            "rest_id": str(rng.randrange(10 ** 12)),
+                            "core": {"screen_name": screen_name, "name": f"User {screen_name}"},
+                            "legacy": {"followers_count": rng.randrange(10000)},
+                        }}},
+                        "views": {"count": str(rng.randrange(100000)), "state": "EnabledWithCount"},
+                        "legacy": {
+                            "id_str": str(tweet_id),
+                            "created_at": time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(timestamp)),
+                            "full_text": "#Python " + "lorem ipsum " * 10,
+                            "entities": {"hashtags": hashtags, "urls": [], "user_mentions": []},
+                            "retweet_count": rng.randrange(1000),
+                            "favorite_count": rng.randrange(5000),
+                        },
+                    }},
+                },
+            },
+        }
+
+    def page(self, raw_query: str, cursor: Optional[str]) -> Dict[str, Any]:
+        since, until = query_window(raw_query)
+        # 最初のページは until の直前から
+        position = float(cursor.split(":", 1)[1]) if cursor else until - self.tweet_interval / 2
+        entries = []
+        while len(entries) < self.tweets_per_page and position >= since:
+            entries.append(self._tweet(position))
+            position -= self.tweet_interval
+        entries.append(_cursor_entry("Top", f"top:{until}"))
+        # 期間の終わりに達したら、受け取ったカーソルをそのまま返す（実際の終端と同じ挙動）
+        bottom = f"synthetic:{position}" if position >= since else (cursor or f"synthetic:{position}")
+        entries.append(_cursor_entry("Bottom", bottom))
+        return _search_response([{"type": "TimelineAddEntries", "entries": entries}])
+
+
+class RecordedTimeline:
+    """保存済みの SearchTimeline レスポンスを順に返す（検索クエリは無視する）"""
+
+    def __init__(self, fixtures_dir: str):
+        paths = sorted(Path(fixtures_dir).glob("*.json"))
+        if not paths:
+            raise ValueError(f"レスポンスのファイルが見つかりません: {fixtures_dir}")
+        self.pages = [json.loads(path.read_text(encoding="utf-8")) for path in paths]
+
+    def page(self, raw_query: str, cursor: Optional[str]) -> Dict[str, Any]:
+        index = int(cursor.split(":", 1)[1]) if cursor and cursor.startswith("recorded:") else 0
+        if index >= len(self.pages):
+            return _search_response([{"type": "TimelineAddEntries", "entries": [_cursor_entry("Bottom", cursor)]}])
+        page = json.loads(json.dumps(self.pages[index]))
+        # 記録されたカーソルを、次のファイルを指すカーソルに置き換える
+        instructions = page["data"]["search_by_raw_query"]["search_timeline"]["timeline"]["instructions"]
+        for instruction in instructions:
+            entries = instruction.get("entries") or ([instruction["entry"]] if "entry" in instruction else [])
+            for entry in entries:
+                content = entry.get("content", {})
+                if content.get("entryType") == "TimelineTimelineCursor" and content.get("cursorType") == "Bottom":
+                    content["value"] = f"recorded:{index + 1}"
+        return page
+
+
+class FixedWindowRateLimiter:
+    """x-rate-limit-* ヘッダーと同じ考え方の固定ウィンドウ方式のレート制限"""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._reset_at = time.time() + window
+        self._used = 0
+
+    def acquire(self) -> Tuple[bool, Dict[str, str]]:
+        now = time.time()
+        if now >= self._reset_at:
+            self._reset_at = now + self.window
+            self._used = 0
+        allowed = self._used < self.limit
+        if allowed:
+            self._used += 1
+        headers = {
+            "x-rate-limit-limit": str(self.limit),
+            "x-rate-limit-remaining": str(max(0, self.limit - self._used)),
+            "x-rate-limit-reset": str(int(self._reset_at)),
+        }
+        return allowed, headers
+
+
+def create_app(config: ReplayConfig) -> FastAPI:
+    """設定に応じたリプレイサーバーのアプリケーションを作成"""
+    app = FastAPI(title="X Replay Server")
+    timeline = RecordedTimeline(config.fixtures_dir) if config.fixtures_dir else SyntheticTimeline(
+        config.tweets_per_page, config.tweet_interval, config.seed
+    )
+    limiter = FixedWindowRateLimiter(config.rate_limit, config.rate_window) if config.rate_limit else None
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "pages": 0, "errors": 0, "rate_limited": 0, "assets": 0}
+    app.state.stats = stats
+
+    home_html = (
+        HOME_HTML
+        .replace("__OPERATIONS__", json.dumps(OPERATIONS))
+        .replace("__FEATURE_SWITCHES__", json.dumps(FEATURE_SWITCHES))
+    )
+
+    @app.get("/home")
+    async def home(request: Request):
+        # 外部スクリプトは別のホスト名（127.0.0.1 に対する localhost）から読み込ませる
+        other_host = "127.0.0.1" if request.url.hostname == "localhost" else "localhost"
+        third_party = f"http://{other_host}:{request.url.port}"
+        assets = "".join(
+            f'<img src="/__replay/asset/{i}.png">'
+            f'<video src="/__replay/asset/{i}.mp4" preload="auto" autoplay muted></video>'
+            f'<style>@font-face {{ font-family: f{i}; src: url(/__replay/asset/{i}.woff2); }}</style>'
+            f'<p style="font-family: f{i}">replay</p>'
+            f'<script src="{third_party}/__replay/asset/{i}.js" async></script>'
+            for i in range(config.home_assets)
+        )
+        return HTMLResponse(home_html.replace("__ASSETS__", assets))
+
+    @app.get("/__replay/asset/{name}")
+    async def asset(name: str):
+        stats["assets"] += 1
+        delay = config.latency_ms + rng.uniform(0, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        ext = name.rsplit(".", 1)[-1]
+        if ext == "js":
+            body = b"/*" + b" " * (config.asset_kb * 1024) + b"*/"
+        else:
+            body = bytes(config.asset_kb * 1024)
+        return Response(body, media_type=ASSET_TYPES.get(ext, "application/octet-stream"))
+
+    @app.get("/login")
+    async def login():
+        # ログイン済みとして扱う
+        return RedirectResponse("/home")
+
+    @app.get("/__replay/stats")
+    async def replay_stats():
+        return stats
+
+    @app.api_route("/i/api/graphql/{query_id}/{operation}", methods=["GET", "POST"])
+    async def graphql(query_id: str, operation: str, request: Request):
+        stats["requests"] += 1
+        delay = config.latency_ms + rng.uniform(0, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        headers: Dict[str, str] = {}
+        if limiter is not None:
+            allowed, headers = limiter.acquire()
+            if not allowed:
+                stats["rate_limited"] += 1
+                return JSONResponse(
+                    {"errors": [{"code": 88, "message": "Rate limit exceeded."}]}, status_code=429, headers=headers
+                )
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                {"errors": [{"code": 131, "message": "Internal error."}]}, status_code=500, headers=headers
+            )
+
+        if request.method == "GET":
+            variables = json.loads(request.query_params.get("variables", "{}"))
+        else:
+            variables = (await request.json()).get("variables", {})
+        if operation != "SearchTimeline":
+            return JSONResponse({"data": {}}, headers=headers)
+        stats["pages"] += 1
+        page = timeline.page(variables.get("rawQuery", ""), variables.get("cursor"))
+        return JSONResponse(page, headers=headers)
+
+    return app
+
+
+class ReplayServer:
+    """リプレイサーバーを同じイベントループ上で起動・停止する"""
+
+    def __init__(self, config: Optional[ReplayConfig] = None, host: str = "127.0.0.1", port: int = 8765):
+        self.config = config or ReplayConfig()
+        self.host = host
+        self.port = port
+        self.app = create_app(self.config)
+        self._server: Optional[uvicorn.Server] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.app.state.stats)
+
+    async def start(self):
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning"))
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                # 起動に失敗した（ポートが使用中など）
+                await self._task
+                raise RuntimeError("リプレイサーバーを起動できませんでした")
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._task
+            self._server = None
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+def parse_config(argv: Optional[List[str]] = None) -> Tuple[argparse.Namespace, ReplayConfig]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="rate-window 秒あたりの上限リクエスト数（0は無制限）")
+    parser.add_argument("--rate-window", type=float, default=900.0)
+    parser.add_argument("--tweets-per-page", type=int, default=20)
+    parser.add_argument("--tweet-interval", type=float, default=60.0, help="生成するツイートの投稿間隔（秒）")
+    parser.add_argument("--fixtures", default=None, help="保存済みの SearchTimeline レスポンス（*.json）のディレクトリ")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--home-assets", type=int, default=0, help="/home に埋め込む画像・動画・フォント・外部スクリプトのそれぞれの数")
+    parser.add_argument("--asset-kb", type=int, default=64)
+    args = parser.parse_args(argv)
+    config = ReplayConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+        tweets_per_page=args.tweets_per_page,
+        tweet_interval=args.tweet_interval,
+        fixtures_dir=args.fixtures,
+        seed=args.seed,
+        home_assets=args.home_assets,
+        asset_kb=args.asset_kb,
+    )
+    return args, config
+
+
+if __name__ == "__main__":
+    args, config = parse_config()
+    print(f"Replay server: http://{args.host}:{args.port}  (X_BASE_URL に指定してください)")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="info")
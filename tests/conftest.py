@@ -0,0 +1,17 @@
+"""
+テスト共通の設定
+backend の services パッケージとリポジトリ直下の twitter_api_browser_python を読み込めるようにする
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "backend"))
+
+# モジュールの読み込み時に作成される保存先をテスト用の一時ディレクトリへ向ける
+_STATE_DIR = tempfile.mkdtemp(prefix="x-tag-scraper-tests-")
+os.environ.setdefault("SEEN_IDS_DIR", os.path.join(_STATE_DIR, "seen"))
+os.environ.setdefault("JOB_STORE", "memory")
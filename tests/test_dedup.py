@@ -0,0 +1,67 @@
+"""TweetIdSet と SeenIdStore のテスト"""
+from services.dedup import SeenIdStore, TweetIdSet, row_tweet_id
+
+
+def _row(tweet_id):
+    return {"Post Link": f"https://x.com/user/status/{tweet_id}"}
+
+
+def test_unseen_drops_known_and_repeated_ids():
+    ids = TweetIdSet([1, 2])
+    rows = [_row(2), _row(3), _row(3), {"Post Link": ""}, _row(4)]
+    unseen = ids.unseen(rows)
+    assert [row_tweet_id(row) for row in unseen] == [3, None, 4]
+    # unseen() は集合に追加しない
+    assert 3 not in ids
+
+    ids.add_rows(unseen)
+    assert 3 in ids and 4 in ids
+    assert len(ids) == 4
+    assert not ids.add(4)
+
+
+def test_compaction_keeps_membership(monkeypatch):
+    monkeypatch.setattr("services.dedup.COMPACT_THRESHOLD", 4)
+    ids = TweetIdSet()
+    for tweet_id in range(100, 0, -1):
+        assert ids.add(tweet_id)
+    assert len(ids) == 100
+    assert all(tweet_id in ids for tweet_id in range(1, 101))
+    assert 0 not in ids and 101 not in ids
+
+    ids.discard({1, 50})
+    assert 1 not in ids and 50 not in ids
+    assert len(ids) == 98
+
+
+def test_journal_resumes_from_checkpoint_size(tmp_path):
+    path = str(tmp_path / "out.ids")
+    ids = TweetIdSet()
+    ids.open_journal(path)
+    ids.add_rows([_row(1), _row(2)])
+    size = ids.journal_size()
+    # チェックポイント後に追加した分は再開時に切り捨てる
+    ids.add(3)
+    ids.close_journal()
+
+    restored = TweetIdSet.load(path, size)
+    assert sorted(i for i in range(5) if i in restored) == [1, 2]
+    restored.open_journal(path, size)
+    restored.add(4)
+    restored.close_journal()
+    assert sorted(i for i in range(5) if i in TweetIdSet.load(path)) == [1, 2, 4]
+
+    # 再開しない場合はジャーナルを削除する
+    restored.open_journal(path, size)
+    restored.close_journal(remove=True)
+    assert not (tmp_path / "out.ids").exists()
+
+
+def test_seen_id_store_merges_by_normalized_keyword(tmp_path):
+    store = SeenIdStore(str(tmp_path))
+    store.merge_save("#Tag", TweetIdSet([1, 2]))
+    store.merge_save("  #tag ", TweetIdSet([2, 3]))
+    seen = store.load("#TAG")
+    assert len(seen) == 3
+    assert all(tweet_id in seen for tweet_id in (1, 2, 3))
+    assert len(store.load("#other")) == 0
@@ -0,0 +1,95 @@
+"""出力ファイルのライターのテスト"""
+import pytest
+
+from services import output_writer
+from services.output_writer import CSV_FIELDNAMES, check_output_format, create_writer, iter_rows
+
+
+def _rows(*tweet_ids):
+    return [
+        {
+            "Author Name": "ユーザー",
+            "Post Date": f"2024-01-01 00:00:{tweet_id:02d}",
+            "Post Link": f"https://x.com/user/status/{tweet_id}",
+            "Other Hashtags": "#other",
+            "Repost Count": 1,
+            "Impression Count": 2,
+            "Like Count": 3,
+        }
+        for tweet_id in tweet_ids
+    ]
+
+
+def _available(output_format):
+    try:
+        check_output_format(output_format)
+    except ValueError:
+        return False
+    return True
+
+
+FORMATS = [
+    pytest.param(
+        output_format,
+        marks=pytest.mark.skipif(not _available(output_format), reason=f"{output_format} の依存パッケージが必要"),
+    )
+    for output_format in output_writer.OUTPUT_FORMATS
+]
+
+
+def _links(path, output_format):
+    return [row["Post Link"].rsplit("/", 1)[1] for row in iter_rows(path, output_format)]
+
+
+@pytest.mark.parametrize("output_format", FORMATS)
+def test_rows_round_trip(tmp_path, output_format):
+    path = str(tmp_path / f"out{output_writer.output_extension(output_format)}")
+    writer = create_writer(path, output_format)
+    writer.write_rows(_rows(1, 2))
+    writer.write_rows([])
+    writer.write_rows(_rows(3))
+    assert writer.row_count == 3
+    writer.close()
+
+    rows = list(iter_rows(path, output_format))
+    assert [row["Post Link"] for row in rows] == [f"https://x.com/user/status/{i}" for i in (1, 2, 3)]
+    assert set(rows[0]) == set(CSV_FIELDNAMES)
+    assert rows[0]["Author Name"] == "ユーザー"
+    assert rows[0]["Post Date"] == "2024-01-01 00:00:01"
+
+
+@pytest.mark.parametrize("output_format", FORMATS)
+def test_resume_truncates_to_checkpoint(tmp_path, output_format):
+    path = str(tmp_path / f"out{output_writer.output_extension(output_format)}")
+    writer = create_writer(path, output_format)
+    writer.write_rows(_rows(1, 2))
+    size, row_count = writer.size, writer.row_count
+    writer.write_rows(_rows(3))
+    writer.close(keep_journal=True)
+
+    resumed = create_writer(path, output_format)
+    resumed.resume(size, row_count)
+    resumed.write_rows(_rows(4))
+    assert resumed.row_count == 3
+    resumed.close()
+    assert _links(path, output_format) == ["1", "2", "4"]
+
+
+def test_nothing_written_leaves_no_file(tmp_path):
+    writer = create_writer(str(tmp_path / "out.csv"), "csv")
+    writer.close()
+    assert writer.size == 0
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_resume_rejects_short_file(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text("")
+    writer = create_writer(str(path), "jsonl")
+    with pytest.raises(ValueError):
+        writer.resume(100, 1)
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        check_output_format("xlsx")
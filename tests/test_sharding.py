@@ -0,0 +1,143 @@
+"""LimitBudget と OrderedShardWriter のテスト"""
+import json
+from datetime import datetime, timezone
+
+from services.output_writer import JSONLWriter, iter_rows
+from services.sharding import LimitBudget, OrderedShardWriter, Shard
+
+T0 = 1704067200
+
+
+def _row(ts):
+    return {
+        "Author Name": "User",
+        "Post Date": datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "Post Link": f"https://x.com/user/status/{ts}",
+    }
+
+
+def _rows(*timestamps):
+    return [_row(ts) for ts in timestamps]
+
+
+def _ids(path):
+    return [int(row["Post Link"].rsplit("/", 1)[1]) for row in iter_rows(path, "jsonl")]
+
+
+def _merger(tmp_path, limit=None, count=3):
+    """新しい順に shards[0], shards[1], ... となる1時間ずつのシャード"""
+    writer = JSONLWriter(str(tmp_path / "out.jsonl"))
+    merger = OrderedShardWriter(writer, limit)
+    shards = [Shard(i, T0 + (count - i - 1) * 3600, T0 + (count - i) * 3600) for i in range(count)]
+    # 登録順に関わらず until の降順に並ぶ
+    for shard in reversed(shards):
+        merger.add(shard)
+    return merger, shards
+
+
+def test_writes_shards_in_time_order(tmp_path):
+    merger, (new, middle, old) = _merger(tmp_path)
+    assert merger.shards == [new, middle, old]
+
+    merger.write(old, _rows(T0 + 20, T0 + 10))
+    merger.write(middle, _rows(T0 + 3620))
+    merger.write(new, _rows(T0 + 7220))
+    # 先頭のシャードだけが出力ファイルに直接書き込まれる
+    assert _ids(merger.writer.path) == [T0 + 7220]
+
+    merger.finish(old)
+    merger.finish(new)
+    merger.write(middle, _rows(T0 + 3610))
+    merger.finish(middle)
+    merger.close()
+    assert _ids(merger.writer.path) == [T0 + 7220, T0 + 3620, T0 + 3610, T0 + 20, T0 + 10]
+    assert not (tmp_path / "out.jsonl.parts").exists()
+
+
+def test_does_not_advance_past_failed_shard(tmp_path):
+    merger, (new, middle, old) = _merger(tmp_path)
+    merger.write(new, _rows(T0 + 7200))
+    merger.write(old, _rows(T0 + 10))
+    middle.error = "リクエストに失敗しました"
+    merger.finish(new)
+    merger.finish(middle)
+    merger.finish(old)
+    assert _ids(merger.writer.path) == [T0 + 7200]
+
+    # 再開しない場合は残りの退避分を順に書き出す
+    merger.flush()
+    merger.close()
+    assert _ids(merger.writer.path) == [T0 + 7200, T0 + 10]
+
+
+def test_limit_keeps_newest_rows(tmp_path):
+    merger, (new, middle, old) = _merger(tmp_path, limit=3)
+    budget = LimitBudget(3, merger.shards)
+
+    merger.write(old, budget.claim(old, _rows(T0 + 30, T0 + 20, T0 + 10)))
+    assert budget.remaining(old) == 0
+    assert budget.full(old)
+    merger.write(new, budget.claim(new, _rows(T0 + 7210, T0 + 7200)))
+    # 新しいシャードの行が増えたため、古いシャードの行の一部は結果に入らない
+    assert budget.remaining(old) == -2
+    assert not budget.full(new)
+    assert budget.used == 3
+    assert budget.exhausted
+
+    for shard in (new, middle, old):
+        merger.finish(shard)
+    merger.close()
+    assert _ids(merger.writer.path) == [T0 + 7210, T0 + 7200, T0 + 30]
+    assert merger.dropped_ids == {T0 + 20, T0 + 10}
+
+
+def test_restore_truncates_writes_after_checkpoint(tmp_path):
+    merger, (new, middle, old) = _merger(tmp_path)
+    merger.write(new, _rows(T0 + 7210))
+    merger.write(old, _rows(T0 + 30))
+    state = json.loads(json.dumps(merger.state()))
+    shard_state = [shard.to_dict() for shard in merger.shards]
+    # チェックポイント後の書き込みは再開時に捨てる
+    merger.write(new, _rows(T0 + 7200))
+    merger.write(old, _rows(T0 + 20))
+    merger.close(keep_spools=True)
+    merger.writer.close()
+
+    writer = JSONLWriter(str(tmp_path / "out.jsonl"))
+    restored = OrderedShardWriter(writer)
+    shards = [Shard.from_dict(data) for data in shard_state]
+    for shard in shards:
+        restored.add(shard)
+    restored.restore(state)
+    new, middle, old = shards
+    assert _ids(writer.path) == [T0 + 7210]
+
+    restored.write(new, _rows(T0 + 7205))
+    restored.write(old, _rows(T0 + 25))
+    for shard in shards:
+        restored.finish(shard)
+    restored.close()
+    writer.close()
+    assert _ids(writer.path) == [T0 + 7210, T0 + 7205, T0 + 30, T0 + 25]
+
+
+def test_restore_skips_finished_head(tmp_path):
+    merger, (new, middle, old) = _merger(tmp_path)
+    merger.write(new, _rows(T0 + 7200))
+    merger.write(middle, _rows(T0 + 3610))
+    merger.finish(new)
+    state = json.loads(json.dumps(merger.state()))
+    shard_state = [shard.to_dict() for shard in merger.shards]
+    merger.close(keep_spools=True)
+    merger.writer.close()
+
+    # 終わっていたシャードの次から出力ファイルへ直接書き込む
+    writer = JSONLWriter(str(tmp_path / "out.jsonl"))
+    restored = OrderedShardWriter(writer)
+    for data in shard_state:
+        restored.add(Shard.from_dict(data))
+    restored.restore(state)
+    restored.write(restored.shards[1], _rows(T0 + 3600))
+    assert _ids(writer.path) == [T0 + 7200, T0 + 3610, T0 + 3600]
+    restored.close()
+    writer.close()
@@ -0,0 +1,152 @@
+"""timeline_parser とページ内の射影（inject/projection.js）のテスト"""
+import copy
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from twitter_api_browser_python.timeline_parser import (
+    format_created_at,
+    parse_bottom_cursor,
+    parse_search_timeline,
+)
+
+PROJECTION_JS = Path(__file__).resolve().parent.parent / "twitter_api_browser_python" / "inject" / "projection.js"
+
+
+def _tweet(tweet_id="1", created_at="Mon Jan 01 12:34:56 +0000 2024", **legacy):
+    return {
+        "legacy": {
+            "id_str": tweet_id,
+            "created_at": created_at,
+            "retweet_count": 2,
+            "favorite_count": 3,
+            "entities": {"hashtags": [{"text": "x"}, {"text": "other"}]},
+            **legacy,
+        },
+        "core": {"user_results": {"result": {"legacy": {"screen_name": "user", "name": "User"}}}},
+        "views": {"count": "10"},
+    }
+
+
+def _item(result):
+    return {
+        "content": {
+            "entryType": "TimelineTimelineItem",
+            "itemContent": {"tweet_results": {"result": result}},
+        }
+    }
+
+
+def _cursor(value, cursor_type="Bottom"):
+    return {"content": {"entryType": "TimelineTimelineCursor", "cursorType": cursor_type, "value": value}}
+
+
+def _response(*entries):
+    return {"data": {"search_by_raw_query": {"search_timeline": {"timeline": {"instructions": [
+        {"type": "TimelineAddEntries", "entries": list(entries)},
+    ]}}}}}
+
+
+def _malformed():
+    """1件ずつ不正な値を入れたツイート（どれも行を飛ばす）"""
+    cases = {
+        "created_at が null": _tweet(created_at=None),
+        "id_str が無い": _tweet(id_str=None),
+        "legacy が文字列": {**_tweet(), "legacy": "broken"},
+        "ユーザーの legacy が文字列": {**_tweet(), "core": {"user_results": {"result": {"legacy": "broken"}}}},
+        "entities が配列": _tweet(entities=["x"]),
+        "hashtags がオブジェクト": _tweet(entities={"hashtags": {"text": "x"}}),
+        "ハッシュタグが null": _tweet(entities={"hashtags": [None]}),
+        "ハッシュタグの text が数値": _tweet(entities={"hashtags": [{"text": 1}]}),
+        "views が文字列": {**_tweet(), "views": "10"},
+        "表示回数が数値でない": {**_tweet(), "views": {"count": "many"}},
+        "結果が文字列": "broken",
+    }
+    without_created_at = _tweet()
+    del without_created_at["legacy"]["created_at"]
+    cases["created_at が無い"] = without_created_at
+    return cases
+
+
+def _malformed_page():
+    entries = [_item(_tweet("100"))]
+    for index, result in enumerate(_malformed().values()):
+        if isinstance(result, dict) and isinstance(result.get("legacy"), dict):
+            result["legacy"]["id_str"] = result["legacy"]["id_str"] and str(200 + index)
+        entries.append(_item(result))
+    entries.append(_item(_tweet("300")))
+    entries.append(_cursor("next"))
+    return _response(*entries)
+
+
+def test_parse_search_timeline_rows_and_cursor():
+    rows, cursor = parse_search_timeline(_response(_item(_tweet()), _cursor("next")), "#x")
+    assert cursor == "next"
+    assert rows == [{
+        "Author Name": "User",
+        "Post Date": "2024-01-01 12:34:56",
+        "Post Link": "https://x.com/user/status/1",
+        "Other Hashtags": "#other",
+        "Repost Count": 2,
+        "Impression Count": 10,
+        "Like Count": 3,
+    }]
+
+
+@pytest.mark.parametrize("name", sorted(_malformed()))
+def test_malformed_tweet_is_skipped(name):
+    result = _malformed()[name]
+    page = _response(_item(_tweet("100")), _item(result), _item(_tweet("300")), _cursor("next"))
+    rows, cursor = parse_search_timeline(page, "#x")
+    assert [row["Post Link"].rsplit("/", 1)[1] for row in rows] == ["100", "300"]
+    assert cursor == "next"
+
+
+def test_missing_timeline_raises_key_error():
+    with pytest.raises(KeyError):
+        parse_search_timeline({"data": {}}, "#x")
+    with pytest.raises(KeyError):
+        parse_bottom_cursor({"data": {}})
+
+
+def test_show_more_cursor_is_used_without_bottom():
+    page = _response(_item(_tweet()), _cursor("more", "ShowMore"))
+    assert parse_bottom_cursor(page) == "more"
+
+
+def test_format_created_at():
+    assert format_created_at("Wed Oct 10 20:19:24 +0000 2018") == "2018-10-10 20:19:24"
+    assert format_created_at("Wed Oct 10 20:19:24 +0900 2018") == "2018-10-10 20:19:24"
+    assert format_created_at("not a date") == "not a date"
+
+
+def _project(page, keyword):
+    script = (
+        "const fs = require('fs');"
+        f"eval(fs.readFileSync({json.dumps(str(PROJECTION_JS))}, 'utf8'))();"
+        "const input = JSON.parse(fs.readFileSync(0, 'utf8'));"
+        "const out = globalThis.elonmusk_114514_projections.SearchTimeline(input.page, {keyword: input.keyword});"
+        "process.stdout.write(JSON.stringify(out));"
+    )
+    proc = subprocess.run(
+        ["node", "-e", script],
+        input=json.dumps({"page": page, "keyword": keyword}),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node が必要")
+def test_projection_matches_parser_on_malformed_tweets():
+    page = _malformed_page()
+    rows, cursor = parse_search_timeline(copy.deepcopy(page), "#x")
+    projected = _project(page, "#x")
+    assert [row["Post Link"].rsplit("/", 1)[1] for row in rows] == ["100", "300"]
+    assert projected["rows"] == rows
+    assert projected["cursor"] == cursor
+    assert projected["raw_dates"] == []
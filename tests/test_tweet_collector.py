@@ -0,0 +1,187 @@
+"""tweet_collector の収集処理（シャードのパイプラインとチェックポイントからの再開）のテスト"""
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from services import tweet_collector
+from services.dedup import TweetIdSet
+from services.output_writer import JSONLWriter, iter_rows
+from services.sharding import LimitBudget, OrderedShardWriter, Shard
+from services.stage_timer import StageTimer
+
+
+class StageDied(BaseException):
+    """except Exception で捕まらずにステージのタスクを終了させる例外"""
+
+
+def _cursor(value):
+    return {"content": {"entryType": "TimelineTimelineCursor", "cursorType": "Bottom", "value": value}}
+
+
+def _response(entries):
+    return {"data": {"search_by_raw_query": {"search_timeline": {"timeline": {"instructions": [
+        {"type": "TimelineAddEntries", "entries": entries},
+    ]}}}}}
+
+
+def _page(cursor):
+    return _response([_cursor(cursor)])
+
+
+def _run_shard(tmp_path, monkeypatch, request_page):
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(tweet_collector, "IN_PAGE_PROJECTION", False)
+    monkeypatch.setattr(tweet_collector, "_request_page", request_page)
+    shard = Shard(0, 1704067200, 1704153600)
+    writer = JSONLWriter(str(tmp_path / "out.jsonl"))
+    merger = OrderedShardWriter(writer)
+    merger.add(shard)
+    budget = LimitBudget(100, merger.shards)
+    collect = tweet_collector._collect_shard(
+        None, shard, "#x", budget, merger, TweetIdSet(), lambda shard: None, noop, noop, StageTimer()
+    )
+    try:
+        asyncio.run(asyncio.wait_for(collect, timeout=5))
+    finally:
+        merger.close()
+    return shard
+
+
+def test_parse_failure_becomes_shard_error(tmp_path, monkeypatch):
+    async def request_page(*args, **kwargs):
+        return _page("next")
+
+    def parse_search_timeline(res, keyword):
+        raise AttributeError("'NoneType' object has no attribute 'get'")
+
+    monkeypatch.setattr(tweet_collector, "parse_search_timeline", parse_search_timeline)
+    shard = _run_shard(tmp_path, monkeypatch, request_page)
+    assert shard.error.startswith("レスポンスパースエラー")
+    assert shard.cursor is None
+
+
+def test_dead_fetch_stage_fails_shard(tmp_path, monkeypatch):
+    async def request_page(*args, **kwargs):
+        raise StageDied()
+
+    shard = _run_shard(tmp_path, monkeypatch, request_page)
+    assert "fetch" in shard.error
+
+
+def test_dead_parse_stage_fails_shard(tmp_path, monkeypatch):
+    async def request_page(*args, **kwargs):
+        return _page("next")
+
+    def parse_search_timeline(res, keyword):
+        raise StageDied()
+
+    monkeypatch.setattr(tweet_collector, "parse_search_timeline", parse_search_timeline)
+    shard = _run_shard(tmp_path, monkeypatch, request_page)
+    assert "parse" in shard.error
+
+
+# 2024-01-01〜01-03 の120件（新しい順）
+T0 = 1704067200
+TWEETS = sorted(random.Random(0).sample(range(T0, T0 + 2 * 86400), 120), reverse=True)
+
+
+class FakeInject:
+    """since_time / until_time の範囲のツイートを20件ずつ返す SearchTimeline"""
+
+    def __init__(self, fail_at=None):
+        self.calls = 0
+        self.fail_at = fail_at
+
+    async def request(self, operation, variables):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise Exception("接続が切れました")
+        terms = dict(term.split(":") for term in variables["rawQuery"].split()[1:])
+        selected = [t for t in TWEETS if int(terms["since_time"]) <= t < int(terms["until_time"])]
+        offset = int(variables.get("cursor", "0"))
+        page = selected[offset:offset + 20]
+        entries = [
+            {"content": {"entryType": "TimelineTimelineItem", "itemContent": {"tweet_results": {"result": {
+                "legacy": {
+                    "id_str": str(t),
+                    "created_at": datetime.fromtimestamp(t, timezone.utc).strftime("%a %b %d %H:%M:%S +0000 %Y"),
+                },
+                "core": {"user_results": {"result": {"legacy": {"screen_name": "user", "name": "User"}}}},
+            }}}}}
+            for t in page
+        ]
+        entries.append(_cursor(str(offset + len(page))))
+        return _response(entries)
+
+
+class FakePage:
+    def on(self, event, handler):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self, inject):
+        self.page = FakePage()
+        self._inject = inject
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def inject(self):
+        return self._inject
+
+
+class FakePool:
+    @asynccontextmanager
+    async def lease(self):
+        yield None
+
+
+def _collect(tmp_path, monkeypatch, inject, **kwargs):
+    monkeypatch.setenv("PACING_DEFAULT_LIMIT", "100000")
+    monkeypatch.setattr(tweet_collector, "IN_PAGE_PROJECTION", False)
+    monkeypatch.setattr(tweet_collector, "STREAMING", False)
+    monkeypatch.setattr(tweet_collector, "TRACE_ENABLED", False)
+    monkeypatch.setattr(tweet_collector, "browser_pool", FakePool())
+    monkeypatch.setattr(tweet_collector, "TwitterAPIBrowser", lambda **_: FakeBrowser(inject))
+    session = {"cookies": [{"name": "auth_token", "value": "token"}]}
+    collect = tweet_collector.collect_tweets_from_session(
+        session, "#x", "2024-01-01", "2024-01-03", str(tmp_path / "out.jsonl"),
+        output_format="jsonl", **kwargs,
+    )
+    return asyncio.run(asyncio.wait_for(collect, timeout=30))
+
+
+def _ids(tmp_path):
+    return [int(row["Post Link"].rsplit("/", 1)[1]) for row in iter_rows(str(tmp_path / "out.jsonl"), "jsonl")]
+
+
+def test_collects_newest_first_within_limit(tmp_path, monkeypatch):
+    result = _collect(tmp_path, monkeypatch, FakeInject(), limit=50)
+    assert result["tweet_count"] == 50
+    assert result["complete"] and not result["resumable"]
+    assert _ids(tmp_path) == TWEETS[:50]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out.jsonl"]
+
+
+@pytest.mark.parametrize("fail_at", [1, 3, 6])
+def test_resume_from_checkpoint_after_failure(tmp_path, monkeypatch, fail_at):
+    result = _collect(tmp_path, monkeypatch, FakeInject(fail_at), limit=1000)
+    assert result["resumable"] and not result["complete"]
+    assert (tmp_path / "out.jsonl.checkpoint.json").exists()
+
+    result = _collect(tmp_path, monkeypatch, FakeInject(), limit=1000, resume=True)
+    assert result["complete"] and not result["resumable"]
+    assert result["tweet_count"] == len(TWEETS)
+    assert _ids(tmp_path) == TWEETS
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out.jsonl"]
@@ -0,0 +1,38 @@
+"""WorkerRegistry のテスト"""
+import pytest
+
+from services import worker_registry as module
+from services.worker_registry import WorkerRegistry
+
+pytestmark = pytest.mark.skipif(module.fcntl is None, reason="fcntl が必要")
+
+
+def test_counts_live_workers(tmp_path):
+    registry = WorkerRegistry(str(tmp_path))
+    registry.register()
+    assert registry.count() == 1
+
+    # ロックはファイルを開くごとに別のため、同じプロセスの別の登録も他のワーカーとして数える
+    other = WorkerRegistry(str(tmp_path))
+    other.register()
+    try:
+        assert registry.count() == 2
+        assert other.count() == 2
+    finally:
+        other.unregister()
+    assert registry.count() == 1
+
+    registry.unregister()
+    assert list(tmp_path.glob("*.lock")) == []
+
+
+def test_removes_files_of_exited_workers(tmp_path):
+    # ロックが保持されていないファイルは終了したプロセスの残り
+    (tmp_path / "12345-deadbeef.lock").write_text("")
+    registry = WorkerRegistry(str(tmp_path))
+    registry.register()
+    try:
+        assert registry.count() == 1
+        assert len(list(tmp_path.glob("*.lock"))) == 1
+    finally:
+        registry.unregister()
@@ -0,0 +1,90 @@
+() => {
+  // ページ内でカーソルをたどり、ページごとの射影結果を公開バインディングで Python に送るドライバー
+  // Python 側は elonmusk_114514_control で待機時間・再開・停止を指示する
+  const streams = {};
+
+  const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+  const withCursor = (args, cursor) => {
+    const next = { ...args };
+    if (next.params) {
+      const variables = JSON.parse(next.params.variables);
+      if (cursor) variables.cursor = cursor;
+      else delete variables.cursor;
+      next.params = { ...next.params, variables: JSON.stringify(variables) };
+    } else if (next.data) {
+      const variables = { ...next.data.variables };
+      if (cursor) variables.cursor = cursor;
+      else delete variables.cursor;
+      next.data = { ...next.data, variables };
+    }
+    return next;
+  };
+
+  const emit = (id, event) => {
+    // 応答は待たない（Python の処理を待たずに次のページへ進む）
+    globalThis.elonmusk_114514_emit(id, event).catch(() => {});
+  };
+
+  // 待機時間の経過と、エラー後の再開指示を待つ
+  const waitControl = async (stream) => {
+    while (!stream.control.stopped) {
+      if (stream.control.paused) {
+        await new Promise((resolve) => { stream.wake = resolve; });
+        continue;
+      }
+      const delay = stream.control.delay;
+      if (delay > 0) {
+        stream.control.delay = 0;
+        await Promise.race([sleep(delay * 1000), new Promise((resolve) => { stream.wake = resolve; })]);
+        continue;
+      }
+      return;
+    }
+  };
+
+  globalThis.elonmusk_114514_control = (id, control) => {
+    const stream = streams[id];
+    if (!stream) return;
+    Object.assign(stream.control, control);
+    if (stream.wake) {
+      const wake = stream.wake;
+      stream.wake = null;
+      wake();
+    }
+  };
+
+  globalThis.elonmusk_114514_paginate = async ({ id, args, operation, options, cursor }) => {
+    const stream = { control: { delay: 0, paused: false, stopped: false }, wake: null };
+    streams[id] = stream;
+    const project = globalThis.elonmusk_114514_projections[operation];
+    try {
+      while (true) {
+        await waitControl(stream);
+        if (stream.control.stopped) break;
+
+        let res;
+        try {
+          res = await globalThis.elonmusk_114514_request(withCursor(args, cursor));
+        } catch (e) {
+          // Python の判断（バックオフ後の再開または停止）を待ってから同じカーソルで再試行する
+          stream.control.paused = true;
+          emit(id, { type: "error", status: (e && e.status) || null, message: String((e && e.message) || e) });
+          continue;
+        }
+
+        const page = project(res, options || {});
+        if (page.error) {
+          emit(id, { type: "error", parse: true, message: page.error });
+          break;
+        }
+        emit(id, { type: "page", rows: page.rows, cursor: page.cursor, raw_dates: page.raw_dates });
+        if (!page.cursor || page.cursor === cursor) break;
+        cursor = page.cursor;
+      }
+    } finally {
+      delete streams[id];
+      emit(id, { type: "end" });
+    }
+  };
+};
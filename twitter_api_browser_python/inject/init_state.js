@@ -7,6 +7,7 @@
         return undefined;
       },
       set(v) {
+        globalThis.elonmusk_114514_init_state_value = v;
         resolve(v);
         Object.defineProperty(window, "__INITIAL_STATE__", {
           value: v,
@@ -0,0 +1,150 @@
+() => {
+  // timeline_parser.py と同じ規則で、ページ内でレスポンスを必要な値だけに絞り込む
+  const MONTHS = {
+    Jan: "01", Feb: "02", Mar: "03", Apr: "04", May: "05", Jun: "06",
+    Jul: "07", Aug: "08", Sep: "09", Oct: "10", Nov: "11", Dec: "12",
+  };
+
+  // UTC（+0000）の場合だけ組み替える。それ以外は null を返し、Python 側の format_created_at に任せる
+  const formatCreatedAt = (createdAt) => {
+    const parts = createdAt.split(" ");
+    if (parts.length === 6 && parts[4] === "+0000" && parts[1] in MONTHS) {
+      return `${parts[5]}-${MONTHS[parts[1]]}-${parts[2].padStart(2, "0")} ${parts[3]}`;
+    }
+    return null;
+  };
+
+  // Python の int() と同じく、整数として読めない値は null にする（その行は飛ばす）
+  const toInt = (value) => {
+    if (typeof value === "number") return Number.isFinite(value) ? Math.trunc(value) : null;
+    if (typeof value === "boolean") return value ? 1 : 0;
+    if (typeof value === "string" && /^\s*[+-]?\d+(_\d+)*\s*$/.test(value)) {
+      return Number.parseInt(value.replaceAll("_", ""), 10);
+    }
+    return null;
+  };
+
+  const isObject = (value) => value !== null && typeof value === "object" && !Array.isArray(value);
+
+  // Python の真偽値の判定（空の配列・オブジェクトも偽）
+  const isFalsy = (value) =>
+    !value || (Array.isArray(value) && value.length === 0) || (isObject(value) && Object.keys(value).length === 0);
+
+  const userNames = (userResult) => {
+    let userLegacy = userResult.legacy;
+    if (userLegacy == null) {
+      userLegacy = isObject(userResult.user) ? userResult.user.legacy : null;
+    }
+    if (!isObject(userLegacy)) return null;
+    const core = isObject(userResult.core) ? userResult.core : {};
+    const screenName = userLegacy.screen_name || core.screen_name || userResult.screen_name || "Unknown";
+    const authorName = userLegacy.name || core.name || userResult.name || "Unknown";
+    return [screenName, authorName];
+  };
+
+  const tweetRow = (itemResult, searchTagClean) => {
+    if (!isObject(itemResult) || Object.keys(itemResult).length === 0) return null;
+    if ("tweet" in itemResult) itemResult = itemResult.tweet;
+    if (!isObject(itemResult)) return null;
+    const legacy = itemResult.legacy;
+    if (!isObject(legacy)) return null;
+    const userResults = isObject(itemResult.core) ? itemResult.core.user_results : null;
+    const userResult = isObject(userResults) ? userResults.result : null;
+    if (!isObject(userResult)) return null;
+    const names = userNames(userResult);
+    if (names === null) return null;
+    if (legacy.id_str == null || typeof legacy.created_at !== "string") return null;
+
+    let impressionCount = 0;
+    const views = itemResult.views;
+    if (!isFalsy(views)) {
+      if (!isObject(views)) return null;
+      if ("count" in views) {
+        impressionCount = toInt(views.count);
+        if (impressionCount === null) return null;
+      }
+    }
+
+    const entities = isFalsy(legacy.entities) ? {} : legacy.entities;
+    if (!isObject(entities)) return null;
+    const hashtags = isFalsy(entities.hashtags) ? [] : entities.hashtags;
+    if (!Array.isArray(hashtags)) return null;
+    const otherTags = [];
+    for (const tag of hashtags) {
+      if (!isObject(tag) || typeof tag.text !== "string") return null;
+      if (tag.text.toLowerCase() !== searchTagClean) otherTags.push(`#${tag.text}`);
+    }
+
+    const postDate = formatCreatedAt(legacy.created_at);
+    return {
+      "Author Name": names[1],
+      "Post Date": postDate ?? legacy.created_at,
+      "Post Link": `https://x.com/${names[0]}/status/${legacy.id_str}`,
+      "Other Hashtags": otherTags.join(", "),
+      // dict.get(key, 0) と同じく、null はそのまま残す
+      "Repost Count": "retweet_count" in legacy ? legacy.retweet_count : 0,
+      "Impression Count": impressionCount,
+      "Like Count": "favorite_count" in legacy ? legacy.favorite_count : 0,
+      rawDate: postDate === null,
+    };
+  };
+
+  const searchTimeline = (res, options) => {
+    let timeline = res;
+    for (const key of ["data", "search_by_raw_query", "search_timeline", "timeline", "instructions"]) {
+      if (!timeline || !(key in timeline)) return { error: key };
+      timeline = timeline[key];
+    }
+
+    const searchTagClean = (options.keyword || "").replaceAll("#", "").toLowerCase();
+    const rows = [];
+    // Post Date を組み替えられなかった行の番号
+    const rawDates = [];
+    let bottomCursor = null;
+    let showMoreCursor = null;
+    let replacedShowMore = null;
+    let entriesTaken = false;
+
+    for (const instruction of timeline) {
+      if (instruction.type === "TimelineAddEntries") {
+        const take = !entriesTaken;
+        entriesTaken = true;
+        for (const entry of instruction.entries || []) {
+          const content = entry.content;
+          if (!content) continue;
+          if (content.entryType === "TimelineTimelineCursor") {
+            if (content.cursorType === "Bottom") bottomCursor = content.value;
+            else if (content.cursorType === "ShowMore" && take) showMoreCursor = content.value;
+          } else if (take && content.entryType === "TimelineTimelineItem") {
+            const itemContent = content.itemContent || {};
+            const row = tweetRow((itemContent.tweet_results || {}).result, searchTagClean);
+            if (row !== null) {
+              if (row.rawDate) rawDates.push(rows.length);
+              delete row.rawDate;
+              rows.push(row);
+            }
+          }
+        }
+      } else if (instruction.type === "TimelineReplaceEntry") {
+        const entry = instruction.entry || {};
+        const content = entry.content || {};
+        if (content.entryType === "TimelineTimelineCursor") {
+          if (content.cursorType === "Bottom") bottomCursor = content.value;
+          else if (content.cursorType === "ShowMore" && entry.entryIdToReplace === "cursor-bottom-0") {
+            replacedShowMore = content.value;
+          }
+        }
+      }
+    }
+
+    if (!entriesTaken) showMoreCursor = replacedShowMore;
+    return { rows, cursor: bottomCursor || showMoreCursor, raw_dates: rawDates };
+  };
+
+  globalThis.elonmusk_114514_projections = { SearchTimeline: searchTimeline };
+  globalThis.elonmusk_114514_request_projected = (query, name, options) => {
+    return globalThis.elonmusk_114514_request(query).then((res) =>
+      globalThis.elonmusk_114514_projections[name](res, options || {})
+    );
+  };
+};
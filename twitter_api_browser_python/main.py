@@ -1,20 +1,161 @@
 import asyncio
+import hashlib
+import itertools
 import json
+import logging
 import os
+import time
 from pathlib import Path
-from typing import TypeVar, Optional, Dict, Any
+from typing import TypeVar, Optional, Dict, Any, Iterable, List, Tuple
+from urllib.parse import urlsplit
 
 from aiofiles import open
-from playwright.async_api import Page, async_playwright, BrowserContext
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from playwright.async_api import Browser, Page, Route, async_playwright, BrowserContext
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+try:
+    from .timeline_parser import format_created_at
+    from .tracing import span
+except ImportError:
+    # スクリプトとして直接実行した場合
+    from timeline_parser import format_created_at
+    from tracing import span
 
 T = TypeVar("T")
 
+logger = logging.getLogger(__name__)
+
+# X のWebアプリのURL（オフライン検証用のリプレイサーバーに向ける場合に変更する）
+BASE_URL = os.environ.get("X_BASE_URL", "https://x.com").rstrip("/")
+
+# ブラウザのプロファイル
+#   full: 通常のブラウザと同じく画面の表示に必要なリソースをすべて読み込む
+#   lean: GraphQLクライアントの取得に不要な画像・動画・フォント・外部ドメインへのリクエストを止める
+BROWSER_PROFILES = ("full", "lean")
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "full")
+
+# Chromium起動時の共通引数
+DEFAULT_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+]
+
+# lean プロファイルで追加する起動引数（画像のデコード・バックグラウンド通信・ディスクキャッシュを止める）
+LEAN_LAUNCH_ARGS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disk-cache-size=1",
+    "--mute-audio",
+]
+
+# lean プロファイルで止めるリソースの種類
+LEAN_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "texttrack", "manifest"})
+
+# lean プロファイルで読み込むドメイン（アプリ本体とJSバンドルの配信元。BASE_URL のホストも含む）
+FIRST_PARTY_DOMAINS = ("x.com", "twitter.com", "twimg.com")
+
+# lean プロファイルの画面サイズ（ページのレイアウトと描画のコストを抑える）
+LEAN_VIEWPORT = {"width": 800, "height": 600}
+
+# injectスクリプトの内容はプロセス内でキャッシュする（ファイルは実行中に変わらない）
+_script_cache: Dict[str, str] = {}
+
+# ブートストラップ完了の判定: リクエスト関数・初期状態・必要なオペレーションが揃ったか
+BOOTSTRAP_READY_PREDICATE = """(required) => {
+  const ops = globalThis.elonmusk_114514_operation;
+  if (!globalThis.elonmusk_114514_init_state_value || !Array.isArray(ops)) return false;
+  const names = new Set(ops.map((x) => x.operationName));
+  return required.every((name) => names.has(name));
+}"""
+
+
+# 生のJSON文字列で受け取るリクエスト（ページ内でシリアライズし、Python側で一度にパースする）
+RAW_REQUEST_FUNCTION = "(args) => globalThis.elonmusk_114514_request(args).then((res) => JSON.stringify(res))"
+
+# ページ内で射影した結果だけを受け取るリクエスト（projection.js）
+PROJECTED_REQUEST_FUNCTION = (
+    "({ args, operation, options }) => globalThis.elonmusk_114514_request_projected(args, operation, options)"
+)
+
+# 生のJSON文字列で受け取るオペレーション（カンマ区切り）
+RAW_JSON_OPERATIONS = frozenset(
+    name.strip() for name in os.environ.get("INJECT_RAW_JSON_OPERATIONS", "").split(",") if name.strip()
+)
+
+
+def loads_json(text: str) -> Any:
+    """orjson があれば使ってJSON文字列をパースする"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
 
 async def load_script(path: str) -> str:
+    if path in _script_cache:
+        return _script_cache[path]
     # このファイルの場所を基準にinjectディレクトリのパスを取得
     script_dir = Path(__file__).parent / "inject"
     async with open(script_dir / path, "r", encoding="utf-8") as f:
-        return await f.read()
+        script = await f.read()
+    _script_cache[path] = script
+    return script
+
+
+class BootstrapCache:
+    """セッションごとのオペレーション一覧と初期状態のキャッシュ（TTL付き）"""
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, list, dict]] = {}
+
+    def get(self, key: str) -> Optional[Tuple[list, dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, operation_list, init_state = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        return operation_list, init_state
+
+    def put(self, key: str, operation_list: list, init_state: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, operation_list, init_state)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+
+bootstrap_cache = BootstrapCache(ttl=float(os.environ.get("INJECT_BOOTSTRAP_TTL", "600")))
+
+
+def session_cache_key(session_json: Dict[str, Any]) -> str:
+    """セッションのクッキーからキャッシュキーを生成（認証トークンそのものは保持しない）"""
+    cookies = session_json.get("cookies") or []
+    auth = [c.get("value", "") for c in cookies if c.get("name") in ("auth_token", "twid")]
+    if not auth:
+        auth = sorted(f"{c.get('name')}={c.get('value')}" for c in cookies)
+    return hashlib.sha256("\n".join(auth).encode("utf-8")).hexdigest()
+
+
+def launch_args(profile: str) -> List[str]:
+    """プロファイルに応じたChromiumの起動引数"""
+    if profile == "lean":
+        return DEFAULT_LAUNCH_ARGS + LEAN_LAUNCH_ARGS
+    return list(DEFAULT_LAUNCH_ARGS)
+
+
+def is_first_party(url: str) -> bool:
+    """X のアプリ本体・JSバンドルの配信元へのリクエストか"""
+    host = urlsplit(url).hostname or ""
+    if host == urlsplit(BASE_URL).hostname:
+        return True
+    return any(host == domain or host.endswith("." + domain) for domain in FIRST_PARTY_DOMAINS)
 
 
 def one(data: list[T], name: str = "item") -> T:
@@ -26,58 +167,115 @@ def one(data: list[T], name: str = "item") -> T:
 
 
 class TwitterAPIBrowser:
-    def __init__(self, user_data_dir: str = "./.data", session_json: Optional[Dict[str, Any]] = None, headless: bool = True):
+    def __init__(
+        self,
+        user_data_dir: str = "./.data",
+        session_json: Optional[Dict[str, Any]] = None,
+        headless: bool = True,
+        browser: Optional[Browser] = None,
+        profile: Optional[str] = None,
+    ):
         self.user_data_dir = user_data_dir
         self.session_json = session_json
         self.headless = headless
+        # 起動済みのブラウザ（ブラウザプールから借りたもの）。指定時はコンテキストのみ作成・破棄する
+        self.shared_browser = browser
+        if browser is not None and not session_json:
+            raise ValueError("共有ブラウザを使う場合はsession_jsonが必要です")
+        # プロファイル（省略時は環境変数 BROWSER_PROFILE）
+        self.profile = profile or BROWSER_PROFILE
+        if self.profile not in BROWSER_PROFILES:
+            raise ValueError(f"不明なプロファイルです: {self.profile}")
+        # lean プロファイルで止めたリクエストの数
+        self.blocked_requests = 0
+
+    def _context_options(self) -> Dict[str, Any]:
+        if self.profile == "lean":
+            # Service Worker はアプリ本体を事前キャッシュするため、ジョブごとの使い捨てのコンテキストでは止める
+            # （route を設定したコンテキストではHTTPキャッシュも使われない）
+            return {"viewport": LEAN_VIEWPORT, "service_workers": "block"}
+        return {"viewport": None}
+
+    async def _apply_profile(self, context: BrowserContext):
+        if self.profile == "lean":
+            await context.route("**/*", self._lean_route)
+
+    async def _lean_route(self, route: Route):
+        request = route.request
+        if request.resource_type in LEAN_BLOCKED_RESOURCE_TYPES or not is_first_party(request.url):
+            self.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
 
     async def __aenter__(self):
+        if self.shared_browser is not None:
+            self.playwright_manager = None
+            self.browser = self.shared_browser
+            await self._new_context()
+            await self._restore_session()
+            return self
+
         self.playwright_manager = async_playwright()
         self.playwright = await self.playwright_manager.__aenter__()
         
         if self.session_json:
             # セッションJSONから復元する場合
-            self.browser = await self.playwright.chromium.launch(
-                headless=self.headless,
-                args=[
-                    "--disable-blink-features=AutomationControlled",
-                ],
-            )
-            context = await self.browser.new_context(
-                viewport=None,
-            )
-            self.page = await context.new_page()
-            
-            # クッキーを復元
-            if "cookies" in self.session_json:
-                await context.add_cookies(self.session_json["cookies"])
-            
-            # ローカルストレージとセッションストレージを復元
-            await self.page.goto("https://x.com/home")
-            if "localStorage" in self.session_json and self.session_json["localStorage"]:
-                # localStorageを一度に設定
-                await self.page.evaluate(
-                    f"Object.entries({json.dumps(self.session_json['localStorage'])}).forEach(([k, v]) => localStorage.setItem(k, v))"
-                )
-            if "sessionStorage" in self.session_json and self.session_json["sessionStorage"]:
-                # sessionStorageを一度に設定
-                await self.page.evaluate(
-                    f"Object.entries({json.dumps(self.session_json['sessionStorage'])}).forEach(([k, v]) => sessionStorage.setItem(k, v))"
+            with span("browser.launch", "browser", profile=self.profile):
+                self.browser = await self.playwright.chromium.launch(
+                    headless=self.headless,
+                    args=launch_args(self.profile),
                 )
+            await self._new_context()
+            await self._restore_session()
         else:
             # 従来の方法（user_data_dirを使用）
-            self.browser = await self.playwright.chromium.launch_persistent_context(
-                headless=self.headless,
-                user_data_dir=self.user_data_dir,
-                viewport=None,
-                args=[
-                    "--disable-blink-features=AutomationControlled",
-                ],
-            )
-            self.page = await self.browser.new_page()
+            with span("browser.launch", "browser", profile=self.profile, persistent=True):
+                self.browser = await self.playwright.chromium.launch_persistent_context(
+                    headless=self.headless,
+                    user_data_dir=self.user_data_dir,
+                    args=launch_args(self.profile),
+                    **self._context_options(),
+                )
+                await self._apply_profile(self.browser)
+                self.page = await self.browser.new_page()
         return self
 
+    async def _new_context(self):
+        with span("browser.new_context", "browser", profile=self.profile):
+            self.context = await self.browser.new_context(**self._context_options())
+            await self._apply_profile(self.context)
+            self.page = await self.context.new_page()
+
+    async def _restore_session(self):
+        with span("session.restore", "browser"):
+            await self._restore_session_state()
+
+    async def _restore_session_state(self):
+        # クッキーを復元
+        if "cookies" in self.session_json:
+            await self.context.add_cookies(self.session_json["cookies"])
+        
+        # ローカルストレージとセッションストレージを復元
+        await self.page.goto(f"{BASE_URL}/home")
+        if "localStorage" in self.session_json and self.session_json["localStorage"]:
+            # localStorageを一度に設定
+            await self.page.evaluate(
+                f"Object.entries({json.dumps(self.session_json['localStorage'])}).forEach(([k, v]) => localStorage.setItem(k, v))"
+            )
+        if "sessionStorage" in self.session_json and self.session_json["sessionStorage"]:
+            # sessionStorageを一度に設定
+            await self.page.evaluate(
+                f"Object.entries({json.dumps(self.session_json['sessionStorage'])}).forEach(([k, v]) => sessionStorage.setItem(k, v))"
+            )
+
     async def __aexit__(self, exc_type, exc, tb):
+        if self.profile == "lean":
+            logger.debug("Lean profile blocked %d requests", self.blocked_requests)
+        if self.shared_browser is not None:
+            # 共有ブラウザの場合はジョブ用のコンテキストだけを閉じる
+            await self.context.close()
+            return
         if self.session_json:
             # 通常のブラウザコンテキストの場合
             await self.browser.close()
@@ -87,32 +285,282 @@ class TwitterAPIBrowser:
         await self.playwright_manager.__aexit__(exc_type, exc, tb)
 
     async def login(self):
-        await self.page.goto("https://x.com/login")
-        await self.page.wait_for_url("https://x.com/home", timeout=0)
+        await self.page.goto(f"{BASE_URL}/login")
+        await self.page.wait_for_url(f"{BASE_URL}/home", timeout=0)
+
+    def _bootstrap_key(self) -> str:
+        if self.session_json:
+            return "session:" + session_cache_key(self.session_json)
+        return "user_data_dir:" + os.path.abspath(self.user_data_dir)
+
+    async def inject(
+        self,
+        timeout: float = 15.0,
+        required_operations: Tuple[str, ...] = ("SearchTimeline",),
+        raw_json_operations: Optional[Iterable[str]] = None,
+    ):
+        """
+        リクエスト用のクライアントを取得し、TwitterAPIRequestを返す
 
-    async def inject(self, sleep: int = 5):
+        固定時間待つのではなく、必要なグローバル変数が揃った時点で完了する。
+        同じセッションの2回目以降はキャッシュ済みのオペレーション一覧と初期状態を使い、
+        オペレーション収集用のフックを仕掛けずに済ませる。
+        raw_json_operations に指定したオペレーションはレスポンスを生のJSON文字列で受け取る
+        （省略時は環境変数 INJECT_RAW_JSON_OPERATIONS）。
+        """
+        key = self._bootstrap_key()
+        cached = bootstrap_cache.get(key)
+        with span("inject", "browser", cached=cached is not None):
+            return await self._inject(key, cached, timeout, required_operations, raw_json_operations)
+
+    def _on_home(self) -> bool:
+        current = urlsplit(self.page.url)
+        base = urlsplit(BASE_URL)
+        return (current.scheme, current.netloc) == (base.scheme, base.netloc) and current.path.rstrip("/") == "/home"
+
+    async def _inject(
+        self,
+        key: str,
+        cached: Optional[Tuple[list, dict]],
+        timeout: float,
+        required_operations: Tuple[str, ...],
+        raw_json_operations: Optional[Iterable[str]],
+    ):
         inject_setup_script = await load_script("setup.js")
-        inject_operation_script = await load_script("operation.js")
-        inject_init_state_script = await load_script("init_state.js")
-        await self.page.add_init_script(inject_operation_script)
-        await self.page.add_init_script(inject_init_state_script)
-        await self.page.goto("https://x.com/home")
-        await self.page.evaluate(inject_setup_script)
-        await asyncio.sleep(sleep)
+        if cached is None:
+            inject_operation_script = await load_script("operation.js")
+            inject_init_state_script = await load_script("init_state.js")
+            await self.page.add_init_script(inject_operation_script)
+            await self.page.add_init_script(inject_init_state_script)
+        # キャッシュがあればフックは不要なので、セッション復元で開いた /home をそのまま使う
+        if cached is None or not self._on_home():
+            with span("inject.goto_home", "browser"):
+                await self.page.goto(f"{BASE_URL}/home")
+        with span("inject.scripts", "browser"):
+            await self.page.evaluate(inject_setup_script)
+            await self.page.evaluate(await load_script("projection.js"))
+            await self.page.evaluate(await load_script("driver.js"))
+
+        if cached is not None:
+            operation_list, init_state = cached
+            return TwitterAPIRequest(operation_list, init_state, self.page, raw_json_operations)
+
+        complete = True
+        try:
+            with span("inject.wait_bootstrap", "browser"):
+                await self.page.wait_for_function(
+                    BOOTSTRAP_READY_PREDICATE,
+                    arg=list(required_operations),
+                    timeout=timeout * 1000,
+                )
+        except PlaywrightTimeoutError:
+            # 見つかった分だけで続行する（キャッシュはしない）
+            complete = False
+            logger.warning("Bootstrap timed out waiting for operations: %s", ", ".join(required_operations))
         operation_list = await self.page.evaluate(
             "globalThis.elonmusk_114514_operation"
         )
         init_state = await self.page.evaluate("globalThis.elonmusk_114514_init_state")
-        return TwitterAPIRequest(operation_list, init_state, self.page)
+        if complete:
+            bootstrap_cache.put(key, operation_list, init_state)
+        return TwitterAPIRequest(operation_list, init_state, self.page, raw_json_operations)
+
+
+METHOD_MAP = {
+    "query": "GET",
+    "mutation": "POST",
+}
+
+
+class CompiledOperation:
+    """リクエストごとに変わらない部分を事前に組み立てたオペレーション"""
+
+    __slots__ = ("name", "query_id", "method", "path", "features", "features_json", "allow_field_toggles")
+
+    def __init__(self, exp: dict, flag: dict):
+        self.name: str = exp["operationName"]
+        self.query_id: str = exp["queryId"]
+        self.method: str = METHOD_MAP[exp["operationType"]]
+        self.path = f"/graphql/{self.query_id}/{self.name}"
+        featureSwitches = set(exp["metadata"]["featureSwitches"])
+        self.features: dict = {
+            k: v["value"] for k, v in flag.items() if k in featureSwitches
+        }
+        # GETのクエリパラメータ用にシリアライズ済みの文字列も保持する
+        self.features_json = json.dumps(self.features)
+        self.allow_field_toggles = frozenset(exp["metadata"]["fieldToggles"])
+
+    def build_args(self, variables: dict, fieldToggles: dict[str, bool]) -> dict:
+        fieldToggles = {k: v for k, v in fieldToggles.items() if k in self.allow_field_toggles}
+        args = {
+            "headers": {"content-type": "application/json"},
+            "method": self.method,
+            "path": self.path,
+        }
+        if self.method == "GET":
+            params = {
+                "variables": json.dumps(variables),
+                "queryId": json.dumps(self.query_id),
+            }
+            if self.features:
+                params["features"] = self.features_json
+            if fieldToggles:
+                params["fieldToggles"] = json.dumps(fieldToggles)
+            args["params"] = params
+        else:
+            data = {
+                "variables": variables,
+                "queryId": self.query_id,
+            }
+            if self.features:
+                data["features"] = self.features
+            if fieldToggles:
+                data["fieldToggles"] = fieldToggles
+            args["data"] = data
+        return args
+
+
+def compile_operations(operation_list: list[dict], init_state: dict) -> dict[str, Optional[CompiledOperation]]:
+    """
+    operationName をキーにしたオペレーション表を作成
+
+    同名のオペレーションが複数ある場合は None を登録し、リクエスト時にエラーにする。
+    METHOD_MAP に無い種類（subscription など）は登録しない（リクエストした場合だけエラーになる）。
+    """
+    flag = {
+        **init_state["featureSwitch"]["defaultConfig"],
+        **init_state["featureSwitch"]["user"],
+        **init_state["featureSwitch"]["debug"],
+        **init_state["featureSwitch"]["customOverrides"],
+    }
+    registry: dict[str, Optional[CompiledOperation]] = {}
+    seen: set[str] = set()
+    for exp in operation_list:
+        name = exp["operationName"]
+        if name in seen:
+            registry[name] = None
+            continue
+        seen.add(name)
+        if exp["operationType"] in METHOD_MAP:
+            registry[name] = CompiledOperation(exp, flag)
+    return registry
+
+
+def _format_raw_dates(page: dict) -> dict:
+    """ページ内で組み替えなかった（UTC以外の）投稿日時を format_created_at で変換する"""
+    for index in page.pop("raw_dates", None) or ():
+        row = page["rows"][index]
+        row["Post Date"] = format_created_at(row["Post Date"])
+    return page
+
+
+class PageStream:
+    """
+    ページ内のドライバー（driver.js）から届くページごとの結果を順に受け取るストリーム
+
+    イベントは {"type": "page", "rows", "cursor"} または {"type": "error", "message", "status"} で、
+    ドライバーの終了でイテレーションが終わる。エラーの後、ドライバーは resume() か close() を待つ。
+    timeout はリクエスト1回分の待ち時間で、pace() / resume() で待たせた秒数はこれに加える。
+    """
+
+    def __init__(self, request: "TwitterAPIRequest", stream_id: int, timeout: Optional[float] = None):
+        self.request = request
+        self.stream_id = stream_id
+        self.timeout = timeout
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+        # 前のイベント以降に指示した待機秒数と、その前に指示した分
+        # （ドライバーが次のリクエストを送信済みなら、待機はさらに次のリクエストの前になる）
+        self._delay = 0.0
+        self._carried_delay = 0.0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if self.closed:
+            raise StopAsyncIteration
+        timeout = None if self.timeout is None else self.timeout + self._delay + self._carried_delay
+        event = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        self._carried_delay, self._delay = self._delay, 0.0
+        if event["type"] == "end":
+            self.closed = True
+            self.request._streams.pop(self.stream_id, None)
+            raise StopAsyncIteration
+        if event["type"] == "page":
+            _format_raw_dates(event)
+        return event
+
+    async def _control(self, **control):
+        await self.request.page.evaluate(
+            "({ id, control }) => globalThis.elonmusk_114514_control(id, control)",
+            {"id": self.stream_id, "control": control},
+        )
+
+    async def pace(self, delay: float):
+        """次のリクエストの前に delay 秒待たせる"""
+        self._delay += delay
+        await self._control(delay=delay)
+
+    async def resume(self, delay: float = 0.0):
+        """エラーで止まっているドライバーを delay 秒後に再開させる"""
+        self._delay += delay
+        await self._control(paused=False, delay=delay)
+
+    async def close(self):
+        """ドライバーを停止する（実行中のリクエストの結果は捨てる）"""
+        if self.closed:
+            return
+        self.closed = True
+        self.request._streams.pop(self.stream_id, None)
+        try:
+            await self._control(stopped=True)
+        except Exception:
+            # ページが既に閉じている
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
 
 class TwitterAPIRequest:
-    def __init__(self, operation_list: list[dict], init_state: str, page: Page):
+    def __init__(
+        self,
+        operation_list: list[dict],
+        init_state: dict,
+        page: Page,
+        raw_json_operations: Optional[Iterable[str]] = None,
+    ):
         self.operation_list = operation_list
         self.init_state = init_state
         self.page = page
+        self.operations = compile_operations(operation_list, init_state)
+        # レスポンスを生のJSON文字列で受け取るオペレーション
+        # （大きなレスポンスをCDP上で値ごとにシリアライズせず、1つの文字列として転送する）
+        self.raw_json_operations = set(RAW_JSON_OPERATIONS if raw_json_operations is None else raw_json_operations)
+        self._streams: Dict[int, PageStream] = {}
+        self._stream_ids = itertools.count(1)
+        self._binding_ready = False
+
+    def get_operation(self, operation: str) -> CompiledOperation:
+        if operation not in self.operations:
+            raise ValueError("No operation found")
+        compiled = self.operations[operation]
+        if compiled is None:
+            raise ValueError("Multiple operation found")
+        return compiled
+
+    async def _evaluate_request(self, args: dict, raw: bool):
+        if raw:
+            text = await self.page.evaluate(RAW_REQUEST_FUNCTION, args)
+            with span("graphql.decode", "request", bytes=len(text)):
+                return loads_json(text)
+        return await self.page.evaluate("globalThis.elonmusk_114514_request", args)
 
-    async def graphql(self, method: str, body: dict, path: str):
+    async def graphql(self, method: str, body: dict, path: str, raw: bool = False):
         args = {
             "headers": {"content-type": "application/json"},
             "method": method,
@@ -124,7 +572,7 @@ class TwitterAPIRequest:
         elif method == "POST":
             args.update({"data": body})
 
-        res = await self.page.evaluate("globalThis.elonmusk_114514_request", args)
+        res = await self._evaluate_request(args, raw)
         return res
 
     async def request(
@@ -133,41 +581,68 @@ class TwitterAPIRequest:
         variables: dict,
         fieldToggles: dict[str, bool] = {},
     ):
-        method_map = {
-            "query": "GET",
-            "mutation": "POST",
-        }
-        exp = one(
-            [x for x in self.operation_list if x["operationName"] == operation],
-            name="operation",
-        )
-        queryId: str = exp["queryId"]
-        operationType: str = exp["operationType"]
-        featureSwitches: list[str] = exp["metadata"]["featureSwitches"]
-        allowFieldToggles: list[str] = exp["metadata"]["fieldToggles"]
-        fieldToggles = {k: v for k, v in fieldToggles.items() if k in allowFieldToggles}
-
-        method = method_map[operationType]
-        flag = {
-            **self.init_state["featureSwitch"]["defaultConfig"],
-            **self.init_state["featureSwitch"]["user"],
-            **self.init_state["featureSwitch"]["debug"],
-            **self.init_state["featureSwitch"]["customOverrides"],
-        }
-        featureSwitchesMap = {
-            k: v["value"] for k, v in flag.items() if k in featureSwitches
-        }
-        body = {
-            "variables": variables,
-            "queryId": queryId,
-        }
-        if featureSwitchesMap:
-            body.update({"features": featureSwitchesMap})
-        if fieldToggles:
-            body.update({"fieldToggles": fieldToggles})
-
-        return await self.graphql(
-            method=method,
-            body=body,
-            path=f"/graphql/{queryId}/{operation}",
+        with span("graphql.request", "request", operation=operation):
+            args = self.get_operation(operation).build_args(variables, fieldToggles)
+            return await self._evaluate_request(args, operation in self.raw_json_operations)
+
+    async def request_projected(
+        self,
+        operation: str,
+        variables: dict,
+        options: Optional[dict] = None,
+        fieldToggles: dict[str, bool] = {},
+    ) -> dict:
+        """
+        レスポンスをページ内で必要な値だけに絞り込んでから受け取る
+
+        SearchTimeline の場合は options に {"keyword": 検索ワード} を渡し、
+        timeline_parser.parse_search_timeline と同じ {"rows": ツイート行, "cursor": ボトムカーソル} を受け取る。
+
+        Raises:
+            KeyError: レスポンスの構造が想定と異なる場合
+        """
+        with span("graphql.request", "request", operation=operation, projected=True):
+            args = self.get_operation(operation).build_args(variables, fieldToggles)
+            result = await self.page.evaluate(
+                PROJECTED_REQUEST_FUNCTION,
+                {"args": args, "operation": operation, "options": options or {}},
+            )
+        if "error" in result:
+            raise KeyError(result["error"])
+        return _format_raw_dates(result)
+
+    def _on_stream_event(self, source, stream_id: int, event: dict):
+        stream = self._streams.get(stream_id)
+        if stream is not None:
+            stream.queue.put_nowait(event)
+
+    async def paginate(
+        self,
+        operation: str,
+        variables: dict,
+        options: Optional[dict] = None,
+        cursor: Optional[str] = None,
+        fieldToggles: dict[str, bool] = {},
+        timeout: Optional[float] = None,
+    ) -> PageStream:
+        """
+        ページ内のドライバーでカーソルをたどり、ページごとの射影結果をストリームで受け取る
+
+        Python とページの往復を待たずに次のページを取得するため、件数の上限や中止は
+        受け取った側で判断して PageStream.close() を呼ぶ。
+
+        Args:
+            timeout: 次のイベントを待つ秒数（超えると asyncio.TimeoutError）
+        """
+        args = self.get_operation(operation).build_args(variables, fieldToggles)
+        if not self._binding_ready:
+            await self.page.expose_binding("elonmusk_114514_emit", self._on_stream_event)
+            self._binding_ready = True
+        stream = PageStream(self, next(self._stream_ids), timeout)
+        self._streams[stream.stream_id] = stream
+        # ドライバーの完了は待たない
+        await self.page.evaluate(
+            "(opts) => { globalThis.elonmusk_114514_paginate(opts); }",
+            {"id": stream.stream_id, "args": args, "operation": operation, "options": options or {}, "cursor": cursor},
         )
+        return stream
@@ -0,0 +1,204 @@
+"""
+SearchTimeline のレスポンス解析
+CLI（collect_tweets.py）とバックエンドの両方から使う共通のパーサー
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# レスポンス内の固定のキーパス
+TIMELINE_PATH = ("data", "search_by_raw_query", "search_timeline", "timeline")
+TWEET_RESULT_PATH = ("itemContent", "tweet_results", "result")
+USER_RESULT_PATH = ("core", "user_results", "result")
+
+_MONTHS = {
+    "Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04", "May": "05", "Jun": "06",
+    "Jul": "07", "Aug": "08", "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12",
+}
+
+
+def _get(obj: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def format_created_at(created_at: str) -> str:
+    """
+    "Wed Oct 10 20:19:24 +0000 2018" を "2018-10-10 20:19:24" に変換
+
+    UTC（+0000）の場合は文字列の組み替えだけで済ませ、それ以外は strptime で解釈する。
+    解釈できない場合は元の文字列を返す。
+    """
+    parts = created_at.split(" ")
+    if len(parts) == 6 and parts[4] == "+0000" and parts[1] in _MONTHS:
+        return f"{parts[5]}-{_MONTHS[parts[1]]}-{parts[2].zfill(2)} {parts[3]}"
+    try:
+        dt = datetime.strptime(created_at, "%a %b %d %H:%M:%S %z %Y")
+        return dt.strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return created_at
+
+
+def _user_names(user_result: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(screen_name, name) を返す。ユーザー情報が無い場合は None"""
+    user_legacy = user_result.get("legacy")
+    if user_legacy is None:
+        user_legacy = _get(user_result, ("user", "legacy"))
+    if not isinstance(user_legacy, dict):
+        return None
+
+    screen_name = user_legacy.get("screen_name")
+    author_name = user_legacy.get("name")
+    # 新しいレスポンスでは core に、古いものではトップレベルに入っていることがある
+    user_core = user_result.get("core")
+    if isinstance(user_core, dict):
+        screen_name = screen_name or user_core.get("screen_name")
+        author_name = author_name or user_core.get("name")
+    screen_name = screen_name or user_result.get("screen_name") or "Unknown"
+    author_name = author_name or user_result.get("name") or "Unknown"
+    return screen_name, author_name
+
+
+def parse_tweet(item_result: Optional[Dict[str, Any]], search_tag_clean: str) -> Optional[Dict[str, Any]]:
+    """
+    tweet_results.result から1行分のデータを作成
+
+    リツイートの削除などでデータが欠けている場合や、値の形式が想定と異なる場合は None を返す。
+    """
+    if not item_result or not isinstance(item_result, dict):
+        return None
+    if "tweet" in item_result:
+        item_result = item_result["tweet"]
+        if not isinstance(item_result, dict):
+            return None
+
+    legacy = item_result.get("legacy")
+    if not isinstance(legacy, dict):
+        return None
+    user_result = _get(item_result, USER_RESULT_PATH)
+    if not isinstance(user_result, dict):
+        return None
+    names = _user_names(user_result)
+    if names is None:
+        return None
+    screen_name, author_name = names
+
+    tweet_id = legacy.get("id_str")
+    created_at = legacy.get("created_at")
+    if tweet_id is None or not isinstance(created_at, str):
+        return None
+
+    impression_count = 0
+    views = item_result.get("views")
+    if views:
+        if not isinstance(views, dict):
+            return None
+        if "count" in views:
+            impression_count = int(views["count"])
+
+    entities = legacy.get("entities") or {}
+    if not isinstance(entities, dict):
+        return None
+    hashtags = entities.get("hashtags") or []
+    if not isinstance(hashtags, list):
+        return None
+    other_tags = [f"#{tag['text']}" for tag in hashtags if tag["text"].lower() != search_tag_clean]
+
+    return {
+        "Author Name": author_name,
+        "Post Date": format_created_at(created_at),
+        "Post Link": f"https://x.com/{screen_name}/status/{tweet_id}",
+        "Other Hashtags": ", ".join(other_tags),
+        "Repost Count": legacy.get("retweet_count", 0),
+        "Impression Count": impression_count,
+        "Like Count": legacy.get("favorite_count", 0),
+    }
+
+
+def _scan(res: Dict[str, Any], search_tag_clean: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """instructions を1回走査する（search_tag_clean が None の場合はツイートを読まずカーソルだけを探す）"""
+    instructions = res
+    for key in TIMELINE_PATH:
+        instructions = instructions[key]
+    instructions = instructions["instructions"]
+
+    tweets: List[Dict[str, Any]] = []
+    bottom_cursor: Optional[str] = None
+    show_more_cursor: Optional[str] = None
+    replaced_show_more: Optional[str] = None
+    entries_taken = False
+    with_rows = search_tag_clean is not None
+
+    for instruction in instructions:
+        kind = instruction.get("type")
+        if kind == "TimelineAddEntries":
+            take = not entries_taken
+            entries_taken = True
+            for entry in instruction.get("entries", ()):
+                content = entry.get("content")
+                if not content:
+                    continue
+                entry_type = content.get("entryType")
+                if entry_type == "TimelineTimelineCursor":
+                    cursor_type = content.get("cursorType")
+                    if cursor_type == "Bottom":
+                        bottom_cursor = content["value"]
+                    elif cursor_type == "ShowMore" and take:
+                        show_more_cursor = content["value"]
+                elif take and with_rows and entry_type == "TimelineTimelineItem":
+                    try:
+                        row = parse_tweet(_get(content, TWEET_RESULT_PATH), search_tag_clean)
+                    except (AttributeError, KeyError, TypeError, ValueError):
+                        # ハッシュタグや数値が不正な形式など（projection.js と同じく、その行だけを飛ばす）
+                        continue
+                    if row is not None:
+                        tweets.append(row)
+        elif kind == "TimelineReplaceEntry":
+            entry = instruction.get("entry") or {}
+            content = entry.get("content") or {}
+            if content.get("entryType") == "TimelineTimelineCursor":
+                cursor_type = content.get("cursorType")
+                if cursor_type == "Bottom":
+                    bottom_cursor = content["value"]
+                elif cursor_type == "ShowMore" and entry.get("entryIdToReplace") == "cursor-bottom-0":
+                    replaced_show_more = content["value"]
+
+    if not entries_taken:
+        show_more_cursor = replaced_show_more
+    return tweets, bottom_cursor or show_more_cursor
+
+
+def parse_search_timeline(res: Dict[str, Any], keyword: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    SearchTimeline のレスポンスからツイート行と次ページのカーソルを1回の走査で取り出す
+
+    ツイートは最初の TimelineAddEntries から読む。
+    カーソルは走査順で最後に見つかった Bottom カーソルを優先し、無ければ ShowMore カーソルを使う
+    （TimelineAddEntries が無いページでは cursor-bottom-0 を置き換える TimelineReplaceEntry のもの）。
+    個々のツイートで必要なデータが欠けている場合は、その行だけを飛ばす。
+
+    Args:
+        res: SearchTimeline のレスポンス
+        keyword: 検索ワード（「その他のハッシュタグ」から除くために使う）
+
+    Returns:
+        (ツイート行のリスト, ボトムカーソル)
+
+    Raises:
+        KeyError: タイムラインが見つからないなど、レスポンスの構造が想定と異なる場合
+    """
+    return _scan(res, keyword.replace("#", "").lower())
+
+
+def parse_bottom_cursor(res: Dict[str, Any]) -> Optional[str]:
+    """
+    SearchTimeline のレスポンスから次ページのカーソルだけを取り出す（parse_search_timeline と同じ規則）
+
+    ツイートの解析より先に次のリクエストを送るために使う。
+
+    Raises:
+        KeyError: タイムラインが見つからないなど、レスポンスの構造が想定と異なる場合
+    """
+    return _scan(res, None)[1]
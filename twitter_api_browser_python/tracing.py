@@ -0,0 +1,204 @@
+"""
+スパンによる処理のトレースとサンプリングプロファイラ
+
+ジョブごとに Trace を作成して activate() すると、そのジョブ（から作成したタスク）の span() が記録される。
+Trace はChromeのトレース形式（chrome://tracing・Perfetto で開ける）で出力でき、
+profile=True の場合はイベントループのスレッドのスタックを定期的に採取して、フレームグラフ用の
+折りたたみ形式（flamegraph.pl・speedscope で開ける）で出力できる。
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional
+
+# 1つのトレースに記録するスパンの上限（超えた分は数だけ数える）
+TRACE_MAX_EVENTS = int(os.environ.get("TRACE_MAX_EVENTS", "50000"))
+# プロファイラのサンプリング間隔（ミリ秒）
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+# プロファイルのスタックの深さの上限
+PROFILE_MAX_DEPTH = 64
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    """1つのジョブのスパンの記録"""
+
+    def __init__(self, name: str, profile: bool = False, max_events: int = TRACE_MAX_EVENTS):
+        self.name = name
+        self.max_events = max_events
+        self.started = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        # タスクごとのトレース上のスレッド番号（同じタスク内のスパンは入れ子になる）
+        self._task_ids: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._task_names: Dict[int, str] = {}
+        # フレームグラフ用のスタックごとのサンプル数（profile=False の場合は None）
+        self.samples: Optional[Counter] = Counter() if profile else None
+
+    def _tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        tid = self._task_ids.get(task)
+        if tid is None:
+            tid = self._task_ids[task] = len(self._task_names) + 1
+            self._task_names[tid] = task.get_name()
+            _task_traces[task] = self
+        return tid
+
+    def add(self, name: str, category: str, start: float, end: float, args: Optional[Dict[str, Any]] = None):
+        """完了したスパンを記録する（時刻は perf_counter の値）"""
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.started) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": 1,
+            "tid": self._tid(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """Chromeのトレース形式"""
+        metadata = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": self.name}}]
+        metadata.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+            for tid, name in self._task_names.items()
+        )
+        return {
+            "traceEvents": metadata + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped},
+        }
+
+    def folded(self) -> str:
+        """フレームグラフ用の折りたたみ形式（1行に「呼び出し元;…;呼び出し先 サンプル数」）"""
+        if not self.samples:
+            return ""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+@contextmanager
+def span(name: str, category: str = "collector", **args) -> Iterator[None]:
+    """処理区間を現在のトレースに記録する（トレースが無ければ何もしない）"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, category, start, time.perf_counter(), args)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def activate(trace: Trace) -> Token:
+    """
+    現在のコンテキスト（以降に作成するタスクを含む）で trace を使う
+
+    profile=True のトレースはプロファイラに登録する。終了時は deactivate() に戻り値を渡す。
+    """
+    token = _current.set(trace)
+    trace._tid()
+    if trace.samples is not None:
+        _profiler.add(trace)
+    return token
+
+
+def deactivate(token: Token):
+    trace = _current.get()
+    _current.reset(token)
+    if trace is not None and trace.samples is not None:
+        _profiler.remove(trace)
+
+
+# --- サンプリングプロファイラ ---
+
+# スパンを記録したタスクとトレースの対応（サンプルをどのジョブのものか判定する）
+_task_traces: "weakref.WeakKeyDictionary[asyncio.Task, Trace]" = weakref.WeakKeyDictionary()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _SamplingProfiler:
+    """
+    イベントループのスレッドのスタックを別スレッドから定期的に採取する
+
+    サンプルはその時点で実行中のタスクに対応するトレースに加える（ループが待機中のサンプルは捨てる）。
+    実行中のタスクの取得には CPython の asyncio の内部状態を使う。
+    """
+
+    def __init__(self):
+        self._traces: List[Trace] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, trace: Trace):
+        with self._lock:
+            if trace in self._traces:
+                self._traces.remove(trace)
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._traces:
+                    # 次に登録されたときに起動し直す
+                    self._thread = None
+                    return
+                self._sample()
+
+    def _sample(self):
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        task = current_tasks.get(self._loop)
+        trace = _task_traces.get(task) if task is not None else None
+        if trace is None or trace.samples is None or trace not in self._traces:
+            return
+        frame = sys._current_frames().get(self._loop_thread_id)
+        labels: List[str] = []
+        while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+            # イベントループ自体のフレームは含めない
+            if frame.f_code.co_name == "_run" and frame.f_code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+                break
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        if labels:
+            trace.samples[";".join(reversed(labels))] += 1
+
+
+_profiler = _SamplingProfiler()